@@ -0,0 +1,114 @@
+"""Benchmark côte à côte : posts_service.py (Flask/gunicorn) vs posts_service_async.py.
+
+Lance les deux implémentations sur deux ports contre la même base et le même
+users-service, leur applique la même charge (lectures paginées, lecture d'un
+post, création de posts), puis affiche un tableau comparatif et écrit le
+résultat en JSON.
+
+    PYTHONPATH=. python benchmarks/compare_posts.py --users-url http://localhost:5001 \\
+        --concurrency 64 --duration 20 --output compare.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import loadgen  # noqa: E402
+
+IMPLEMENTATIONS = {
+    'flask': ['posts-service/posts_service.py', 'serve'],
+    'asyncio': ['posts-service/posts_service_async.py'],
+}
+
+
+def start_service(script_args, port, users_url, extra_env=None):
+    env = dict(os.environ)
+    env.update({
+        'PORT': str(port),
+        'USERS_SERVICE_URL': users_url,
+        'PYTHONPATH': ROOT,
+    })
+    env.update(extra_env or {})
+    return subprocess.Popen(
+        [sys.executable] + [os.path.join(ROOT, script_args[0])] + script_args[1:],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(base_url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'{base_url}/ready', timeout=2) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'{base_url} not ready after {timeout}s')
+
+
+def workload(user_ids, post_ids):
+    return [
+        loadgen.Route('list', 'GET', '/posts?limit=20', weight=70),
+        loadgen.Route('detail', 'GET', lambda rng: f'/posts/{rng.choice(post_ids)}', weight=20),
+        loadgen.Route('create', 'POST', '/posts', weight=10, body=lambda rng: {
+            'user_id': rng.choice(user_ids),
+            'title': 'bench',
+            'content': 'benchmark post ' + str(rng.random()),
+        }),
+    ]
+
+
+def print_table(results):
+    names = list(results)
+    print(f"{'':<10}" + ''.join(f'{name:>14}' for name in names))
+    for key in ('rps', 'p50_ms', 'p95_ms', 'p99_ms', 'errors'):
+        print(f'{key:<10}' + ''.join(f'{results[name][key]!s:>14}' for name in names))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users-url', default=os.environ.get('USERS_SERVICE_URL', 'http://localhost:5001'))
+    parser.add_argument('--base-port', type=int, default=5102)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--user-ids', default='1,2,3,4')
+    parser.add_argument('--post-ids', default='1,2,3,4')
+    parser.add_argument('--only', choices=sorted(IMPLEMENTATIONS), action='append')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    user_ids = [int(i) for i in args.user_ids.split(',')]
+    post_ids = [int(i) for i in args.post_ids.split(',')]
+    results = {}
+    for offset, name in enumerate(args.only or sorted(IMPLEMENTATIONS, reverse=True)):
+        port = args.base_port + offset
+        base_url = f'http://127.0.0.1:{port}'
+        process = start_service(IMPLEMENTATIONS[name], port, args.users_url)
+        try:
+            wait_ready(base_url)
+            print(f'▶ {name} ({base_url}) : {args.concurrency} clients, {args.duration}s')
+            results[name] = asyncio.run(loadgen.run(
+                base_url, workload(user_ids, post_ids),
+                concurrency=args.concurrency, duration=args.duration,
+            ))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print_table(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+"""Banc de charge reproductible pour users-service et posts-service.
+
+1. Fournit un PostgreSQL : base existante (``--pg existing``), conteneur
+   ``postgres:15-alpine`` (``--pg docker``) ou instance temporaire sans
+   conteneur via initdb/pg_ctl (``--pg local``)
+2. Charge le schéma ``database/init.sql`` puis génère ``--users`` /
+   ``--posts`` lignes côté serveur (``generate_series``), de 10k à 10M
+3. Démarre les deux services (gunicorn) sur des ports locaux
+4. Applique un mélange lectures/écritures sur toutes les routes
+5. Écrit un rapport JSON : RPS, p50/p95/p99 par route, connexions DB
+   ouvertes, mémoire par worker
+
+    PYTHONPATH=. python benchmarks/harness.py --pg local --users 10000 --posts 100000 \\
+        --profile mixed --duration 30 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from datetime import datetime, timezone
+
+import psycopg2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import loadgen  # noqa: E402
+
+SERVICES = {
+    'users': {'script': 'users-service/users_service.py', 'port': 5101},
+    'posts': {'script': 'posts-service/posts_service.py', 'port': 5102},
+}
+
+# Poids relatifs des routes par profil : (lectures, écritures)
+PROFILES = {
+    'read-heavy': (95, 5),
+    'mixed': (80, 20),
+    'write-heavy': (50, 50),
+}
+
+
+# ==================== POSTGRESQL ====================
+
+class Postgres:
+    """PostgreSQL utilisé par le banc ; ``stop()`` nettoie ce qui a été démarré"""
+
+    def __init__(self, mode, dsn_config, keep=False):
+        self.mode = mode
+        self.config = dict(dsn_config)
+        self.keep = keep
+        self._container = None
+        self._datadir = None
+
+    def start(self):
+        if self.mode == 'docker':
+            self._start_docker()
+        elif self.mode == 'local':
+            self._start_local()
+        self._wait()
+        return self
+
+    def _start_docker(self):
+        self.config['port'] = str(_free_port())
+        self._container = subprocess.check_output([
+            'docker', 'run', '-d', '--rm',
+            '-e', f"POSTGRES_USER={self.config['user']}",
+            '-e', f"POSTGRES_PASSWORD={self.config['password']}",
+            '-e', f"POSTGRES_DB={self.config['database']}",
+            '-p', f"{self.config['port']}:5432",
+            'postgres:15-alpine',
+        ], text=True).strip()
+
+    def _start_local(self):
+        for binary in ('initdb', 'pg_ctl'):
+            if shutil.which(binary) is None:
+                raise SystemExit(f'{binary} not found on PATH (install PostgreSQL or use --pg docker)')
+        self._datadir = tempfile.mkdtemp(prefix='bench-pg-')
+        self.config.update({'host': '127.0.0.1', 'port': str(_free_port())})
+        pwfile = os.path.join(self._datadir, 'pwfile')
+        with open(pwfile, 'w') as f:
+            f.write(self.config['password'])
+        data = os.path.join(self._datadir, 'data')
+        subprocess.check_call(['initdb', '-D', data, '-U', self.config['user'], '--pwfile', pwfile,
+                               '-A', 'md5'], stdout=subprocess.DEVNULL)
+        subprocess.check_call(['pg_ctl', '-D', data, '-l', os.path.join(self._datadir, 'pg.log'), '-w',
+                               '-o', f"-p {self.config['port']} -k {self._datadir} -c max_connections=200",
+                               'start'], stdout=subprocess.DEVNULL)
+        conn = psycopg2.connect(**dict(self.config, database='postgres'))
+        conn.autocommit = True
+        conn.cursor().execute(f"CREATE DATABASE {self.config['database']}")
+        conn.close()
+
+    def _wait(self, timeout=60.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                psycopg2.connect(**self.config, connect_timeout=2).close()
+                return
+            except psycopg2.OperationalError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.5)
+
+    def connect(self):
+        return psycopg2.connect(**self.config)
+
+    def stop(self):
+        if self.keep:
+            return
+        if self._container:
+            subprocess.call(['docker', 'stop', self._container], stdout=subprocess.DEVNULL)
+        if self._datadir:
+            subprocess.call(['pg_ctl', '-D', os.path.join(self._datadir, 'data'), '-m', 'fast', 'stop'],
+                            stdout=subprocess.DEVNULL)
+            shutil.rmtree(self._datadir, ignore_errors=True)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def seed(pg, users, posts):
+    """Recrée le schéma de init.sql et génère les données côté serveur"""
+    with open(os.path.join(ROOT, 'database', 'init.sql')) as f:
+        schema = f.read()
+    conn = pg.connect()
+    cur = conn.cursor()
+    cur.execute('DROP TABLE IF EXISTS posts, users, stats_counters, user_post_counts, outbox, outbox_offsets, authors CASCADE')
+    cur.execute(schema)
+    start = time.perf_counter()
+    cur.execute('''
+        INSERT INTO users (name, email, created_at)
+        SELECT 'User ' || g, 'user' || g || '@bench.local',
+               now() - (g || ' seconds')::interval
+        FROM generate_series(1, %s) AS g
+    ''', (users,))
+    # Tables recréées : les ids users sont contigus de 1 à max(id)
+    cur.execute('SELECT max(id) FROM users')
+    max_user = cur.fetchone()[0]
+    cur.execute('''
+        INSERT INTO authors (user_id, name, email)
+        SELECT id, name, email FROM users
+    ''')
+    # Nom / email copiés dans posts comme le fait posts-service (user N = 'User N')
+    cur.execute('''
+        INSERT INTO posts (user_id, title, content, created_at, author_name, author_email)
+        SELECT u, 'Post ' || g, repeat('lorem ipsum ', 20 + g %% 50),
+               now() - (g || ' seconds')::interval, 'User ' || u, 'user' || u || '@bench.local'
+        FROM generate_series(1, %s) AS g, LATERAL (SELECT 1 + g %% %s AS u) AS a
+    ''', (posts, max_user))
+    conn.commit()
+    cur.execute('ANALYZE')
+    cur.execute('SELECT max(id) FROM posts')
+    max_post = cur.fetchone()[0] or 1
+    conn.commit()
+    conn.close()
+    return {'users': users, 'posts': posts, 'seconds': round(time.perf_counter() - start, 2),
+            'max_user_id': max_user, 'max_post_id': max_post}
+
+
+def db_counters(pg):
+    """Sessions ouvertes depuis le démarrage (PostgreSQL 14+) et connexions actives"""
+    conn = pg.connect()
+    cur = conn.cursor()
+    try:
+        cur.execute('SELECT sessions FROM pg_stat_database WHERE datname = current_database()')
+        sessions = cur.fetchone()[0]
+    except psycopg2.Error:
+        conn.rollback()
+        sessions = None
+    cur.execute('SELECT count(*) FROM pg_stat_activity WHERE datname = current_database()')
+    active = cur.fetchone()[0]
+    conn.close()
+    return sessions, active
+
+
+# ==================== SERVICES ====================
+
+def start_services(pg, env_overrides):
+    processes = {}
+    env = dict(os.environ)
+    env.update({
+        'DB_HOST': pg.config['host'],
+        'DB_PORT': str(pg.config['port']),
+        'DB_NAME': pg.config['database'],
+        'DB_USER': pg.config['user'],
+        'DB_PASSWORD': pg.config['password'],
+        'USERS_SERVICE_URL': f"http://127.0.0.1:{SERVICES['users']['port']}",
+        'PYTHONPATH': ROOT,
+    })
+    env.update(env_overrides)
+    for name, service in SERVICES.items():
+        processes[name] = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, service['script']), 'serve'],
+            env=dict(env, PORT=str(service['port'])),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+    for name, service in SERVICES.items():
+        _wait_ready(f"http://127.0.0.1:{service['port']}")
+    return processes
+
+
+def _wait_ready(base_url, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'{base_url}/ready', timeout=2) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'{base_url} not ready after {timeout}s')
+
+
+def _children(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                    children.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return children
+
+
+def _rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def worker_memory(process):
+    """RSS (Mo) du master gunicorn et de chacun de ses workers"""
+    return {
+        'master_mb': _rss_mb(process.pid),
+        'workers_mb': [_rss_mb(pid) for pid in _children(process.pid)],
+    }
+
+
+# ==================== CHARGE ====================
+
+def user_routes(read, write, max_user_id):
+    uid = lambda rng: rng.randint(1, max_user_id)  # noqa: E731
+    return [
+        loadgen.Route('GET /users', 'GET', '/users?limit=50', weight=read * 0.30),
+        loadgen.Route('GET /users/<id>', 'GET', lambda rng: f'/users/{uid(rng)}', weight=read * 0.45),
+        loadgen.Route('GET /users?ids=', 'GET',
+                      lambda rng: '/users?ids=' + ','.join(str(uid(rng)) for _ in range(20)),
+                      weight=read * 0.15),
+        loadgen.Route('GET /users/stats', 'GET', '/users/stats', weight=read * 0.10),
+        loadgen.Route('POST /users', 'POST', '/users', weight=write * 0.5, body=lambda rng: {
+            'name': 'Bench', 'email': f'bench-{rng.getrandbits(64):x}@bench.local'}),
+        loadgen.Route('PUT /users/<id>', 'PUT', lambda rng: f'/users/{uid(rng)}', weight=write * 0.45,
+                      body={'name': 'Bench updated'}),
+        loadgen.Route('DELETE /users/<id>', 'DELETE', lambda rng: f'/users/{uid(rng)}', weight=write * 0.05),
+    ]
+
+
+def post_routes(read, write, max_user_id, max_post_id):
+    uid = lambda rng: rng.randint(1, max_user_id)  # noqa: E731
+    pid = lambda rng: rng.randint(1, max_post_id)  # noqa: E731
+    return [
+        loadgen.Route('GET /posts', 'GET', '/posts?limit=50', weight=read * 0.40),
+        loadgen.Route('GET /posts/<id>', 'GET', lambda rng: f'/posts/{pid(rng)}', weight=read * 0.35),
+        loadgen.Route('GET /posts/user/<id>', 'GET', lambda rng: f'/posts/user/{uid(rng)}', weight=read * 0.15),
+        loadgen.Route('GET /posts/stats', 'GET', '/posts/stats', weight=read * 0.10),
+        loadgen.Route('POST /posts', 'POST', '/posts', weight=write * 0.6, body=lambda rng: {
+            'user_id': uid(rng), 'title': 'Bench', 'content': 'benchmark ' * 20}),
+        loadgen.Route('PUT /posts/<id>', 'PUT', lambda rng: f'/posts/{pid(rng)}', weight=write * 0.3,
+                      body={'title': 'Bench updated'}),
+        loadgen.Route('DELETE /posts/<id>', 'DELETE', lambda rng: f'/posts/{pid(rng)}', weight=write * 0.1),
+    ]
+
+
+async def run_load(args, dataset):
+    read, write = PROFILES[args.profile]
+    users_url = f"http://127.0.0.1:{SERVICES['users']['port']}"
+    posts_url = f"http://127.0.0.1:{SERVICES['posts']['port']}"
+    users_result, posts_result = await asyncio.gather(
+        loadgen.run(users_url, user_routes(read, write, dataset['max_user_id']),
+                    concurrency=args.concurrency // 2 or 1, duration=args.duration, seed=args.seed),
+        loadgen.run(posts_url, post_routes(read, write, dataset['max_user_id'], dataset['max_post_id']),
+                    concurrency=args.concurrency - args.concurrency // 2, duration=args.duration,
+                    seed=args.seed + 1),
+    )
+    return {'users': users_result, 'posts': posts_result}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', '-C', ROOT, 'rev-parse', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark users-service / posts-service')
+    parser.add_argument('--pg', choices=['existing', 'docker', 'local'], default='existing')
+    parser.add_argument('--keep-db', action='store_true', help='ne pas arrêter le PostgreSQL démarré')
+    parser.add_argument('--no-seed', action='store_true', help='réutiliser les données existantes')
+    parser.add_argument('--allow-reset', action='store_true',
+                        help='autorise la recréation des tables sur une base existante (--pg existing)')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='mixed')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='variable transmise aux services (ex. WEB_WORKERS=4)')
+    parser.add_argument('--output', help='fichier JSON (sinon stdout)')
+    args = parser.parse_args()
+
+    if args.pg == 'existing' and not (args.no_seed or args.allow_reset):
+        parser.error('--pg existing drops and reseeds users/posts: pass --allow-reset or --no-seed')
+
+    from common.db import DB_CONFIG
+    config = dict(DB_CONFIG)
+    if args.pg != 'existing':
+        config.update({'host': '127.0.0.1', 'database': 'bench_db', 'user': 'bench', 'password': 'bench'})
+    pg = Postgres(args.pg, config, keep=args.keep_db).start()
+    processes = {}
+    try:
+        if args.no_seed:
+            conn = pg.connect()
+            cur = conn.cursor()
+            cur.execute('SELECT (SELECT count(*) FROM users), (SELECT count(*) FROM posts), '
+                        '(SELECT max(id) FROM users), (SELECT max(id) FROM posts)')
+            users, posts, max_user, max_post = cur.fetchone()
+            conn.close()
+            dataset = {'users': users, 'posts': posts, 'max_user_id': max_user, 'max_post_id': max_post or 1}
+        else:
+            dataset = seed(pg, args.users, args.posts)
+        print(f"🌱 Données: {dataset['users']} users, {dataset['posts']} posts", file=sys.stderr)
+
+        env_overrides = dict(item.split('=', 1) for item in args.env)
+        processes = start_services(pg, env_overrides)
+        sessions_before, _ = db_counters(pg)
+        print(f'🔥 Charge {args.profile}: {args.concurrency} clients, {args.duration}s', file=sys.stderr)
+        results = asyncio.run(run_load(args, dataset))
+        sessions_after, active = db_counters(pg)
+
+        report = {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_revision': git_revision(),
+            'profile': args.profile,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'service_env': env_overrides,
+            'dataset': dataset,
+            'services': results,
+            'db': {
+                'connections_opened': (sessions_after - sessions_before)
+                if sessions_before is not None else None,
+                'connections_active_end': active,
+            },
+            'memory': {name: worker_memory(process) for name, process in processes.items()},
+        }
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.wait(timeout=30)
+        pg.stop()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
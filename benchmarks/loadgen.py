@@ -0,0 +1,106 @@
+"""Générateur de charge HTTP asynchrone (aiohttp), en boucle fermée.
+
+``concurrency`` clients virtuels envoient des requêtes en continu pendant
+``duration`` secondes. Chaque requête est tirée au hasard dans un mélange
+pondéré de routes. Le résultat est un dict JSON-sérialisable : RPS, p50/p95/p99
+et erreurs, au global et par route.
+"""
+import time
+import random
+import asyncio
+from collections import defaultdict
+
+import aiohttp
+
+
+class Route:
+    """Une entrée du mélange : ``path`` et ``body`` peuvent être des fonctions (rng) -> valeur"""
+
+    def __init__(self, name, method, path, weight=1, body=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.weight = weight
+        self.body = body
+
+    def build(self, rng):
+        path = self.path(rng) if callable(self.path) else self.path
+        body = self.body(rng) if callable(self.body) else self.body
+        return path, body
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    count = len(ordered)
+    return {
+        'requests': count + errors,
+        'errors': errors,
+        'rps': round(count / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': _ms(percentile(ordered, 50)),
+        'p95_ms': _ms(percentile(ordered, 95)),
+        'p99_ms': _ms(percentile(ordered, 99)),
+        'max_ms': _ms(ordered[-1] if ordered else None),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+async def run(base_url, routes, concurrency=32, duration=10.0, warmup=1.0, seed=0, timeout=10.0):
+    """Lance la charge et retourne le résumé global et par route"""
+    weights = [route.weight for route in routes]
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    statuses = defaultdict(int)
+    measure_from = time.perf_counter() + warmup
+    stop_at = measure_from + duration
+
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=30)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+
+        async def client(client_id):
+            rng = random.Random(seed * 100003 + client_id)
+            while True:
+                route = rng.choices(routes, weights)[0]
+                path, body = route.build(rng)
+                start = time.perf_counter()
+                if start >= stop_at:
+                    return
+                ok = False
+                try:
+                    async with session.request(route.method, base_url + path, json=body) as response:
+                        await response.read()
+                        ok = response.status < 500
+                        status = response.status
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    status = 'error'
+                end = time.perf_counter()
+                if start < measure_from:
+                    continue
+                statuses[status] += 1
+                if ok:
+                    latencies[route.name].append(end - start)
+                else:
+                    errors[route.name] += 1
+
+        await asyncio.gather(*(client(i) for i in range(concurrency)))
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    result = summarize(all_latencies, sum(errors.values()), duration)
+    result['concurrency'] = concurrency
+    result['duration_s'] = duration
+    result['status_codes'] = {str(code): count for code, count in statuses.items()}
+    result['routes'] = {
+        route.name: summarize(latencies[route.name], errors[route.name], duration)
+        for route in routes
+    }
+    return result
@@ -0,0 +1,163 @@
+"""Temps de démarrage d'un service : du lancement au premier /ready réussi.
+
+Mesure, sur ``--runs`` démarrages à froid, le délai entre le lancement et la
+première réponse 200 de ``/health`` (processus à l'écoute) puis de ``/ready``
+(base joignable : le pod peut recevoir du trafic).
+
+- ``--mode process`` : ``python <service>.py serve`` (gunicorn), comme le
+  fait ``harness.py``
+- ``--mode docker --image IMAGE`` : ``docker run`` de l'image construite,
+  réseau de l'hôte ; le délai inclut la création du conteneur
+
+    PYTHONPATH=. python benchmarks/startup.py --pg local --service users --runs 10
+    PYTHONPATH=. python benchmarks/startup.py --pg local --service users --mode docker \\
+        --image users-service:latest --runs 5 --output startup.json
+
+posts-service répond 200 sur /ready (``degraded``) même si users-service
+n'est pas lancé : la mesure ne dépend que de la base.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import urllib.request
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from harness import Postgres, SERVICES, _free_port, git_revision  # noqa: E402
+
+POLL_INTERVAL = 0.01
+
+
+def _ok(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+def wait_phases(base_url, started, timeout):
+    """Secondes écoulées depuis ``started`` jusqu'au premier 200 de /health puis de /ready"""
+    phases = {}
+    deadline = started + timeout
+    for phase in ('health', 'ready'):
+        while not _ok(f'{base_url}/{phase}'):
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f'{base_url}/{phase} not OK after {timeout}s')
+            time.sleep(POLL_INTERVAL)
+        phases[phase] = time.perf_counter() - started
+    return phases
+
+
+def service_env(pg, env_overrides):
+    env = {
+        'DB_HOST': pg.config['host'],
+        'DB_PORT': str(pg.config['port']),
+        'DB_NAME': pg.config['database'],
+        'DB_USER': pg.config['user'],
+        'DB_PASSWORD': pg.config['password'],
+        'USERS_SERVICE_URL': 'http://127.0.0.1:9',
+    }
+    env.update(env_overrides)
+    return env
+
+
+def run_process(service, env, port, timeout):
+    process_env = dict(os.environ, **env, PORT=str(port), PYTHONPATH=ROOT)
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, SERVICES[service]['script']), 'serve'],
+        env=process_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        return wait_phases(f'http://127.0.0.1:{port}', started, timeout)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def run_docker(image, env, port, timeout):
+    command = ['docker', 'run', '-d', '--rm', '--network', 'host', '-e', f'PORT={port}']
+    for key, value in env.items():
+        command += ['-e', f'{key}={value}']
+    started = time.perf_counter()
+    container = subprocess.check_output(command + [image], text=True).strip()
+    try:
+        return wait_phases(f'http://127.0.0.1:{port}', started, timeout)
+    finally:
+        subprocess.call(['docker', 'rm', '-f', container], stdout=subprocess.DEVNULL)
+
+
+def summarize(samples):
+    values = sorted(samples)
+    return {
+        'min_ms': round(1000 * values[0], 1),
+        'p50_ms': round(1000 * statistics.median(values), 1),
+        'max_ms': round(1000 * values[-1], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Temps de démarrage jusqu\'au premier /ready')
+    parser.add_argument('--pg', choices=['existing', 'docker', 'local'], default='existing')
+    parser.add_argument('--service', choices=sorted(SERVICES), default='users')
+    parser.add_argument('--mode', choices=['process', 'docker'], default='process')
+    parser.add_argument('--image', help='image à lancer (--mode docker)')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='variable transmise au service (ex. WEB_WORKERS=4)')
+    parser.add_argument('--output', help='fichier JSON (sinon stdout)')
+    args = parser.parse_args()
+    if args.mode == 'docker' and not args.image:
+        parser.error('--mode docker requires --image')
+
+    from common.db import DB_CONFIG
+    config = dict(DB_CONFIG)
+    if args.pg != 'existing':
+        config.update({'host': '127.0.0.1', 'database': 'bench_db', 'user': 'bench', 'password': 'bench'})
+    pg = Postgres(args.pg, config).start()
+    env_overrides = dict(item.split('=', 1) for item in args.env)
+    runs = []
+    try:
+        env = service_env(pg, env_overrides)
+        for i in range(args.runs):
+            port = _free_port()
+            if args.mode == 'docker':
+                phases = run_docker(args.image, env, port, args.timeout)
+            else:
+                phases = run_process(args.service, env, port, args.timeout)
+            print(f"⏱️ Démarrage {i + 1}/{args.runs}: /health {1000 * phases['health']:.0f} ms, "
+                  f"/ready {1000 * phases['ready']:.0f} ms", file=sys.stderr)
+            runs.append(phases)
+    finally:
+        pg.stop()
+
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_revision': git_revision(),
+        'service': args.service,
+        'mode': args.mode,
+        'image': args.image,
+        'service_env': env_overrides,
+        'runs': args.runs,
+        'health': summarize([run['health'] for run in runs]),
+        'ready': summarize([run['ready'] for run in runs]),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+"""Code partagé entre users-service et posts-service"""
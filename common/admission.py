@@ -0,0 +1,257 @@
+"""Contrôle d'admission : limitation de débit et délestage sous surcharge.
+
+Une rafale qui dépasse la capacité ne doit pas s'accumuler dans les files
+(threads gunicorn, attente du pool DB) jusqu'à faire expirer les sondes de
+Kubernetes : les requêtes en trop sont refusées immédiatement, pour un
+coût quasi nul, et celles qui sont admises gardent une latence bornée.
+
+Dans l'ordre, avant chaque requête :
+
+1. débit par client (token bucket, clé ``X-Real-IP`` posée par
+   api-gateway) : 429 ``Too many requests``. Les appels internes
+   (posts-service -> users-service) ne passent pas par nginx et n'ont pas
+   cet en-tête : ils ne sont soumis qu'aux limites suivantes
+2. débit global du worker (token bucket) : 503
+3. concurrence : plus de ``max_concurrency`` requêtes en cours dans le
+   worker : 503
+4. file d'attente : requête restée plus de ``max_queue_ms`` entre nginx
+   (en-tête ``X-Request-Start``) et le worker : 503, le client a
+   probablement déjà abandonné
+5. pool DB : ``max_pool_waiting`` threads déjà en attente d'une connexion,
+   ou aucune connexion libre et attente moyenne récente au-delà de
+   ``max_pool_wait_ms`` : 503
+
+Les refus portent un en-tête ``Retry-After``. ``/health``, ``/ready`` et
+``/metrics`` ne sont jamais limités. Les vues à réponse longue (flux SSE,
+``@streaming``) passent les limites de débit mais ne comptent pas dans la
+concurrence : leur nombre est borné par la vue elle-même.
+
+Comme le cache ``local``, les compteurs sont propres à chaque worker : les
+débits configurés s'entendent par processus (x ``WEB_WORKERS`` x replicas
+pour le service entier).
+"""
+import os
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from flask import current_app, g, jsonify, request
+
+from common import db, events, metrics
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_CONFIG = {
+    'enabled': os.environ.get('ADMISSION_ENABLED', '1') != '0',
+    'client_rate': float(os.environ.get('RATE_LIMIT_CLIENT_RATE', '0')),
+    'client_burst': float(os.environ.get('RATE_LIMIT_CLIENT_BURST', '0')),
+    'global_rate': float(os.environ.get('RATE_LIMIT_GLOBAL_RATE', '0')),
+    'global_burst': float(os.environ.get('RATE_LIMIT_GLOBAL_BURST', '0')),
+    'max_clients': int(os.environ.get('RATE_LIMIT_MAX_CLIENTS', '10000')),
+    # Un thread reste libre pour les sondes et les refus ; les flux SSE
+    # (exemptés, voir ``streaming``) ont leurs threads réservés à part
+    'max_concurrency': int(os.environ.get(
+        'ADMISSION_MAX_CONCURRENCY', max(1, int(os.environ.get('WEB_THREADS', '8')) - 1 - (
+            events.EVENTS_CONFIG['max_subscribers'] if events.EVENTS_CONFIG['enabled'] else 0)))),
+    'max_queue_ms': float(os.environ.get('ADMISSION_MAX_QUEUE_MS', '2000')),
+    'max_pool_waiting': int(os.environ.get('ADMISSION_MAX_POOL_WAITING', '16')),
+    'max_pool_wait_ms': float(os.environ.get('ADMISSION_MAX_POOL_WAIT_MS', '500')),
+    'retry_after': int(os.environ.get('ADMISSION_RETRY_AFTER', '1')),
+}
+
+# debug_profile : un pod surchargé doit rester profilable (common/profiling.py)
+EXEMPT_ENDPOINTS = {'health', 'ready', 'metrics', 'static', 'debug_profile'}
+
+REQUEST_START_HEADER = 'X-Request-Start'
+
+
+class TokenBucket:
+    """``rate`` jetons par seconde, au plus ``burst`` en réserve"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def take(self, now):
+        """0 si un jeton est pris, sinon le délai (s) avant le prochain jeton"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Limiteurs d'un worker (recréés après le fork de gunicorn)"""
+
+    def __init__(self, client_rate=0.0, client_burst=0.0, global_rate=0.0, global_burst=0.0,
+                 max_clients=10000, max_concurrency=0, max_queue_ms=0.0,
+                 max_pool_waiting=0, max_pool_wait_ms=0.0, retry_after=1, enabled=True):
+        self.enabled = enabled
+        self.client_rate = client_rate
+        self.client_burst = client_burst or 2 * client_rate
+        self.max_clients = max_clients
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue_ms / 1000
+        self.max_pool_waiting = max_pool_waiting
+        self.max_pool_wait = max_pool_wait_ms / 1000
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()   # clé client -> TokenBucket (LRU borné)
+        self._global = TokenBucket(global_rate, global_burst or 2 * global_rate) if global_rate > 0 else None
+        self._in_flight = 0
+
+    # ---------- limiteurs ----------
+
+    def _take_client(self, client, now):
+        with self._lock:
+            bucket = self._clients.get(client)
+            if bucket is None:
+                bucket = self._clients[client] = TokenBucket(self.client_rate, self.client_burst)
+                if len(self._clients) > self.max_clients:
+                    self._clients.popitem(last=False)
+            else:
+                self._clients.move_to_end(client)
+            return bucket.take(now)
+
+    def _take_global(self, now):
+        with self._lock:
+            return self._global.take(now)
+
+    def _queued(self):
+        """Attente entre nginx et le worker (None sans en-tête exploitable)"""
+        value = request.headers.get(REQUEST_START_HEADER)
+        if not value:
+            return None
+        try:
+            started = float(value[2:] if value.startswith('t=') else value)
+        except ValueError:
+            return None
+        queued = time.time() - started
+        # Horloges désynchronisées : valeur ignorée
+        return queued if 0 <= queued < 3600 else None
+
+    def _pool_overloaded(self):
+        free, waiting, wait_avg = db.get_pool().pressure()
+        if self.max_pool_waiting and waiting >= self.max_pool_waiting:
+            return True
+        # Sans connexion libre, la requête attendrait autant que les précédentes
+        return bool(self.max_pool_wait) and free == 0 and wait_avg > self.max_pool_wait
+
+    def check(self):
+        """None si la requête est admise, sinon ``(statut, raison, Retry-After)``"""
+        now = time.monotonic()
+        client = client_key()
+        if self.client_rate > 0 and client is not None:
+            delay = self._take_client(client, now)
+            if delay:
+                return 429, 'client_rate', delay
+        if self._global is not None:
+            delay = self._take_global(now)
+            if delay:
+                return 503, 'global_rate', delay
+        if self.max_queue:
+            queued = self._queued()
+            if queued is not None and queued > self.max_queue:
+                return 503, 'queue', self.retry_after
+        if self.max_pool_waiting or self.max_pool_wait:
+            if self._pool_overloaded():
+                return 503, 'pool', self.retry_after
+        return None
+
+    def enter(self):
+        """Compte la requête en cours ; False si la limite de concurrence est atteinte"""
+        with self._lock:
+            if self.max_concurrency and self._in_flight >= self.max_concurrency:
+                return False
+            self._in_flight += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self._in_flight -= 1
+
+
+def client_key():
+    """Adresse du client vue par api-gateway (None pour un appel interne)
+
+    X-Real-IP, sinon dernier saut de X-Forwarded-For : seule l'adresse
+    ajoutée par le dernier proxy est fiable, le début de la liste vient du
+    client.
+    """
+    real_ip = request.headers.get('X-Real-IP')
+    if real_ip:
+        return real_ip.strip()
+    forwarded = request.headers.get('X-Forwarded-For')
+    if forwarded:
+        return forwarded.rsplit(',', 1)[-1].strip()
+    return None
+
+
+# ==================== LIMITEUR DU PROCESSUS ====================
+
+_controller = None
+_controller_pid = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    """Limiteur du processus courant (recréé après un fork)"""
+    global _controller, _controller_pid
+    pid = os.getpid()
+    if _controller is not None and _controller_pid == pid:
+        return _controller
+    with _controller_lock:
+        if _controller is None or _controller_pid != pid:
+            _controller = AdmissionController(**ADMISSION_CONFIG)
+            _controller_pid = pid
+    return _controller
+
+
+def streaming(view):
+    """Vue à réponse longue : soumise aux limites de débit, pas à la limite de concurrence"""
+    view.admission_streaming = True
+    return view
+
+
+def _reject(status, reason, retry_after):
+    metrics.ADMISSION_REJECTED.labels(metrics.service(), reason).inc()
+    error = 'Too many requests' if status == 429 else 'Service overloaded, retry later'
+    response = jsonify({'success': False, 'error': error})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def _before_request():
+    if request.endpoint in EXEMPT_ENDPOINTS:
+        return None
+    controller = get_controller()
+    rejected = controller.check()
+    if rejected is not None:
+        return _reject(*rejected)
+    if getattr(current_app.view_functions.get(request.endpoint), 'admission_streaming', False):
+        return None
+    if not controller.enter():
+        return _reject(503, 'concurrency', controller.retry_after)
+    g.admission_controller = controller
+    return None
+
+
+def _teardown_request(exc=None):
+    controller = g.pop('admission_controller', None)
+    if controller is not None:
+        controller.leave()
+
+
+def init_app(app):
+    """Filtre les requêtes avant les vues (après ``metrics.init_app`` pour compter les refus)"""
+    if not ADMISSION_CONFIG['enabled']:
+        return
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
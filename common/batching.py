@@ -0,0 +1,137 @@
+"""Regroupement des écritures concurrentes (group commit).
+
+Les requêtes d'écriture simultanées déposent leur ligne dans une file
+bornée ; un thread de vidage les regroupe (jusqu'à ``max_size`` lignes ou
+``max_wait`` secondes après la première) et les écrit en une seule
+transaction : un ``INSERT`` multi-lignes et un seul ``COMMIT`` (un seul
+fsync du WAL) au lieu d'un par requête.
+
+Chaque appelant reçoit son propre résultat. Si l'écriture groupée échoue
+(une ligne invalide fait échouer toute la transaction), les lignes du lot
+sont réécrites une par une pour que seule la requête fautive reçoive
+l'erreur.
+
+Compromis : ``max_wait`` ajoute au plus ce délai à chaque écriture ; sous
+charge, la file se remplit pendant le vidage précédent et les lots
+grossissent même avec ``max_wait = 0``.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+from common import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BatchQueueFull(Exception):
+    """File d'écriture pleine : la requête est rejetée immédiatement"""
+
+
+class WriteBatcher:
+    """File d'écritures vidée par lots par ``flushers`` threads du processus
+
+    ``flush(items)`` écrit une liste d'éléments et retourne un résultat par
+    élément, dans le même ordre.
+    """
+
+    def __init__(self, name, flush, max_size=64, max_wait=0.002, max_queue=1024, flushers=1):
+        self.name = name
+        self.flush = flush
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.flushers = flushers
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # File et threads propres à chaque worker (créés après le fork de gunicorn)
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid != pid:
+                self._queue = queue.Queue(self.max_queue)
+                for i in range(self.flushers):
+                    threading.Thread(target=self._run, name=f'{self.name}-flush-{i}', daemon=True).start()
+                self._pid = pid
+
+    def submit(self, item, timeout=None):
+        """Écrit ``item`` avec le prochain lot ; retourne son résultat ou lève son erreur
+
+        Lève BatchQueueFull si la file est pleine et
+        ``concurrent.futures.TimeoutError`` si le lot n'est pas écrit à temps.
+        """
+        self._ensure_started()
+        future = Future()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter()))
+        except queue.Full:
+            metrics.WRITE_BATCH_REJECTED.labels(metrics.service(), self.name).inc()
+            raise BatchQueueFull(f'{self.name}: write queue full ({self.max_queue})')
+        try:
+            return future.result(timeout)
+        except Exception:
+            # Abandon : la ligne n'est pas écrite si son lot n'a pas encore commencé
+            future.cancel()
+            raise
+
+    # ---------- thread de vidage ----------
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_size:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Délai écoulé : on prend encore ce qui est déjà dans la file
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Les appelants partis (timeout) sont retirés du lot
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                self._flush(batch)
+            except Exception as e:
+                logger.error("❌ Vidage du lot %s impossible: %s", self.name, e)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _flush(self, batch):
+        now = time.perf_counter()
+        for _, _, queued_at in batch:
+            metrics.WRITE_BATCH_WAIT.labels(metrics.service(), self.name).observe(now - queued_at)
+        metrics.WRITE_BATCH_SIZE.labels(metrics.service(), self.name).observe(len(batch))
+
+        try:
+            results = self.flush([item for item, _, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            logger.warning("⚠️ Lot %s de %s en échec (%s), écriture ligne par ligne", self.name, len(batch), e)
+            for item, future, _ in batch:
+                try:
+                    future.set_result(self.flush([item])[0])
+                except Exception as item_error:
+                    future.set_exception(item_error)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
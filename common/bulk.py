@@ -0,0 +1,336 @@
+"""Export / import en masse des tables users et posts avec COPY.
+
+    python -m common.bulk export --dir /tmp/dump [--format csv|binary] [--parts 4]
+    python -m common.bulk import --dir /tmp/dump [--jobs 4] [--truncate]
+
+Même configuration que les services (``DB_HOST``, ``DB_NAME``... voir
+``common/db.py``) ; dans un pod : ``kubectl exec deploy/users-service --
+python -m common.bulk export --dir /tmp/dump``.
+
+Export : un fichier par table (posts découpé en ``--parts`` plages d'id),
+écrits en parallèle dans un même instantané (``pg_export_snapshot``) : les
+posts exportés référencent tous des users exportés. ``manifest.json``
+décrit le format, les colonnes et le nombre de lignes.
+
+Import : les fichiers sont chargés en parallèle (``--jobs`` connexions), en
+flux par blocs de ``--buffer-size`` octets (mémoire bornée quelle que soit
+la taille). Avant le chargement, la clé étrangère posts -> users, les index
+secondaires (dont l'index GIN de recherche) et les triggers de compteurs
+sont retirés ; ensuite, les index sont reconstruits en une passe, la clé
+étrangère est rajoutée ``NOT VALID`` puis validée, les séquences, la
+projection ``authors``, les compteurs (``reconcile_stats()``) et les
+statistiques du planificateur (``ANALYZE``) sont mis à jour.
+
+Les lignes importées ne passent pas par l'outbox : la projection des
+auteurs est reconstruite directement depuis users.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+from common import db, events
+
+logger = logging.getLogger(__name__)
+
+# Colonnes copiées (search_vector est une colonne générée : recalculée au chargement)
+TABLES = {
+    'users': ['id', 'name', 'email', 'created_at', 'updated_at'],
+    'posts': ['id', 'user_id', 'title', 'content', 'created_at', 'updated_at', 'author_name', 'author_email'],
+}
+
+# Ordre de chargement conseillé si --jobs 1
+LOAD_ORDER = ['users', 'posts']
+
+FORMATS = {
+    'csv': {'extension': 'csv', 'options': 'FORMAT csv, HEADER true'},
+    'binary': {'extension': 'bin', 'options': 'FORMAT binary'},
+}
+
+MANIFEST = 'manifest.json'
+
+FOREIGN_KEY_SQL = '''
+    SELECT conname, pg_get_constraintdef(oid)
+    FROM pg_constraint
+    WHERE conrelid = 'posts'::regclass AND contype = 'f'
+'''
+
+# Index secondaires (hors clé primaire et contraintes UNIQUE, conservées
+# pour que les doublons échouent dès le COPY)
+SECONDARY_INDEXES_SQL = '''
+    SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+    FROM pg_index i
+    WHERE i.indrelid = ANY(%s::regclass[])
+      AND NOT i.indisprimary AND NOT i.indisunique
+'''
+
+
+def connect():
+    return psycopg2.connect(**db.DB_CONFIG)
+
+
+class Progress:
+    """Lignes et octets copiés, par fichier puis au total"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.files = []
+        self.started = time.perf_counter()
+
+    def add(self, name, rows, size, seconds):
+        with self._lock:
+            self.files.append({'file': name, 'rows': rows, 'bytes': size, 'seconds': round(seconds, 3)})
+        logger.info("📦 %s: %s lignes en %.2f s (%s lignes/s, %.1f Mo/s)",
+                    name, rows, seconds, rate(rows, seconds), size / 1e6 / max(seconds, 1e-9))
+
+    def summary(self, **extra):
+        elapsed = time.perf_counter() - self.started
+        rows = sum(f['rows'] for f in self.files)
+        return dict(extra, rows=rows, seconds=round(elapsed, 3), rows_per_second=rate(rows, elapsed),
+                    files=sorted(self.files, key=lambda f: f['file']))
+
+
+def rate(rows, seconds):
+    return int(rows / seconds) if seconds > 0 else rows
+
+
+# ==================== EXPORT ====================
+
+def _id_ranges(cur, table, parts):
+    """``parts`` plages d'id [début, fin) couvrant toute la table"""
+    cur.execute(f'SELECT MIN(id), MAX(id) FROM {table}')
+    low, high = cur.fetchone()
+    if low is None or parts <= 1:
+        return [(None, None)]
+    step = max(1, (high - low + parts) // parts)
+    return [(start, start + step) for start in range(low, high + 1, step)]
+
+
+def _export_file(snapshot, table, id_range, path, fmt, buffer_size, progress):
+    columns = ', '.join(TABLES[table])
+    where = ''
+    if id_range != (None, None):
+        where = f' WHERE id >= {int(id_range[0])} AND id < {int(id_range[1])}'
+    sql = f'COPY (SELECT {columns} FROM {table}{where} ORDER BY id) TO STDOUT WITH ({FORMATS[fmt]["options"]})'
+    conn = connect()
+    try:
+        conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+        cur = conn.cursor()
+        cur.execute('SET TRANSACTION SNAPSHOT %s', (snapshot,))
+        start = time.perf_counter()
+        with open(path, 'wb', buffering=buffer_size) as f:
+            cur.copy_expert(sql, f, size=buffer_size)
+        rows = cur.rowcount
+        conn.rollback()
+    finally:
+        conn.close()
+    progress.add(os.path.basename(path), rows, os.path.getsize(path), time.perf_counter() - start)
+    return rows
+
+
+def export(directory, fmt='csv', parts=1, jobs=4, buffer_size=1 << 20):
+    os.makedirs(directory, exist_ok=True)
+    progress = Progress()
+    extension = FORMATS[fmt]['extension']
+    # Connexion qui garde l'instantané ouvert pendant tout l'export
+    holder = connect()
+    try:
+        holder.set_session(isolation_level='REPEATABLE READ', readonly=True)
+        cur = holder.cursor()
+        cur.execute('SELECT pg_export_snapshot()')
+        snapshot = cur.fetchone()[0]
+
+        files = []
+        for table in LOAD_ORDER:
+            ranges = _id_ranges(cur, table, parts if table == 'posts' else 1)
+            for i, id_range in enumerate(ranges):
+                name = f'{table}.{extension}' if len(ranges) == 1 else f'{table}.{i}.{extension}'
+                files.append((table, id_range, name))
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [
+                (table, name, pool.submit(_export_file, snapshot, table, id_range,
+                                          os.path.join(directory, name), fmt, buffer_size, progress))
+                for table, id_range, name in files
+            ]
+            manifest_files = [
+                {'table': table, 'file': name, 'rows': future.result()} for table, name, future in futures
+            ]
+        holder.rollback()
+    finally:
+        holder.close()
+
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump({'format': fmt, 'columns': TABLES, 'files': manifest_files}, f, indent=2)
+    return progress.summary(operation='export', format=fmt)
+
+
+# ==================== IMPORT ====================
+
+def _prepare_load(conn, truncate):
+    """Retire clé étrangère, index secondaires et triggers ; retourne de quoi les recréer"""
+    cur = conn.cursor()
+    if truncate:
+        cur.execute('TRUNCATE users, posts, authors RESTART IDENTITY')
+    cur.execute(FOREIGN_KEY_SQL)
+    foreign_keys = cur.fetchall()
+    cur.execute(SECONDARY_INDEXES_SQL, (list(LOAD_ORDER),))
+    indexes = cur.fetchall()
+    # DDL à rejouer à la main si l'import est interrompu
+    for name, definition in foreign_keys:
+        logger.info("🔧 Retrait de la contrainte %s: %s", name, definition)
+        cur.execute(f'ALTER TABLE posts DROP CONSTRAINT {name}')
+    for name, definition in indexes:
+        logger.info("🔧 Retrait de l'index %s: %s", name, definition)
+        cur.execute(f'DROP INDEX {name}')
+    for table in LOAD_ORDER:
+        cur.execute(f'ALTER TABLE {table} DISABLE TRIGGER USER')
+    conn.commit()
+    return foreign_keys, indexes
+
+
+def _finish_load(conn, foreign_keys, indexes):
+    """Reconstruit index et contraintes, puis séquences, auteurs et compteurs"""
+    cur = conn.cursor()
+    timings = {}
+
+    def step(name, *statements):
+        start = time.perf_counter()
+        for statement in statements:
+            cur.execute(statement)
+        conn.commit()
+        timings[name] = round(time.perf_counter() - start, 3)
+        logger.info("🔧 %s: %.2f s", name, timings[name])
+
+    for table in LOAD_ORDER:
+        step(f'triggers {table}', f'ALTER TABLE {table} ENABLE TRIGGER USER')
+    for name, definition in indexes:
+        step(f'index {name}', definition)
+    for name, definition in foreign_keys:
+        # NOT VALID : ajout immédiat ; la vérification des lignes existantes
+        # (VALIDATE) ne bloque pas les écritures
+        step(f'constraint {name}',
+             f'ALTER TABLE posts ADD CONSTRAINT {name} {definition} NOT VALID',
+             f'ALTER TABLE posts VALIDATE CONSTRAINT {name}')
+    step('sequences', *(
+        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) "
+        f"FROM {table}"
+        for table in LOAD_ORDER
+    ))
+    step('authors', '''
+        INSERT INTO authors (user_id, name, email)
+        SELECT id, name, email FROM users
+        ON CONFLICT (user_id) DO UPDATE
+            SET name = EXCLUDED.name, email = EXCLUDED.email, updated_at = CURRENT_TIMESTAMP
+        WHERE (authors.name, authors.email) IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.email)
+    ''', '''
+        UPDATE posts p
+        SET author_name = a.name, author_email = a.email
+        FROM authors a
+        WHERE a.user_id = p.user_id AND p.author_name IS NULL
+    ''')
+    # Les triggers de compteurs étaient désactivés pendant le COPY
+    step('reconcile_stats', 'SELECT * FROM reconcile_stats()')
+    step('analyze', 'ANALYZE users', 'ANALYZE posts', 'ANALYZE authors')
+    # Abonnés du flux de changements (SSE) : listes à recharger
+    events.publish_reset(cur, 'users', 'posts')
+    conn.commit()
+    return timings
+
+
+def _import_file(table, path, columns, fmt, buffer_size, progress):
+    sql = f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH ({FORMATS[fmt]["options"]})'
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        # Pas d'attente du fsync à chaque COMMIT : un seul par fichier, rejoué au besoin
+        cur.execute('SET synchronous_commit = off')
+        start = time.perf_counter()
+        with open(path, 'rb', buffering=buffer_size) as f:
+            cur.copy_expert(sql, f, size=buffer_size)
+        rows = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    progress.add(os.path.basename(path), rows, os.path.getsize(path), time.perf_counter() - start)
+    return rows
+
+
+def import_(directory, jobs=4, truncate=False, buffer_size=1 << 20):
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    fmt = manifest['format']
+    progress = Progress()
+
+    conn = connect()
+    try:
+        foreign_keys, indexes = _prepare_load(conn, truncate)
+        error = None
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                # Les plus gros fichiers d'abord : la fin du chargement n'attend pas un retardataire
+                files = sorted(manifest['files'], key=lambda entry: -entry['rows'])
+                futures = [
+                    pool.submit(_import_file, entry['table'], os.path.join(directory, entry['file']),
+                                manifest['columns'][entry['table']], fmt, buffer_size, progress)
+                    for entry in files
+                ]
+                for future in futures:
+                    future.result()
+        except Exception as e:
+            error = e
+            logger.error("❌ Chargement interrompu (%s) : fichiers déjà validés conservés, "
+                         "index et contraintes reconstruits", e)
+        load_seconds = time.perf_counter() - progress.started
+        timings = _finish_load(conn, foreign_keys, indexes)
+        if error is not None:
+            raise error
+    finally:
+        conn.close()
+    return progress.summary(operation='import', format=fmt, load_seconds=round(load_seconds, 3),
+                            finish_seconds=timings)
+
+
+# ==================== CLI ====================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m common.bulk',
+                                     description='Export / import des tables users et posts avec COPY')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = sub.add_parser('export', help='tables -> fichiers')
+    export_parser.add_argument('--dir', required=True)
+    export_parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    export_parser.add_argument('--parts', type=int, default=1, help='fichiers par plage d\'id pour posts')
+    export_parser.add_argument('--jobs', type=int, default=4)
+
+    import_parser = sub.add_parser('import', help='fichiers -> tables')
+    import_parser.add_argument('--dir', required=True)
+    import_parser.add_argument('--jobs', type=int, default=4)
+    import_parser.add_argument('--truncate', action='store_true', help='vide users et posts avant le chargement')
+
+    for sub_parser in (export_parser, import_parser):
+        sub_parser.add_argument('--buffer-size', type=int, default=1 << 20, help='octets par bloc copié')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    if args.command == 'export':
+        report = export(args.dir, args.format, args.parts, args.jobs, args.buffer_size)
+    else:
+        report = import_(args.dir, args.jobs, args.truncate, args.buffer_size)
+    logger.info("✅ %s: %s lignes en %.2f s (%s lignes/s)",
+                report['operation'], report['rows'], report['seconds'], report['rows_per_second'])
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
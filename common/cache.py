@@ -0,0 +1,221 @@
+"""Cache de réponses pour les routes GET, avec invalidation par tags et ETag.
+
+Chaque réponse en cache est associée à des tags (``posts:list``,
+``post:42``...). Un tag a un numéro de version qui entre dans la clé de
+cache : une écriture incrémente la version des tags qu'elle touche, et les
+anciennes entrées ne sont plus jamais lues (elles expirent par TTL ou LRU).
+
+Backends :
+- ``local`` (défaut) : LRU en mémoire, propre à chaque worker. Une écriture
+  n'invalide que le worker qui l'a traitée ; ailleurs, l'obsolescence est
+  bornée par le TTL de la route.
+- ``redis`` : serveur Redis (ou compatible RESP) partagé par tous les
+  workers et replicas ; l'invalidation est alors globale.
+
+Les réponses 200 portent un ETag ; ``If-None-Match`` renvoie un 304 sans corps.
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+from common import db, metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_CONFIG = {
+    'backend': os.environ.get('CACHE_BACKEND', 'local'),
+    'max_entries': int(os.environ.get('CACHE_MAX_ENTRIES', '2048')),
+    'redis_url': os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'),
+    'enabled': os.environ.get('CACHE_ENABLED', '1') != '0',
+}
+
+
+class LocalBackend:
+    """LRU en mémoire avec TTL par entrée"""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._versions = {}
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if time.monotonic() >= expires:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def versions(self, tags):
+        with self._lock:
+            return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+
+class RedisBackend:
+    """Backend partagé (redis-py) ; les versions de tags sont des compteurs INCR"""
+
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def get(self, key):
+        raw = self._client.get(key)
+        if raw is None:
+            return None
+        etag, mimetype, body = raw.split(b'\n', 2)
+        return CachedResponse(body, mimetype.decode(), etag.decode())
+
+    def set(self, key, value, ttl):
+        raw = value.etag.encode() + b'\n' + value.mimetype.encode() + b'\n' + value.body
+        self._client.set(key, raw, px=int(ttl * 1000))
+
+    def versions(self, tags):
+        return [int(v or 0) for v in self._client.mget([f'tag:{tag}' for tag in tags])]
+
+    def bump(self, tags):
+        pipe = self._client.pipeline(transaction=False)
+        for tag in tags:
+            pipe.incr(f'tag:{tag}')
+        pipe.execute()
+
+
+class CachedResponse:
+    __slots__ = ('body', 'mimetype', 'etag')
+
+    def __init__(self, body, mimetype, etag):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+
+
+def make_etag(body):
+    return hashlib.blake2b(body, digest_size=12).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, namespace, backend='local', max_entries=2048, redis_url=None, enabled=True):
+        self.namespace = namespace
+        self.enabled = enabled
+        self.backend = LocalBackend(max_entries)
+        if backend == 'redis':
+            try:
+                self.backend = RedisBackend(redis_url)
+            except ImportError:
+                logger.warning("⚠️ Module redis absent, cache local utilisé")
+        self._inflight_lock = threading.Lock()
+        self._inflight = {}
+
+    # ---------- invalidation ----------
+
+    def invalidate(self, *tags):
+        """Invalide toutes les réponses portant un de ces tags"""
+        if not tags:
+            return
+        try:
+            self.backend.bump(tags)
+        except Exception as e:
+            logger.error("❌ Invalidation du cache impossible: %s", e)
+
+    # ---------- lecture ----------
+
+    def _key(self, tags):
+        versions = self.backend.versions(tags)
+        args = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+        stamp = ','.join(f'{tag}@{version}' for tag, version in zip(tags, versions))
+        return f'cache:{self.namespace}:{request.path}?{args}|{stamp}'
+
+    def cached(self, ttl, tags, bypass=None):
+        """Décorateur de vue GET : ``tags(**view_args)`` retourne les tags de la réponse"""
+
+        def decorator(view):
+            route = view.__name__
+
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # Client qui vient d'écrire (réplicas) : lecture directe, sans cache
+                if (not self.enabled or (bypass is not None and bypass(request))
+                        or db.read_your_writes_pending()):
+                    return view(*args, **kwargs)
+                try:
+                    key = self._key(tags(**kwargs))
+                    hit = self.backend.get(key)
+                except Exception as e:
+                    logger.error("❌ Cache indisponible: %s", e)
+                    return view(*args, **kwargs)
+
+                if hit is not None:
+                    metrics.CACHE_REQUESTS.labels(self.namespace, route, 'hit').inc()
+                    return self._respond(hit)
+                metrics.CACHE_REQUESTS.labels(self.namespace, route, 'miss').inc()
+                return self._compute(key, ttl, view, args, kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def _compute(self, key, ttl, view, args, kwargs):
+        """Calcule la réponse ; les requêtes simultanées sur la même clé attendent le premier calcul"""
+        with self._inflight_lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+
+        if not leader:
+            event.wait(ttl)
+            hit = self.backend.get(key)
+            if hit is not None:
+                return self._respond(hit)
+            return view(*args, **kwargs)
+
+        try:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            body = response.get_data()
+            entry = CachedResponse(body, response.mimetype, make_etag(body))
+            try:
+                self.backend.set(key, entry, ttl)
+            except Exception as e:
+                logger.error("❌ Écriture du cache impossible: %s", e)
+            return self._respond(entry, response)
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def _respond(self, entry, response=None):
+        # Comparaison faible (RFC 9110) : l'ETag devient faible si la réponse est compressée
+        if request.if_none_match.contains_weak(entry.etag):
+            response = current_app.response_class(status=304)
+        elif response is None:
+            response = current_app.response_class(entry.body, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        return response
+
+
+def init_cache(namespace):
+    return ResponseCache(namespace, **CACHE_CONFIG)
@@ -0,0 +1,74 @@
+"""Compression des réponses JSON (brotli ou gzip selon Accept-Encoding).
+
+Les réponses compressées par le service traversent l'API Gateway telles
+quelles (nginx ne recompresse pas une réponse qui a un Content-Encoding) ;
+nginx compresse en gzip les réponses restées en clair, notamment les flux
+NDJSON, que le service n'encode pas.
+
+Brotli n'est proposé que si le module ``brotli`` est installé.
+"""
+import os
+import gzip
+
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    brotli = None
+
+COMPRESSION_CONFIG = {
+    'enabled': os.environ.get('COMPRESS_ENABLED', '1') != '0',
+    'min_size': int(os.environ.get('COMPRESS_MIN_SIZE', '1024')),
+    'gzip_level': int(os.environ.get('COMPRESS_GZIP_LEVEL', '5')),
+    'brotli_quality': int(os.environ.get('COMPRESS_BROTLI_QUALITY', '4')),
+}
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/plain', 'text/html'}
+
+
+def negotiate(accept_encoding):
+    """Encodage à utiliser d'après l'en-tête Accept-Encoding (None : pas de compression)"""
+    accepted = parse_accept_header(accept_encoding)
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESSION_CONFIG['brotli_quality'])
+    return gzip.compress(data, compresslevel=COMPRESSION_CONFIG['gzip_level'], mtime=0)
+
+
+def _after_request(response):
+    from flask import request
+
+    response.vary.add('Accept-Encoding')
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    encoding = negotiate(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESSION_CONFIG['min_size']:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    # Représentation différente du corps en clair : l'ETag devient faible
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    """Compresse les réponses de ``app`` si le client l'accepte"""
+    if COMPRESSION_CONFIG['enabled']:
+        app.after_request(_after_request)
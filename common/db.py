@@ -0,0 +1,755 @@
+"""Pool de connexions PostgreSQL partagé par les microservices.
+
+Chaque processus garde un petit nombre de connexions ouvertes au lieu de
+refaire un handshake TCP + auth à chaque requête. Le pool est créé à la
+première utilisation (jamais à l'import) et recréé après un fork.
+
+Avec ``DB_REPLICAS``, les vues marquées ``@read_only`` lisent sur un réplica
+(hot standby) : le moins chargé parmi ceux qui répondent et dont le retard
+reste sous ``DB_REPLICA_MAX_LAG``. Les écritures restent sur le primaire.
+Après une écriture, le client reçoit un marqueur (cookie ``db_rw`` et
+en-tête ``X-DB-LSN``) : ses lectures suivantes ne vont que sur un réplica
+ayant rejoué cette position du WAL (``lsn``) ou sur le primaire (``sticky``).
+"""
+import os
+import re
+import time
+import logging
+import itertools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+# Configuration DB
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'postgres-service'),
+    'port': os.environ.get('DB_PORT', '5432'),
+    'database': os.environ.get('DB_NAME', 'microservices_db'),
+    'user': os.environ.get('DB_USER', 'appuser'),
+    'password': os.environ.get('DB_PASSWORD', 'password')
+}
+
+# Configuration du pool
+POOL_CONFIG = {
+    'minconn': int(os.environ.get('DB_POOL_MIN', '1')),
+    'maxconn': int(os.environ.get('DB_POOL_MAX', '8')),
+    'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '5')),
+    'max_waiting': int(os.environ.get('DB_POOL_MAX_WAITING', '32')),
+    'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', '1800')),
+    'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', '300')),
+    'check_idle': float(os.environ.get('DB_POOL_CHECK_IDLE', '5')),
+}
+
+# Réplicas en lecture : "hôte[:port]" (mêmes base / identifiants que DB_CONFIG)
+# ou URI postgresql://..., séparés par des virgules
+REPLICA_CONFIG = {
+    'replicas': [entry.strip() for entry in os.environ.get('DB_REPLICAS', '').split(',') if entry.strip()],
+    'max_lag': float(os.environ.get('DB_REPLICA_MAX_LAG', '10')),
+    'check_interval': float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', '5')),
+    'eject_seconds': float(os.environ.get('DB_REPLICA_EJECT_SECONDS', '30')),
+    # Attente d'une connexion sur un réplica saturé avant de passer au suivant
+    'checkout_timeout': float(os.environ.get('DB_REPLICA_CHECKOUT_TIMEOUT', '0')),
+    # lsn : réplica à jour sinon primaire ; sticky : primaire ; off : aucun suivi
+    'read_your_writes': os.environ.get('DB_READ_YOUR_WRITES', 'lsn'),
+    'read_your_writes_seconds': int(os.environ.get('DB_READ_YOUR_WRITES_SECONDS', '30')),
+}
+
+
+# Observateurs (métriques) : fn(sql, secondes) après chaque requête SQL et
+# fn(événement, pool, attente) à chaque emprunt ('checkout'), restitution
+# ('checkin') ou échec d'emprunt ('timeout', 'rejected')
+query_observers = []
+pool_observers = []
+
+
+class _TimedCursorMixin:
+    """Chronomètre execute()/executemany() et notifie query_observers"""
+
+    def execute(self, query, vars=None):
+        if not query_observers:
+            return super().execute(query, vars)
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            notify_query(query, time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        if not query_observers:
+            return super().executemany(query, vars_list)
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            notify_query(query, time.perf_counter() - start)
+
+
+def execute_untimed(cur, query, vars=None):
+    """execute() sans notifier query_observers (l'appelant mesure et notifie lui-même)"""
+    if isinstance(cur, _TimedCursorMixin):
+        return super(_TimedCursorMixin, cur).execute(query, vars)
+    return cur.execute(query, vars)
+
+
+def notify_query(query, elapsed):
+    for observer in query_observers:
+        try:
+            observer(query, elapsed)
+        except Exception as e:
+            logger.warning("⚠️ Observateur SQL en échec: %s", e)
+
+
+_timed_cursor_classes = {}
+
+
+def _timed(cursor_class):
+    timed = _timed_cursor_classes.get(cursor_class)
+    if timed is None:
+        timed = type(f'Timed{cursor_class.__name__}', (_TimedCursorMixin, cursor_class), {})
+        _timed_cursor_classes[cursor_class] = timed
+    return timed
+
+
+class InstrumentedConnection(extensions.connection):
+    """Connexion dont tous les curseurs (quel que soit cursor_factory) sont chronométrés"""
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.pop('cursor_factory', None) or self.cursor_factory or extensions.cursor
+        return super().cursor(*args, cursor_factory=_timed(factory), **kwargs)
+
+
+class DictRowCursor(extensions.cursor):
+    """Lignes en ``dict`` simples, construits depuis les tuples de psycopg2.
+
+    Même usage que ``RealDictCursor`` (``row['id']``) sans son coût : une
+    RealDictRow est remplie colonne par colonne en Python, ici ``dict(zip())``
+    construit chaque ligne en C.
+    """
+
+    def _columns(self):
+        return [column.name for column in self.description]
+
+    def fetchone(self):
+        row = super().fetchone()
+        return None if row is None else dict(zip(self._columns(), row))
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        if not rows:
+            return []
+        columns = self._columns()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def fetchall(self):
+        rows = super().fetchall()
+        if not rows:
+            return []
+        columns = self._columns()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def __iter__(self):
+        columns = None
+        while True:
+            try:
+                row = extensions.cursor.__next__(self)
+            except StopIteration:
+                return
+            if columns is None:
+                columns = self._columns()
+            yield dict(zip(columns, row))
+
+
+class PoolError(Exception):
+    """Erreur de base du pool"""
+
+
+class PoolTimeout(PoolError):
+    """Aucune connexion libérée avant l'expiration du délai d'attente"""
+
+
+class PoolExhausted(PoolError):
+    """File d'attente pleine : la requête est rejetée immédiatement"""
+
+
+class ConnectionPool:
+    """Pool thread-safe de connexions psycopg2.
+
+    - ``minconn``/``maxconn`` : taille minimale conservée / taille maximale
+    - ``timeout`` : attente maximale d'une connexion libre (secondes)
+    - ``max_waiting`` : nombre maximal de threads en attente (file bornée)
+    - ``max_lifetime`` : une connexion plus vieille est recyclée
+    - ``max_idle`` : au-delà de ``minconn``, une connexion inactive est fermée
+    - ``check_idle`` : une connexion inactive depuis plus longtemps est
+      vérifiée (``SELECT 1``) avant d'être rendue à l'appelant
+    """
+
+    def __init__(self, minconn=1, maxconn=8, timeout=5.0, max_waiting=32,
+                 max_lifetime=1800.0, max_idle=300.0, check_idle=5.0,
+                 name='primary', **conn_kwargs):
+        if maxconn < 1 or minconn < 0 or minconn > maxconn:
+            raise ValueError('Invalid pool size')
+        self.name = name
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_waiting = max_waiting
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_idle = check_idle
+        self.conn_kwargs = conn_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = deque()      # (conn, last_used) - LIFO pour garder les connexions chaudes
+        self._created = {}        # id(conn) -> date de création
+        self._size = 0            # connexions ouvertes ou en cours d'ouverture
+        self._waiting = 0
+        self._closed = False
+
+        # Métriques de saturation
+        self._checkouts = 0
+        self._timeouts = 0
+        self._rejected = 0
+        self._opened = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_last = 0.0
+        self._wait_ewma = 0.0
+
+    # ---------- ouverture / fermeture ----------
+
+    def _connect(self):
+        conn = psycopg2.connect(connection_factory=InstrumentedConnection, **self.conn_kwargs)
+        with self._cond:
+            self._created[id(conn)] = time.monotonic()
+            self._opened += 1
+        return conn
+
+    def _close(self, conn):
+        with self._cond:
+            self._created.pop(id(conn), None)
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def prefill(self):
+        """Ouvre ``minconn`` connexions (erreurs ignorées, le pool reste utilisable)"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.minconn:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception as e:
+                with self._cond:
+                    self._size -= 1
+                logger.warning("⚠️ Préremplissage du pool impossible: %s", e)
+                return
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close(conn)
+
+    # ---------- emprunt / restitution ----------
+
+    def _expired(self, conn, now):
+        created = self._created.get(id(conn), now)
+        return self.max_lifetime > 0 and now - created > self.max_lifetime
+
+    def _usable(self, conn, last_used):
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if self._expired(conn, now):
+            return False
+        if now - last_used > self.check_idle:
+            try:
+                cur = conn.cursor()
+                cur.execute('SELECT 1')
+                cur.close()
+                conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    def getconn(self, timeout=None):
+        """Emprunte une connexion, en attendant au plus ``timeout`` secondes"""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        while True:
+            conn = None
+            error = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError('Pool is closed')
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        break
+                    if self._waiting >= self.max_waiting:
+                        self._rejected += 1
+                        error = PoolExhausted(f'{self._waiting} requests already waiting for a connection')
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        error = PoolTimeout(f'No connection available after {timeout}s')
+                        break
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            if error is not None:
+                self._notify('rejected' if isinstance(error, PoolExhausted) else 'timeout',
+                             time.monotonic() - start)
+                raise error
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._usable(conn, last_used):
+                self._close(conn)
+                continue
+
+            waited = time.monotonic() - start
+            self._record_wait(waited)
+            self._notify('checkout', waited)
+            return conn
+
+    def putconn(self, conn, close=False):
+        """Rend une connexion au pool (rollback si une transaction est restée ouverte)"""
+        if not close and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                close = True
+        now = time.monotonic()
+        with self._cond:
+            recycle = close or conn.closed or self._closed or self._expired(conn, now)
+            if not recycle:
+                self._idle.append((conn, now))
+                self._cond.notify()
+                stale = self._pop_stale(now)
+            else:
+                stale = []
+        if recycle:
+            self._close(conn)
+        for old in stale:
+            self._close(old)
+        self._notify('checkin', 0.0)
+
+    def _notify(self, event, waited):
+        for observer in pool_observers:
+            try:
+                observer(event, self, waited)
+            except Exception as e:
+                logger.warning("⚠️ Observateur du pool en échec: %s", e)
+
+    def _pop_stale(self, now):
+        """Retire les connexions inactives au-delà de ``minconn`` (verrou tenu)"""
+        stale = []
+        if self.max_idle <= 0:
+            return stale
+        while self._size - len(stale) > self.minconn and self._idle:
+            conn, last_used = self._idle[0]
+            if now - last_used <= self.max_idle:
+                break
+            self._idle.popleft()
+            stale.append(conn)
+        return stale
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        except Exception:
+            self.putconn(conn)
+            raise
+        else:
+            self.putconn(conn)
+
+    # ---------- métriques ----------
+
+    def load(self):
+        """Connexions empruntées + threads en attente (répartition entre réplicas)"""
+        with self._cond:
+            return self._size - len(self._idle) + self._waiting
+
+    def _record_wait(self, waited):
+        with self._cond:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_last = waited
+            # Moyenne mobile (~20 derniers emprunts) : seuil de délestage de common/admission.py
+            self._wait_ewma += 0.1 * (waited - self._wait_ewma)
+            if waited > self._wait_max:
+                self._wait_max = waited
+
+    def pressure(self):
+        """(connexions libres, threads en attente, attente moyenne récente en secondes)"""
+        with self._cond:
+            return len(self._idle) + self.maxconn - self._size, self._waiting, self._wait_ewma
+
+    def stats(self):
+        """Métriques de saturation (exposées par /ready)"""
+        with self._cond:
+            idle = len(self._idle)
+            in_use = self._size - idle
+            return {
+                'min': self.minconn,
+                'max': self.maxconn,
+                'size': self._size,
+                'idle': idle,
+                'in_use': in_use,
+                'waiting': self._waiting,
+                'max_waiting': self.max_waiting,
+                'saturation': round(in_use / self.maxconn, 3),
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'rejected': self._rejected,
+                'connections_opened': self._opened,
+                'connections_closed': self._discarded,
+                'wait_ms_avg': round(1000 * self._wait_total / self._checkouts, 3) if self._checkouts else 0.0,
+                'wait_ms_max': round(1000 * self._wait_max, 3),
+                'wait_ms_last': round(1000 * self._wait_last, 3),
+                'wait_ms_ewma': round(1000 * self._wait_ewma, 3),
+            }
+
+
+# ==================== POOL DU PROCESSUS ====================
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_replicas = None
+
+
+def get_pool():
+    """Pool du processus courant, créé à la demande (et recréé après un fork)"""
+    global _pool, _pool_pid, _replicas
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            # Après un fork, les sockets héritées appartiennent au parent : on
+            # les abandonne sans les fermer proprement
+            _pool = ConnectionPool(**POOL_CONFIG, **DB_CONFIG)
+            _pool_pid = pid
+            _replicas = None
+            _pool.prefill()
+            logger.info("🗄️ Pool DB créé (min=%s, max=%s)", _pool.minconn, _pool.maxconn)
+    return _pool
+
+
+def close_pool():
+    """Ferme les connexions des pools de ce processus (arrêt d'un worker)"""
+    global _pool, _replicas
+    with _pool_lock:
+        pool, _pool = _pool, None
+        replicas, _replicas = _replicas or [], None
+    if _pool_pid == os.getpid():
+        for p in [pool] + [replica.pool for replica in replicas]:
+            if p is not None:
+                p.close()
+
+
+def pool_stats():
+    """Métriques du pool, sans le créer s'il n'existe pas encore"""
+    if _pool is None or _pool_pid != os.getpid():
+        return None
+    return _pool.stats()
+
+
+# ==================== RÉPLICAS EN LECTURE ====================
+
+# Retard de rejeu en secondes (0 si tout le WAL reçu est rejoué : un primaire
+# sans écriture ne fait pas paraître le réplica en retard)
+REPLICA_LAG_SQL = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+'''
+
+# Le réplica a-t-il rejoué la position ``%s`` du WAL ? (vrai sur un réplica promu)
+REPLICA_CAUGHT_UP_SQL = 'SELECT COALESCE(pg_last_wal_replay_lsn() >= %s::pg_lsn, NOT pg_is_in_recovery())'
+
+READ_YOUR_WRITES_COOKIE = 'db_rw'
+READ_YOUR_WRITES_HEADER = 'X-DB-LSN'
+PRIMARY_MARKER = 'primary'
+
+_LSN_PATTERN = re.compile(r'^[0-9A-F]{1,8}/[0-9A-F]{1,8}$')
+
+
+def replica_targets():
+    """(nom, paramètres de connexion) de chaque entrée de DB_REPLICAS"""
+    targets = []
+    for entry in REPLICA_CONFIG['replicas']:
+        if '://' in entry:
+            params = extensions.parse_dsn(entry)
+            targets.append((f"{params.get('host', '')}:{params.get('port', '5432')}", {'dsn': entry}))
+        else:
+            host, _, port = entry.partition(':')
+            port = port or DB_CONFIG['port']
+            targets.append((f'{host}:{port}', {**DB_CONFIG, 'host': host, 'port': port}))
+    return targets
+
+
+def parse_read_your_writes(value):
+    """Marqueur reçu du client : PRIMARY_MARKER, une position du WAL, ou None"""
+    if not value or REPLICA_CONFIG['read_your_writes'] == 'off':
+        return None
+    value = value.strip().upper()
+    if value == PRIMARY_MARKER.upper() or REPLICA_CONFIG['read_your_writes'] == 'sticky':
+        return PRIMARY_MARKER
+    return value if _LSN_PATTERN.match(value) else None
+
+
+class Replica:
+    """Réplica en lecture : son pool et son état (écarté après une erreur ou un retard excessif)"""
+
+    def __init__(self, name, conn_kwargs):
+        self.name = name
+        self.pool = ConnectionPool(**{**POOL_CONFIG, 'minconn': 0}, name=name, **conn_kwargs)
+        self.lag = None
+        self._checked_at = 0.0
+        self._ejected_until = 0.0
+
+    def available(self, now):
+        return now >= self._ejected_until
+
+    def eject(self, reason):
+        self._ejected_until = time.monotonic() + REPLICA_CONFIG['eject_seconds']
+        logger.warning("⚠️ Réplica %s écarté pour %ss: %s", self.name, REPLICA_CONFIG['eject_seconds'], reason)
+
+    def checkout(self, min_lsn=None):
+        """Connexion à ce réplica s'il est sain (et a rejoué ``min_lsn``), sinon None"""
+        try:
+            conn = self.pool.getconn(timeout=REPLICA_CONFIG['checkout_timeout'])
+        except PoolError:
+            # Pool saturé : le réplica reste sain, on essaie le suivant sans attendre
+            return None
+        except Exception as e:
+            self.eject(e)
+            return None
+        try:
+            now = time.monotonic()
+            cur = conn.cursor()
+            if now - self._checked_at > REPLICA_CONFIG['check_interval']:
+                cur.execute(REPLICA_LAG_SQL)
+                self.lag = float(cur.fetchone()[0])
+                self._checked_at = now
+                if self.lag > REPLICA_CONFIG['max_lag']:
+                    self.eject(f'retard de {self.lag:.1f}s')
+                    cur.close()
+                    self.pool.putconn(conn)
+                    return None
+            caught_up = True
+            if min_lsn is not None:
+                cur.execute(REPLICA_CAUGHT_UP_SQL, (min_lsn,))
+                caught_up = cur.fetchone()[0]
+            cur.close()
+            conn.rollback()
+        except Exception as e:
+            self.pool.putconn(conn, close=True)
+            self.eject(e)
+            return None
+        if not caught_up:
+            self.pool.putconn(conn)
+            return None
+        return conn
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'available': self.available(time.monotonic()),
+            'lag_seconds': self.lag,
+            'pool': self.pool.stats(),
+        }
+
+
+_rotation = itertools.count()
+
+
+def get_replicas():
+    """Réplicas du processus courant (pools créés à la demande, recréés après un fork)"""
+    global _replicas
+    get_pool()
+    if _replicas is None:
+        with _pool_lock:
+            if _replicas is None:
+                _replicas = [Replica(name, conn_kwargs) for name, conn_kwargs in replica_targets()]
+    return _replicas
+
+
+def borrow_read(read_your_writes=None):
+    """(pool, connexion) pour une lecture : réplica sain le moins chargé, sinon primaire
+
+    ``read_your_writes`` (voir parse_read_your_writes) : PRIMARY_MARKER force le
+    primaire ; une position du WAL exclut les réplicas qui ne l'ont pas rejouée.
+    """
+    replicas = get_replicas() if REPLICA_CONFIG['replicas'] else []
+    if replicas and read_your_writes != PRIMARY_MARKER:
+        now = time.monotonic()
+        shift = next(_rotation) % len(replicas)
+        # Rotation puis tri stable : à charge égale, les réplicas sont pris à tour de rôle
+        candidates = [r for r in replicas[shift:] + replicas[:shift] if r.available(now)]
+        for replica in sorted(candidates, key=lambda r: r.pool.load()):
+            conn = replica.checkout(read_your_writes)
+            if conn is not None:
+                return replica.pool, conn
+    pool = get_pool()
+    return pool, pool.getconn()
+
+
+def replica_stats():
+    """État des réplicas, sans créer leurs pools s'ils n'existent pas encore"""
+    if _replicas is None or _pool_pid != os.getpid():
+        return []
+    return [replica.stats() for replica in _replicas]
+
+
+# ==================== INTÉGRATION FLASK ====================
+
+def read_only(view):
+    """Vue en lecture seule : get_db() y emprunte une connexion à un réplica"""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        from flask import g
+        g.db_read_only = True
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def read_your_writes_pending():
+    """Le client vient d'écrire : ses lectures doivent voir ses écritures (cache exclu)"""
+    from flask import has_request_context, request
+    if not REPLICA_CONFIG['replicas'] or not has_request_context():
+        return False
+    return _request_marker(request) is not None
+
+
+def _request_marker(request):
+    return parse_read_your_writes(
+        request.headers.get(READ_YOUR_WRITES_HEADER) or request.cookies.get(READ_YOUR_WRITES_COOKIE)
+    )
+
+
+@contextmanager
+def read_connection():
+    """Connexion en lecture hors get_db() (streaming), rendue à la sortie du bloc"""
+    from flask import has_request_context, request
+    marker = _request_marker(request) if has_request_context() else None
+    pool, conn = borrow_read(marker)
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+def get_db():
+    """Connexion du pool pour la requête en cours, rendue automatiquement en fin de requête"""
+    from flask import g, request
+    if 'db_conn' not in g:
+        try:
+            if g.get('db_read_only') and REPLICA_CONFIG['replicas']:
+                pool, conn = borrow_read(_request_marker(request))
+            else:
+                pool = get_pool()
+                conn = pool.getconn()
+        except Exception as e:
+            logger.error("DB Error: %s", e)
+            return None
+        g.db_pool, g.db_conn = pool, conn
+    return g.db_conn
+
+
+def _release_db(exc=None):
+    from flask import g
+    pool = g.pop('db_pool', None)
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        pool.putconn(conn)
+
+
+def _current_lsn():
+    """Position courante du WAL du primaire (après le COMMIT de la requête)"""
+    from flask import g
+    try:
+        if g.get('db_pool') is get_pool() and g.get('db_conn') is not None:
+            conn = g.db_conn
+            cur = conn.cursor()
+            cur.execute('SELECT pg_current_wal_lsn()::text')
+            lsn = cur.fetchone()[0]
+            cur.close()
+            conn.rollback()
+            return lsn
+        with get_pool().connection() as conn:
+            cur = conn.cursor()
+            cur.execute('SELECT pg_current_wal_lsn()::text')
+            lsn = cur.fetchone()[0]
+            cur.close()
+            return lsn
+    except Exception as e:
+        logger.warning("⚠️ Position du WAL indisponible: %s", e)
+        return None
+
+
+def _mark_writes(response):
+    """Après une écriture réussie, marque le client pour ses prochaines lectures"""
+    from flask import g, request
+    if (request.method in ('GET', 'HEAD', 'OPTIONS') or g.get('db_read_only')
+            or response.status_code >= 400):
+        return response
+    if REPLICA_CONFIG['read_your_writes'] == 'sticky':
+        marker = PRIMARY_MARKER
+    else:
+        marker = _current_lsn()
+        if marker is None:
+            return response
+        response.headers[READ_YOUR_WRITES_HEADER] = marker
+    response.set_cookie(READ_YOUR_WRITES_COOKIE, marker, httponly=True, samesite='Lax',
+                        max_age=REPLICA_CONFIG['read_your_writes_seconds'])
+    return response
+
+
+def init_app(app):
+    """Rend la connexion de la requête au pool à la fin de chaque requête"""
+    app.teardown_appcontext(_release_db)
+    if REPLICA_CONFIG['replicas'] and REPLICA_CONFIG['read_your_writes'] != 'off':
+        app.after_request(_mark_writes)
@@ -0,0 +1,334 @@
+"""Flux de changements temps réel (Server-Sent Events) sur LISTEN/NOTIFY.
+
+    GET /posts/events      (posts et utilisateurs)
+    GET /users/events
+
+Les handlers d'écriture publient leurs créations / modifications /
+suppressions avec ``publish(cur, topic, op, rows)`` dans leur transaction :
+``pg_notify`` n'est délivré qu'au COMMIT, jamais après un ROLLBACK.
+
+Chaque processus ouvre une seule connexion ``LISTEN changes`` (thread
+démarré au premier abonné) et diffuse chaque notification à ses abonnés SSE
+dans une file bornée par abonné : la base ne voit jamais qu'une connexion
+par worker, quel que soit le nombre de navigateurs connectés.
+
+Format du flux (``text/event-stream``) :
+
+- ``data: {"topic": "posts", "op": "create|update|delete|reset", "id": ..., "data": {...}}``
+  avec un ``id:`` repris par le navigateur dans ``Last-Event-ID`` à la
+  reconnexion ; ``data`` est omis si la ligne dépasse la taille d'une
+  notification PostgreSQL (le client relit alors la ressource), ``op=reset``
+  signale une écriture en masse
+- ``event: reset`` : des événements ont été perdus (abonné trop lent,
+  reprise au-delà du tampon, connexion LISTEN rétablie) : le client
+  recharge ses listes
+- ``: keepalive`` toutes les ``heartbeat`` secondes (proxies, détection des
+  clients partis)
+
+Livraison au mieux : les ``buffer`` derniers événements du processus sont
+rejoués à la reconnexion ; au-delà (autre worker ou pod, redémarrage), le
+client reçoit ``event: reset``.
+
+Sous gunicorn (gthread), un flux occupe un thread du worker pendant toute
+sa durée : ``max_subscribers`` par worker le borne, et ``max_stream``
+ferme les flux régulièrement (le navigateur se reconnecte seul, les flux se
+répartissent sur les workers).
+"""
+import os
+import time
+import uuid
+import select
+import logging
+import threading
+from collections import deque, namedtuple
+
+import psycopg2
+from flask import Response, jsonify, request
+
+from common import db, jsonio, metrics
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CONFIG = {
+    'enabled': os.environ.get('EVENTS_ENABLED', '1') != '0',
+    # Par worker ; le reste des threads sert les requêtes ordinaires
+    'max_subscribers': int(os.environ.get('EVENTS_MAX_SUBSCRIBERS', '4')),
+    'queue_size': int(os.environ.get('EVENTS_QUEUE_SIZE', '256')),
+    'buffer_size': int(os.environ.get('EVENTS_BUFFER', '1000')),
+    'heartbeat': float(os.environ.get('EVENTS_HEARTBEAT', '15')),
+    'max_stream': float(os.environ.get('EVENTS_MAX_STREAM_SECONDS', '300')),
+    'retry_ms': int(os.environ.get('EVENTS_RETRY_MS', '3000')),
+    # Au-delà, une écriture publie un seul événement op=reset
+    'max_rows': int(os.environ.get('EVENTS_MAX_ROWS', '100')),
+}
+
+CHANNEL = 'changes'
+
+# Limite d'une notification PostgreSQL : 8000 octets
+MAX_PAYLOAD = 7900
+
+MIMETYPE = 'text/event-stream'
+STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    # nginx : pas de mise en tampon de la réponse
+    'X-Accel-Buffering': 'no',
+}
+
+Event = namedtuple('Event', 'id seq topic data')
+
+# Événements perdus pour l'abonné : il recharge ses listes
+RESET = object()
+
+
+# ==================== PUBLICATION ====================
+
+def encode(topic, op, row):
+    """Charge utile d'une notification pour une ligne (dict avec ``id``)"""
+    message = {'topic': topic, 'op': op, 'id': row['id'], 'data': row}
+    payload = jsonio.dumps(message)
+    if len(payload.encode()) > MAX_PAYLOAD:
+        del message['data']
+        payload = jsonio.dumps(message)
+    return payload
+
+
+def encode_reset(topic, count):
+    return jsonio.dumps({'topic': topic, 'op': 'reset', 'count': count})
+
+
+def payloads(topic, op, rows):
+    """Notifications pour ``rows`` : une par ligne, une seule ``reset`` pour une écriture en masse"""
+    if len(rows) > EVENTS_CONFIG['max_rows']:
+        return [encode_reset(topic, len(rows))]
+    return [encode(topic, op, row) for row in rows]
+
+
+def publish(cur, topic, op, rows):
+    """Publie ``op`` pour ``rows`` sur ``topic``, délivré au COMMIT de la transaction de ``cur``"""
+    if not rows or not EVENTS_CONFIG['enabled']:
+        return
+    cur.execute('SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload',
+                (CHANNEL, payloads(topic, op, rows)))
+
+
+def publish_reset(cur, *topics):
+    """Écriture hors API (import en masse...) : les abonnés de ``topics`` rechargent tout"""
+    cur.execute('SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload',
+                (CHANNEL, [encode_reset(topic, None) for topic in topics]))
+
+
+# ==================== ABONNÉS ====================
+
+class Subscription:
+    """File bornée des événements d'un abonné"""
+
+    def __init__(self, topics, size):
+        self.topics = frozenset(topics)
+        self.size = size
+        self._events = deque()
+        self._reset = False
+        self._cond = threading.Condition()
+
+    def _put(self, event):
+        if event is RESET or len(self._events) >= self.size:
+            # Abonné trop lent ou événements perdus : la file ne sert plus à rien
+            if event is not RESET:
+                metrics.EVENTS_RESETS.labels(metrics.service(), 'overflow').inc()
+            self._events.clear()
+            self._reset = True
+        else:
+            self._events.append(event)
+
+    def _take(self):
+        if self._reset:
+            self._reset = False
+            return RESET
+        if self._events:
+            return self._events.popleft()
+        return None
+
+    def push(self, event):
+        with self._cond:
+            self._put(event)
+            self._cond.notify()
+
+    def next(self, timeout):
+        """Prochain événement, ``RESET``, ou None après ``timeout`` s sans événement"""
+        with self._cond:
+            if not self._reset and not self._events:
+                self._cond.wait(timeout)
+            return self._take()
+
+
+class Hub:
+    """Diffusion des notifications d'un processus à ses abonnés
+
+    Les ids d'événement sont ``<session>-<n>`` : la session change à chaque
+    (re)connexion du LISTEN, un ``Last-Event-ID`` d'une autre session ne
+    peut pas être repris.
+    """
+
+    def __init__(self, max_subscribers=0, queue_size=256, buffer_size=1000,
+                 subscription_class=Subscription):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.subscription_class = subscription_class
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._buffer = deque(maxlen=buffer_size)
+        self._seq = 0
+        self.session = uuid.uuid4().hex[:8]
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self, topics, last_event_id=None):
+        """Nouvel abonné (None si ``max_subscribers`` est atteint)"""
+        with self._lock:
+            if self.max_subscribers and len(self._subscribers) >= self.max_subscribers:
+                return None
+            subscription = self.subscription_class(topics, self.queue_size)
+            if last_event_id:
+                self._replay(subscription, last_event_id)
+            self._subscribers.add(subscription)
+        metrics.EVENTS_SUBSCRIBERS.labels(metrics.service()).inc()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription not in self._subscribers:
+                return
+            self._subscribers.discard(subscription)
+        metrics.EVENTS_SUBSCRIBERS.labels(metrics.service()).dec()
+
+    def _replay(self, subscription, last_event_id):
+        session, _, seq = last_event_id.rpartition('-')
+        oldest = self._buffer[0].seq if self._buffer else self._seq + 1
+        if session != self.session or not seq.isdigit() or not oldest - 1 <= int(seq) <= self._seq:
+            metrics.EVENTS_RESETS.labels(metrics.service(), 'resume').inc()
+            subscription.push(RESET)
+            return
+        for event in self._buffer:
+            if event.seq > int(seq) and event.topic in subscription.topics:
+                subscription.push(event)
+
+    def dispatch(self, payload):
+        """Transmet une notification aux abonnés de son topic"""
+        try:
+            topic = jsonio.loads(payload)['topic']
+        except (ValueError, TypeError, KeyError):
+            logger.warning("⚠️ Notification %s ignorée: %r", CHANNEL, payload[:100])
+            return
+        with self._lock:
+            self._seq += 1
+            event = Event(f'{self.session}-{self._seq}', self._seq, topic, payload)
+            self._buffer.append(event)
+            for subscription in self._subscribers:
+                if topic in subscription.topics:
+                    subscription.push(event)
+
+    def reset(self):
+        """Notifications perdues (LISTEN interrompu) : nouvelle session, tous les abonnés rechargent"""
+        with self._lock:
+            self.session = uuid.uuid4().hex[:8]
+            self._buffer.clear()
+            self._seq = 0
+            for subscription in self._subscribers:
+                subscription.push(RESET)
+        metrics.EVENTS_RESETS.labels(metrics.service(), 'listen').inc()
+
+
+def format_event(event):
+    """Trame SSE d'un événement (ou de ``RESET``)"""
+    if event is RESET:
+        return 'event: reset\ndata: {}\n\n'
+    return f'id: {event.id}\ndata: {event.data}\n\n'
+
+
+# ==================== ÉCOUTE (un thread par processus) ====================
+
+LISTEN_POLL = 30.0
+
+
+def _listen(hub):
+    backoff = 1.0
+    connected_once = False
+    while True:
+        try:
+            conn = psycopg2.connect(**db.DB_CONFIG)
+            try:
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute(f'LISTEN {CHANNEL}')
+                if connected_once:
+                    hub.reset()
+                connected_once = True
+                backoff = 1.0
+                logger.info("📡 Flux de changements: écoute de %s", CHANNEL)
+                while True:
+                    if select.select([conn], [], [], LISTEN_POLL) == ([], [], []):
+                        # Connexion à moitié ouverte : détectée par une requête
+                        cur.execute('SELECT 1')
+                    conn.poll()
+                    while conn.notifies:
+                        hub.dispatch(conn.notifies.pop(0).payload)
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.error("❌ Flux de changements: %s", e)
+            backoff = min(backoff * 2, 30.0)
+        time.sleep(backoff)
+
+
+_hub = None
+_hub_pid = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    """Diffuseur du processus courant ; son thread d'écoute démarre au premier appel (après le fork)"""
+    global _hub, _hub_pid
+    pid = os.getpid()
+    if _hub is not None and _hub_pid == pid:
+        return _hub
+    with _hub_lock:
+        if _hub is None or _hub_pid != pid:
+            hub = Hub(EVENTS_CONFIG['max_subscribers'], EVENTS_CONFIG['queue_size'], EVENTS_CONFIG['buffer_size'])
+            threading.Thread(target=_listen, args=(hub,), name='events-listen', daemon=True).start()
+            _hub, _hub_pid = hub, pid
+    return _hub
+
+
+# ==================== VUE FLASK ====================
+
+def stream(topics):
+    """Réponse SSE des événements de ``topics`` pour la requête courante
+
+    À utiliser dans une vue marquée ``@admission.streaming`` : le flux
+    compte pour la limite de débit, pas pour la limite de concurrence.
+    """
+    if not EVENTS_CONFIG['enabled']:
+        return jsonify({'success': False, 'error': 'Change feed disabled'}), 404
+    hub = get_hub()
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    subscription = hub.subscribe(topics, last_event_id)
+    if subscription is None:
+        response = jsonify({'success': False, 'error': 'Too many event subscribers, retry later'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(max(1, EVENTS_CONFIG['retry_ms'] // 1000))
+        return response
+
+    def generate():
+        try:
+            yield f"retry: {EVENTS_CONFIG['retry_ms']}\n\n"
+            deadline = time.monotonic() + EVENTS_CONFIG['max_stream']
+            while time.monotonic() < deadline:
+                event = subscription.next(EVENTS_CONFIG['heartbeat'])
+                if event is None:
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_event(event)
+        finally:
+            hub.unsubscribe(subscription)
+
+    return Response(generate(), mimetype=MIMETYPE, headers=STREAM_HEADERS)
@@ -0,0 +1,134 @@
+"""Sérialisation JSON rapide des réponses (orjson, repli sur json).
+
+``FastJSONProvider`` remplace le fournisseur JSON par défaut de Flask :
+``jsonify`` et ``app.json.dumps`` passent par orjson (implémenté en Rust,
+dates encodées nativement) quand il est installé.
+
+Format des dates (``JSON_DATETIME_FORMAT``) :
+- ``http`` (défaut) : RFC 822 en UTC, identique à ``jsonify`` de Flask
+  (``"Tue, 02 Jan 2024 10:00:00 GMT"``) — compatible avec les clients existants
+- ``iso`` : ISO 8601 (``"2024-01-02T10:00:00+00:00"``), encodé sans appel
+  Python par orjson : le plus rapide
+
+``stream_array()`` encode une réponse ``{..., "posts": [...]}`` par blocs,
+sans construire la liste complète en mémoire.
+"""
+import os
+import json
+import uuid
+import decimal
+import dataclasses
+from datetime import date, datetime, timezone
+
+from flask.json.provider import DefaultJSONProvider
+
+from common import tracing
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    orjson = None
+
+JSON_CONFIG = {
+    'datetime_format': os.environ.get('JSON_DATETIME_FORMAT', 'http'),
+}
+
+HTTP_DATES = JSON_CONFIG['datetime_format'] != 'iso'
+
+
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def http_date(value):
+    """RFC 822 en UTC, comme ``email.utils.format_datetime(..., usegmt=True)`` mais sans détour"""
+    # Dates naïves de PostgreSQL (TIMESTAMP) : UTC, comme Flask
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return (f'{_DAYS[value.weekday()]}, {value.day:02d} {_MONTHS[value.month - 1]} {value.year:04d} '
+            f'{value.hour:02d}:{value.minute:02d}:{value.second:02d} GMT')
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        if HTTP_DATES:
+            return http_date(value)
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat()
+    if isinstance(value, date):
+        if HTTP_DATES:
+            return _default(datetime(value.year, value.month, value.day))
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if dataclasses.is_dataclass(value):
+        return dataclasses.asdict(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC
+    if HTTP_DATES:
+        _OPTIONS |= orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps_bytes(obj):
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+    def loads(data):
+        return orjson.loads(data)
+else:
+    def dumps_bytes(obj):
+        return json.dumps(obj, default=_default, separators=(',', ':')).encode()
+
+    def loads(data):
+        return json.loads(data)
+
+
+def dumps(obj):
+    return dumps_bytes(obj).decode()
+
+
+def stream_array(envelope, key, chunks, tail=None):
+    """Encode ``{**envelope, key: [...], **tail()}`` à partir d'un itérable de blocs de lignes
+
+    ``tail`` est appelé une fois le tableau écrit : il fournit les valeurs
+    connues seulement à la fin (nombre de lignes...).
+    """
+    head = dumps_bytes(envelope)[:-1]
+    yield head + (b',' if len(head) > 1 else b'') + dumps_bytes(key) + b':['
+    first = True
+    for rows in chunks:
+        if not rows:
+            continue
+        body = b','.join(dumps_bytes(row) for row in rows)
+        yield body if first else b',' + body
+        first = False
+    end = dumps_bytes(tail()) if tail is not None else b'{}'
+    yield b']' + (b',' + end[1:] if len(end) > 2 else b'}') + b'\n'
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Fournisseur JSON de Flask basé sur orjson (``app.json = FastJSONProvider(app)``)"""
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Options du module json (indent...) : chemin lent, débogage uniquement
+            kwargs.setdefault('default', _default)
+            return json.dumps(obj, **kwargs)
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        with tracing.span('json.encode'):
+            body = dumps_bytes(obj) + b'\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_app(app):
+    app.json = FastJSONProvider(app)
@@ -0,0 +1,293 @@
+"""Journaux des services : JSON structuré, écrits hors du chemin des requêtes, échantillonnés.
+
+- Formatage différé : les appels passent leurs arguments
+  (``logger.info("✅ Post %s créé", post_id)``), le message n'est construit
+  que si l'enregistrement est gardé, et dans le thread d'écriture.
+- Écriture asynchrone : le thread de la requête ne fait que déposer
+  l'enregistrement dans une file bornée ; un thread du processus (démarré
+  après le fork) formate et écrit sur la sortie d'erreur. File pleine : les
+  INFO sont abandonnées (``logs_dropped_total``), les WARNING et au-delà
+  attendent une place.
+- Une ligne JSON par enregistrement : ``ts``, ``level``, ``logger``,
+  ``service``, ``message``, ``request_id`` et ``route`` pendant une requête,
+  plus ``method``, ``status`` et ``latency_ms`` pour la ligne d'accès
+  (``LOG_FORMAT=text`` : format texte habituel).
+- Échantillonnage par requête, décidé à l'entrée : une requête non retenue
+  n'écrit aucune INFO (ligne d'accès comprise). Les WARNING, les ERROR, les
+  réponses 5xx (ligne d'accès en ERROR) et les requêtes tracées
+  (``common/tracing.py``) sont toujours écrits.
+
+Taux : ``LOG_SAMPLE_RATE`` pour toutes les routes, ``LOG_SAMPLE_ROUTES``
+par route (``GET /posts=0.01,GET /health=0``, noms de règle Flask ou de
+ressource aiohttp).
+"""
+import os
+import sys
+import time
+import queue
+import atexit
+import random
+import logging
+import threading
+import contextvars
+import logging.handlers
+from datetime import datetime, timezone
+
+from common import jsonio, metrics, tracing
+
+
+def _parse_rates(raw):
+    rates = {}
+    for item in raw.split(','):
+        route, _, rate = item.strip().rpartition('=')
+        if route:
+            rates[route.strip()] = float(rate)
+    return rates
+
+
+LOG_CONFIG = {
+    'level': os.environ.get('LOG_LEVEL', 'INFO').upper(),
+    'format': os.environ.get('LOG_FORMAT', 'json'),
+    'async': os.environ.get('LOG_ASYNC', '1') != '0',
+    'queue_size': int(os.environ.get('LOG_QUEUE_SIZE', '10000')),
+    'sample_rate': float(os.environ.get('LOG_SAMPLE_RATE', '1')),
+    'sample_routes': _parse_rates(os.environ.get('LOG_SAMPLE_ROUTES', '')),
+    'access_log': os.environ.get('LOG_ACCESS', '1') != '0',
+}
+
+# Attente maximale d'un WARNING / ERROR quand la file est pleine (secondes)
+BLOCKING_PUT_TIMEOUT = 1.0
+
+# Champs de contexte recopiés dans la ligne JSON quand ils sont présents
+CONTEXT_FIELDS = ('request_id', 'route', 'method', 'status', 'latency_ms')
+
+access_logger = logging.getLogger('access')
+
+
+# ==================== CONTEXTE DE REQUÊTE ====================
+
+class RequestLog:
+    """Contexte de journalisation d'une requête (un par requête, dans un contextvar)"""
+
+    __slots__ = ('method', 'route', 'request_id', 'sampled', 'start')
+
+    def __init__(self, method, route, request_id, sampled):
+        self.method = method
+        self.route = route
+        self.request_id = request_id
+        self.sampled = sampled
+        self.start = time.perf_counter()
+
+
+_current = contextvars.ContextVar('request_log', default=None)
+
+
+def sample_rate(method, route):
+    return LOG_CONFIG['sample_routes'].get(f'{method} {route}', LOG_CONFIG['sample_rate'])
+
+
+def begin(method, route):
+    """Ouvre le contexte de la requête (après ``tracing.begin`` : identifiant et décision de trace)"""
+    trace = tracing.current()
+    rate = sample_rate(method, route)
+    sampled = (rate >= 1 or (rate > 0 and random.random() < rate)
+               or (trace is not None and trace.sampled))
+    return _current.set(RequestLog(method, route, tracing.request_id(), sampled))
+
+
+def end(token, status):
+    """Ligne d'accès de la requête puis fermeture du contexte"""
+    state = _current.get()
+    try:
+        if state is not None and LOG_CONFIG['access_log'] and (state.sampled or status >= 500):
+            latency_ms = round((time.perf_counter() - state.start) * 1000, 1)
+            access_logger.log(logging.ERROR if status >= 500 else logging.INFO,
+                              '%s %s %s %.1f ms', state.method, state.route, status, latency_ms,
+                              extra={'method': state.method, 'status': status, 'latency_ms': latency_ms})
+    finally:
+        _current.reset(token)
+
+
+class RequestContextFilter(logging.Filter):
+    """Écarte les INFO des requêtes non échantillonnées, ajoute request_id et route aux autres
+
+    Exécuté dans le thread de la requête, avant la mise en file : un
+    enregistrement écarté ne coûte ni formatage ni écriture.
+    """
+
+    def filter(self, record):
+        state = _current.get()
+        if state is None:
+            return True
+        if record.levelno < logging.WARNING and not state.sampled:
+            return False
+        record.request_id = state.request_id
+        record.route = state.route
+        return True
+
+
+# ==================== FORMATS ====================
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'service': self.service,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return jsonio.dumps(entry)
+
+
+class TextFormatter(logging.Formatter):
+    """Format de ``logging.basicConfig``, suivi de l'identifiant de requête"""
+
+    def __init__(self):
+        super().__init__(logging.BASIC_FORMAT)
+
+    def format(self, record):
+        line = super().format(record)
+        request_id = getattr(record, 'request_id', None)
+        return f'{line} [{request_id}]' if request_id else line
+
+
+# ==================== ÉCRITURE ASYNCHRONE ====================
+
+class AsyncHandler(logging.handlers.QueueHandler):
+    """Dépose les enregistrements dans une file ; un thread du processus les formate et les écrit
+
+    La file et son thread sont créés au premier enregistrement de chaque
+    processus : ceux du master gunicorn ne sont pas repris par les workers.
+    """
+
+    def __init__(self, target, queue_size):
+        logging.Handler.__init__(self)
+        self.target = target
+        self.queue_size = queue_size
+        self.queue = None
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._start_lock:
+            if self._pid != pid:
+                self.queue = queue.Queue(self.queue_size)
+                self.listener = logging.handlers.QueueListener(self.queue, self.target)
+                self.listener.start()
+                self._pid = pid
+
+    def handle(self, record):
+        # Pas de verrou du handler : queue.Queue est déjà sûre entre threads
+        if not self.filter(record):
+            return False
+        self.emit(record)
+        return True
+
+    def prepare(self, record):
+        # Message formaté par le thread d'écriture ; seule la trace d'exception
+        # est figée ici (la pile et ses variables ne restent pas en file)
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.target.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            try:
+                if record.levelno < logging.WARNING:
+                    raise
+                self.queue.put(record, timeout=BLOCKING_PUT_TIMEOUT)
+            except queue.Full:
+                metrics.LOGS_DROPPED.labels(metrics.service(), record.levelname).inc()
+
+    def emit(self, record):
+        try:
+            self._ensure_started()
+            self.enqueue(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        """Écrit ce qui reste en file (arrêt du processus)"""
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            self._pid = None
+
+
+_handler = None
+
+
+def configure(service):
+    """Remplace ``logging.basicConfig`` : format, niveau et écriture asynchrone du processus"""
+    global _handler
+    # Champs que les formats n'utilisent pas : ni pile d'appel (fichier, ligne)
+    # ni thread / processus relevés à la création de chaque enregistrement
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter(service) if LOG_CONFIG['format'] == 'json' else TextFormatter())
+    _handler = AsyncHandler(stream, LOG_CONFIG['queue_size']) if LOG_CONFIG['async'] else stream
+    _handler.addFilter(RequestContextFilter())
+    root.addHandler(_handler)
+    root.setLevel(LOG_CONFIG['level'])
+
+
+def flush():
+    if _handler is not None:
+        _handler.flush()
+
+
+atexit.register(flush)
+
+
+# ==================== FLASK ====================
+
+def _before_request():
+    from flask import g, request
+    rule = request.url_rule
+    g.log_token = begin(request.method, rule.rule if rule is not None else 'unmatched')
+
+
+def _after_request(response):
+    from flask import g
+    g.log_status = response.status_code
+    return response
+
+
+def _teardown_request(exc=None):
+    from flask import g
+    token = g.pop('log_token', None)
+    if token is not None:
+        end(token, g.pop('log_status', 500))
+
+
+def init_app(app):
+    """Contexte et ligne d'accès de chaque requête (après ``tracing.init_app`` : identifiant de requête)"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,201 @@
+"""Métriques Prometheus des microservices (endpoint /metrics).
+
+- Requêtes HTTP par route / méthode / statut, histogramme de latence,
+  requêtes en cours
+- Durée des requêtes SQL par opération (SELECT, INSERT...), et par requête
+  nommée avec le nombre de lignes
+- Attente d'une connexion du pool et occupation du pool
+- Hits / miss du cache de réponses
+- Taille des lots d'écriture groupée et attente dans la file
+- Latence des appels à users-service (côté posts-service)
+- Requêtes rejetées par le contrôle d'admission (429 / 503)
+- Abonnés du flux de changements (SSE) et resets envoyés
+- Traces abandonnées faute de place dans la file d'export
+
+Avec gunicorn, chaque worker a ses propres compteurs : définir
+``PROMETHEUS_MULTIPROC_DIR`` (répertoire vide, inscriptible) pour que
+/metrics agrège tous les workers du pod.
+"""
+import os
+import time
+
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+from common import db
+
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+HTTP_REQUESTS = Counter(
+    'http_requests_total', 'Requêtes HTTP traitées',
+    ['service', 'method', 'route', 'status'],
+)
+HTTP_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Durée de traitement des requêtes HTTP',
+    ['service', 'method', 'route'], buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'Requêtes HTTP en cours de traitement',
+    ['service'], multiprocess_mode='livesum',
+)
+DB_QUERY_LATENCY = Histogram(
+    'db_query_duration_seconds', 'Durée des requêtes SQL',
+    ['service', 'operation'], buckets=LATENCY_BUCKETS,
+)
+DB_ACQUIRE_LATENCY = Histogram(
+    'db_pool_acquire_seconds', "Attente d'une connexion du pool",
+    ['service', 'pool'], buckets=LATENCY_BUCKETS,
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'db_pool_connections', 'Connexions du pool par état (in_use, idle, waiting)',
+    ['service', 'pool', 'state'], multiprocess_mode='livesum',
+)
+DB_POOL_ERRORS = Counter(
+    'db_pool_errors_total', 'Emprunts au pool en échec (timeout, file pleine)',
+    ['service', 'pool', 'reason'],
+)
+NAMED_QUERY_LATENCY = Histogram(
+    'db_named_query_seconds', 'Durée des requêtes nommées (common/queries.py), lecture des lignes comprise',
+    ['service', 'query'], buckets=LATENCY_BUCKETS,
+)
+NAMED_QUERY_ROWS = Histogram(
+    'db_named_query_rows', 'Lignes retournées ou modifiées par requête nommée',
+    ['service', 'query'], buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000),
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Lectures du cache de réponses (hit / miss)',
+    ['service', 'view', 'result'],
+)
+WRITE_BATCH_SIZE = Histogram(
+    'write_batch_size', 'Lignes écrites par lot (group commit)',
+    ['service', 'batch'], buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+)
+WRITE_BATCH_WAIT = Histogram(
+    'write_batch_queue_seconds', "Attente d'une écriture avant le vidage de son lot",
+    ['service', 'batch'], buckets=LATENCY_BUCKETS,
+)
+WRITE_BATCH_REJECTED = Counter(
+    'write_batch_rejected_total', "Écritures rejetées, file d'écriture pleine",
+    ['service', 'batch'],
+)
+ADMISSION_REJECTED = Counter(
+    'admission_rejected_total', "Requêtes rejetées par le contrôle d'admission",
+    ['service', 'reason'],
+)
+EVENTS_SUBSCRIBERS = Gauge(
+    'events_subscribers', 'Abonnés connectés au flux de changements (SSE)',
+    ['service'], multiprocess_mode='livesum',
+)
+EVENTS_RESETS = Counter(
+    'events_resets_total', 'Événements perdus pour un abonné, remplacés par event: reset',
+    ['service', 'reason'],
+)
+TRACES_DROPPED = Counter(
+    'traces_dropped_total', "Traces échantillonnées abandonnées, file d'export pleine",
+    ['service'],
+)
+LOGS_DROPPED = Counter(
+    'logs_dropped_total', "Enregistrements de journal abandonnés, file d'écriture pleine",
+    ['service', 'level'],
+)
+USERS_SERVICE_LATENCY = Histogram(
+    'users_service_request_duration_seconds', 'Durée des appels à users-service',
+    ['service', 'outcome'], buckets=LATENCY_BUCKETS,
+)
+
+_service = 'unknown'
+
+
+def service():
+    """Nom du service instrumenté (label ``service``)"""
+    return _service
+
+
+def set_service(name):
+    """Label ``service`` des métriques enregistrées hors d'une app Flask (variante asyncio)"""
+    global _service
+    _service = name
+
+
+def _operation(sql):
+    if isinstance(sql, bytes):
+        sql = sql[:32].decode('utf-8', 'replace')
+    else:
+        sql = str(sql)[:32]
+    words = sql.split(None, 1)
+    return words[0].upper() if words else 'UNKNOWN'
+
+
+def _observe_query(sql, seconds):
+    DB_QUERY_LATENCY.labels(_service, _operation(sql)).observe(seconds)
+
+
+def _observe_pool(event, pool, waited):
+    # pool : 'primary' ou hôte:port du réplica
+    if event == 'checkout':
+        DB_ACQUIRE_LATENCY.labels(_service, pool.name).observe(waited)
+    elif event in ('timeout', 'rejected'):
+        DB_POOL_ERRORS.labels(_service, pool.name, event).inc()
+    stats = pool.stats()
+    for state in ('in_use', 'idle', 'waiting'):
+        DB_POOL_CONNECTIONS.labels(_service, pool.name, state).set(stats[state])
+
+
+def observe_users_service(outcome, seconds):
+    USERS_SERVICE_LATENCY.labels(service(), outcome).observe(seconds)
+
+
+def _route():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_in_flight = True
+    HTTP_IN_FLIGHT.labels(_service).inc()
+
+
+def _after_request(response):
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        route = _route()
+        HTTP_LATENCY.labels(_service, request.method, route).observe(time.perf_counter() - start)
+        HTTP_REQUESTS.labels(_service, request.method, route, str(response.status_code)).inc()
+    return response
+
+
+def _teardown_request(exc=None):
+    if g.pop('metrics_in_flight', False):
+        HTTP_IN_FLIGHT.labels(_service).dec()
+
+
+def metrics_view():
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app, service):
+    """Instrumente ``app`` et ajoute GET /metrics"""
+    set_service(service)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view, methods=['GET'])
+    if _observe_query not in db.query_observers:
+        db.query_observers.append(_observe_query)
+    if _observe_pool not in db.pool_observers:
+        db.pool_observers.append(_observe_pool)
+
+
+def child_exit(server, worker):
+    """Hook gunicorn : nettoie les fichiers de métriques d'un worker terminé"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,195 @@
+"""Outbox transactionnel : flux de changements entre microservices.
+
+Le service émetteur écrit ses événements dans la table ``outbox`` dans la
+même transaction que la modification (``publish``) : l'événement existe si
+et seulement si la modification est validée. ``NOTIFY outbox`` réveille les
+consommateurs au ``COMMIT``.
+
+Un ``OutboxConsumer`` lit les événements de ses topics dans l'ordre et
+applique chaque lot dans une transaction qui avance aussi son offset
+(table ``outbox_offsets``) : un lot n'est jamais appliqué deux fois.
+
+L'offset porte sur ``(tx, id)`` et seuls les événements des transactions
+terminées sont lus (``tx`` < plus ancienne transaction en cours) : un
+événement validé après un autre mais avec un id plus petit n'est pas sauté.
+
+Un seul processus (verrou consultatif, tous workers et replicas confondus)
+consomme un topic donné ; les autres attendent en réserve (une connexion
+gardée ouverte, nouvel essai du verrou toutes les ``standby_interval``
+secondes) et prennent le relais si la connexion du titulaire tombe.
+"""
+import os
+import time
+import select
+import logging
+import threading
+
+import psycopg2
+from psycopg2.extras import Json, execute_values
+
+from common import db
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_CONFIG = {
+    'poll_interval': float(os.environ.get('OUTBOX_POLL_INTERVAL', '1')),
+    # Processus en réserve : intervalle entre deux essais du verrou
+    'standby_interval': float(os.environ.get('OUTBOX_STANDBY_INTERVAL', '15')),
+    'batch_size': int(os.environ.get('OUTBOX_BATCH_SIZE', '500')),
+    'retention_hours': float(os.environ.get('OUTBOX_RETENTION_HOURS', '24')),
+}
+
+CHANNEL = 'outbox'
+
+
+def publish(cur, topic, events):
+    """Ajoute des événements ``(clé, payload)`` à l'outbox dans la transaction de ``cur``"""
+    if not events:
+        return
+    execute_values(
+        cur,
+        'INSERT INTO outbox (topic, key, payload) VALUES %s',
+        [(topic, str(key), Json(payload)) for key, payload in events],
+        page_size=1000,
+    )
+    cur.execute('SELECT pg_notify(%s, %s)', (CHANNEL, topic))
+
+
+class OutboxConsumer:
+    """Applique les événements de ``topics`` avec ``handler(cur, events)``
+
+    ``events`` est une liste de dicts ``{id, topic, key, payload}`` dans
+    l'ordre de validation. ``after_commit(events)`` est appelé une fois le
+    lot validé (invalidation de caches...).
+    """
+
+    def __init__(self, name, topics, handler, after_commit=None,
+                 batch_size=500, poll_interval=1.0, standby_interval=15.0, retention_hours=24.0):
+        self.name = name
+        self.topics = list(topics)
+        self.handler = handler
+        self.after_commit = after_commit
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.standby_interval = standby_interval
+        self.retention_hours = retention_hours
+        self._pid = None
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+
+    # ---------- démarrage ----------
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid != pid:
+                # Démarré à la première requête : après le fork de gunicorn
+                threading.Thread(target=self._run, name=f'outbox-{self.name}', daemon=True).start()
+                self._pid = pid
+
+    def init_app(self, app):
+        app.before_request(self._ensure_started)
+
+    # ---------- boucle ----------
+
+    def _run(self):
+        backoff = self.poll_interval
+        while True:
+            try:
+                self._session()
+                backoff = self.poll_interval
+            except Exception as e:
+                logger.error("❌ Consommateur outbox %s: %s", self.name, e)
+                backoff = min(backoff * 2, 30.0)
+            time.sleep(backoff)
+
+    def _session(self):
+        """Attend le verrou du consommateur sur une connexion gardée ouverte, puis écoute
+
+        Ne retourne que sur erreur (connexion perdue...) : ``_run`` se reconnecte.
+        """
+        listener = psycopg2.connect(**db.DB_CONFIG)
+        try:
+            listener.autocommit = True
+            cur = listener.cursor()
+            while True:
+                cur.execute('SELECT pg_try_advisory_lock(hashtext(%s))', (f'outbox:{self.name}',))
+                if cur.fetchone()[0]:
+                    break
+                # Un autre processus consomme déjà : nouvel essai sur la même connexion
+                time.sleep(self.standby_interval)
+            cur.execute(f'LISTEN {CHANNEL}')
+            logger.info("📡 Consommateur outbox %s actif (%s)", self.name, ', '.join(self.topics))
+            while True:
+                self._drain()
+                if select.select([listener], [], [], self.poll_interval) != ([], [], []):
+                    listener.poll()
+                    listener.notifies.clear()
+        finally:
+            listener.close()
+
+    def _drain(self):
+        while self._apply_batch() == self.batch_size:
+            pass
+        now = time.monotonic()
+        if now - self._last_cleanup > 3600:
+            self._cleanup()
+            self._last_cleanup = now
+
+    def _apply_batch(self):
+        with db.get_pool().connection() as conn:
+            try:
+                cur = conn.cursor(cursor_factory=db.DictRowCursor)
+                cur.execute('SELECT last_tx, last_id FROM outbox_offsets WHERE consumer = %s FOR UPDATE',
+                            (self.name,))
+                offset = cur.fetchone() or {'last_tx': 0, 'last_id': 0}
+                cur.execute('''
+                    SELECT id, tx, topic, key, payload
+                    FROM outbox
+                    WHERE (tx, id) > (%s, %s)
+                      AND tx < txid_snapshot_xmin(txid_current_snapshot())
+                      AND topic = ANY(%s)
+                    ORDER BY tx, id
+                    LIMIT %s
+                ''', (offset['last_tx'], offset['last_id'], self.topics, self.batch_size))
+                events = cur.fetchall()
+                if not events:
+                    conn.rollback()
+                    return 0
+                self.handler(cur, events)
+                last = events[-1]
+                cur.execute('''
+                    INSERT INTO outbox_offsets (consumer, last_tx, last_id) VALUES (%s, %s, %s)
+                    ON CONFLICT (consumer) DO UPDATE
+                        SET last_tx = EXCLUDED.last_tx, last_id = EXCLUDED.last_id, updated_at = CURRENT_TIMESTAMP
+                ''', (self.name, last['tx'], last['id']))
+                conn.commit()
+                cur.close()
+            except Exception:
+                conn.rollback()
+                raise
+        if self.after_commit is not None:
+            try:
+                self.after_commit(events)
+            except Exception as e:
+                logger.warning("⚠️ after_commit %s: %s", self.name, e)
+        return len(events)
+
+    def _cleanup(self):
+        """Supprime les événements plus anciens que la rétention"""
+        with db.get_pool().connection() as conn:
+            try:
+                cur = conn.cursor()
+                cur.execute("DELETE FROM outbox WHERE created_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 hour'",
+                            (self.retention_hours,))
+                conn.commit()
+                cur.close()
+            except Exception:
+                conn.rollback()
+                raise
+
+
+def consumer(name, topics, handler, after_commit=None):
+    return OutboxConsumer(name, topics, handler, after_commit=after_commit, **OUTBOX_CONFIG)
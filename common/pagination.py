@@ -0,0 +1,160 @@
+"""Pagination par curseur (keyset) et export NDJSON en streaming.
+
+Les listes sont triées par ``(created_at DESC, id DESC)``. Le curseur
+renvoyé au client est opaque : c'est le couple (created_at, id) de la
+dernière ligne de la page, encodé en base64. La page suivante repart de là
+par une comparaison de tuples qui suit l'index, au lieu d'un OFFSET qui
+relit toutes les lignes précédentes.
+"""
+import os
+import json
+import base64
+import binascii
+from datetime import datetime
+
+from flask import Response, stream_with_context
+
+from common import jsonio, queries
+from common.db import DictRowCursor, read_connection
+
+DEFAULT_LIMIT = int(os.environ.get('PAGE_DEFAULT_LIMIT', '100'))
+MAX_LIMIT = int(os.environ.get('PAGE_MAX_LIMIT', '1000'))
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', '1000'))
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def encode_cursor(created_at, row_id):
+    raw = json.dumps([created_at.isoformat() if created_at else None, row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Retourne (created_at, id) ; lève ValueError si le curseur est invalide"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def encode_rank_cursor(rank, row_id):
+    """Curseur d'une liste triée par pertinence : (rang, id) de la dernière ligne"""
+    raw = json.dumps([rank, row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_rank_cursor(cursor):
+    """Retourne (rang, id) ; lève ValueError si le curseur est invalide"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        rank, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(rank), int(row_id)
+    except (binascii.Error, TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def _parse_limit(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1 or limit > MAX_LIMIT:
+        raise ValueError(f'limit must be between 1 and {MAX_LIMIT}')
+    return limit
+
+
+def parse_page_args(args):
+    """Lit ``limit`` et ``cursor`` dans la query string ; lève ValueError si invalides"""
+    limit = _parse_limit(args)
+    cursor = args.get('cursor')
+    after = decode_cursor(cursor) if cursor else None
+    return limit, after
+
+
+def parse_search_args(args, max_length=200):
+    """Lit ``q``, ``limit`` et ``cursor`` (rang, id) ; lève ValueError si invalides"""
+    q = (args.get('q') or '').strip()
+    if not q:
+        raise ValueError('q is required')
+    if len(q) > max_length:
+        raise ValueError(f'q must be at most {max_length} characters')
+    limit = _parse_limit(args)
+    cursor = args.get('cursor')
+    after = decode_rank_cursor(cursor) if cursor else None
+    return q, limit, after
+
+
+def keyset_where(after, created_col='created_at', id_col='id'):
+    """Clause SQL (et paramètres) sélectionnant les lignes après le curseur"""
+    if after is None:
+        return 'TRUE', ()
+    return f'({created_col}, {id_col}) < (%s, %s)', after
+
+
+def keyset_order(created_col='created_at', id_col='id'):
+    return f'{created_col} DESC, {id_col} DESC'
+
+
+def keyset_queries(name, select, created_col='created_at', id_col='id'):
+    """Requêtes nommées (première page, pages suivantes) de ``select`` (sans WHERE) paginé par curseur"""
+    order = keyset_order(created_col, id_col)
+    return (
+        queries.define(f'{name}.first', f'{select} ORDER BY {order} LIMIT %s'),
+        queries.define(f'{name}.after', f'{select} WHERE ({created_col}, {id_col}) < (%s, %s) ORDER BY {order} LIMIT %s'),
+    )
+
+
+def fetch_named_page(cur, pages, after, limit, params=()):
+    """Page après ``after`` avec les requêtes de keyset_queries() ; retourne (lignes, next_cursor)
+
+    ``params`` : paramètres de la liste de colonnes (``common/projection.py``)
+    """
+    if after is None:
+        rows = pages[0].fetchall(cur, (*params, limit + 1))
+    else:
+        rows = pages[1].fetchall(cur, (*params, *after, limit + 1))
+    return split_page(rows, limit)
+
+
+def fetch_page(cur, query, params, limit):
+    """Exécute ``query`` (sans LIMIT) et retourne (lignes, next_cursor)"""
+    cur.execute(f'{query} LIMIT %s', (*params, limit + 1))
+    return split_page(cur.fetchmany(limit + 1), limit)
+
+
+def split_page(rows, limit):
+    """Coupe ``rows`` (``limit`` + 1 lignes lues) en page et curseur de la page suivante"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last['created_at'], last['id'])
+    return rows, next_cursor
+
+
+def wants_ndjson(req):
+    return req.args.get('format') == 'ndjson' or req.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def ndjson_response(query, params, chunk_size=STREAM_CHUNK_SIZE):
+    """Streame le résultat de ``query`` en NDJSON via un curseur serveur nommé.
+
+    Seul un bloc de ``chunk_size`` lignes est en mémoire à la fois. La
+    connexion (réplica si configuré) est empruntée pour toute la durée du streaming.
+    """
+    dumps = jsonio.dumps_bytes
+
+    def generate():
+        with read_connection() as conn:
+            with conn.cursor(name='ndjson_export', cursor_factory=DictRowCursor) as cur:
+                cur.itersize = chunk_size
+                cur.execute(query, params)
+                while True:
+                    rows = cur.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield b''.join(dumps(row) + b'\n' for row in rows)
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
@@ -0,0 +1,137 @@
+"""Profilage à chaud d'un worker : ``GET /debug/profile``.
+
+    curl -H "Authorization: Bearer $PROFILE_TOKEN" \\
+        "http://localhost:5002/debug/profile?seconds=30" > posts.folded
+    flamegraph.pl posts.folded > posts.svg     # ou https://www.speedscope.app
+
+Échantillonneur en Python pur : toutes les ``interval_ms``, la pile de
+chaque thread du processus est relevée (``sys._current_frames()``) et
+comptée. Le résultat est au format « folded » (``thread;f1;f2 N`` par
+ligne), lu tel quel par flamegraph.pl, inferno et speedscope. Le temps
+mesuré est le temps réel : un thread bloqué dans PostgreSQL ou users-service
+apparaît dans l'appel qui attend. Les threads au repos (en attente d'une
+requête, d'un verrou, d'un ``select``) sont ignorés, sauf ``idle=1``.
+
+Seul le worker qui reçoit la requête est profilé (un pod en a
+``WEB_WORKERS``). Désactivé (404) sans ``PROFILE_TOKEN`` ; un seul
+profilage à la fois par processus (409). L'endpoint n'est pas routé par
+api-gateway : y accéder par ``kubectl port-forward``.
+"""
+import os
+import re
+import sys
+import hmac
+import time
+import threading
+from collections import Counter
+
+from flask import Response, jsonify, request
+
+PROFILING_CONFIG = {
+    'token': os.environ.get('PROFILE_TOKEN', ''),
+    'max_seconds': float(os.environ.get('PROFILE_MAX_SECONDS', '60')),
+    'interval_ms': float(os.environ.get('PROFILE_INTERVAL_MS', '10')),
+}
+
+FOLDED_MIMETYPE = 'text/plain'
+
+# Fonction en haut de pile d'un thread qui attend du travail
+IDLE_FUNCTIONS = {'wait', 'select', 'poll', 'accept', '_wait_for_tstate_lock'}
+
+_profile_lock = threading.Lock()
+
+
+def enabled():
+    return bool(PROFILING_CONFIG['token'])
+
+
+def authorized(header):
+    """``Authorization: Bearer <PROFILE_TOKEN>`` (comparaison à temps constant)"""
+    if not enabled() or not header or not header.startswith('Bearer '):
+        return False
+    return hmac.compare_digest(header[7:].strip().encode(), PROFILING_CONFIG['token'].encode())
+
+
+def parse_args(args):
+    """``(secondes, intervalle en s, threads au repos inclus)`` ; lève ValueError"""
+    try:
+        seconds = float(args.get('seconds', '10'))
+        interval_ms = float(args.get('interval_ms', PROFILING_CONFIG['interval_ms']))
+    except ValueError:
+        raise ValueError('seconds and interval_ms must be numbers')
+    if not 0 < seconds <= PROFILING_CONFIG['max_seconds']:
+        raise ValueError(f"seconds must be between 0 and {PROFILING_CONFIG['max_seconds']:g}")
+    if not 1 <= interval_ms <= 1000:
+        raise ValueError('interval_ms must be between 1 and 1000')
+    return seconds, interval_ms / 1000, args.get('idle') == '1'
+
+
+def _thread_label(name):
+    # ThreadPoolExecutor-0_3 -> ThreadPoolExecutor : les threads d'un même pool sont regroupés
+    return re.sub(r'[-_]\d+(_\d+)?$', '', name) or 'thread'
+
+
+def sample(seconds, interval, idle=False):
+    """Piles de tous les threads (sauf l'appelant) pendant ``seconds`` ; retourne (Counter, relevés)"""
+    own = threading.get_ident()
+    stacks = Counter()
+    ticks = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            if not idle and frame.f_code.co_name in IDLE_FUNCTIONS:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            stack.append(_thread_label(names.get(ident, 'thread')))
+            stacks[';'.join(reversed(stack))] += 1
+        ticks += 1
+        time.sleep(interval)
+    return stacks, ticks
+
+
+def folded(stacks):
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+def run(seconds, interval, idle=False):
+    """Profil au format folded, None si un profilage est déjà en cours dans le processus"""
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        stacks, ticks = sample(seconds, interval, idle)
+    finally:
+        _profile_lock.release()
+    return folded(stacks), ticks
+
+
+# ==================== VUE FLASK ====================
+
+def profile_view():
+    if not enabled():
+        return jsonify({'success': False, 'error': 'Not found'}), 404
+    if not authorized(request.headers.get('Authorization')):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    try:
+        seconds, interval, idle = parse_args(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    result = run(seconds, interval, idle)
+    if result is None:
+        return jsonify({'success': False, 'error': 'A profile is already running in this worker'}), 409
+    body, ticks = result
+    return Response(body, mimetype=FOLDED_MIMETYPE, headers={
+        'X-Profile-Pid': str(os.getpid()),
+        'X-Profile-Samples': str(ticks),
+    })
+
+
+def init_app(app):
+    """Ajoute GET /debug/profile (exempté du contrôle d'admission, voir common/admission.py)"""
+    app.add_url_rule('/debug/profile', 'debug_profile', profile_view, methods=['GET'])
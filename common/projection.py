@@ -0,0 +1,103 @@
+"""Sélection de champs (``?fields=``) et aperçu du contenu (``?preview=``).
+
+    GET /posts?fields=id,title,user_name,created_at
+    GET /posts?fields=id,title,content&preview=200
+
+Les champs demandés sont traduits en liste de colonnes SQL, parmi une liste
+blanche par ressource : une colonne non demandée n'est ni lue par
+PostgreSQL (un ``content`` long reste dans la table TOAST) ni sérialisée.
+``preview=N`` tronque le champ texte long de la ressource à ``N``
+caractères dans la requête même (``left(content, N)``).
+
+Chaque combinaison de champs est une requête nommée distincte
+(``posts.page.<empreinte>.first``...), préparée comme les autres ; leur
+nombre est borné par la liste blanche.
+"""
+import os
+import hashlib
+
+from common import pagination, queries
+
+PREVIEW_MAX_LENGTH = int(os.environ.get('PREVIEW_MAX_LENGTH', '1000'))
+
+
+class FieldSet:
+    """Champs exposés d'une ressource : nom -> expression SQL
+
+    ``preview`` nomme le champ texte que ``?preview=`` peut tronquer.
+    """
+
+    def __init__(self, columns, preview=None):
+        self.columns = dict(columns)
+        self.preview = preview
+
+    def parse(self, args, default, required=('id',)):
+        """Projection demandée par ``args`` (None sans ``fields`` ni ``preview`` : requête par défaut)
+
+        ``default`` : champs renvoyés sans ``fields`` ; ``required`` : champs
+        toujours renvoyés (clé, colonnes du curseur). Lève ValueError si un
+        champ est inconnu ou ``preview`` invalide.
+        """
+        raw_fields = args.get('fields')
+        raw_preview = args.get('preview')
+        if raw_fields is None and raw_preview is None:
+            return None
+
+        if raw_fields is None:
+            requested = set(default)
+        else:
+            requested = {name.strip() for name in raw_fields.split(',') if name.strip()}
+            unknown = requested - self.columns.keys()
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))} "
+                                 f"(allowed: {', '.join(self.columns)})")
+        requested.update(required)
+
+        preview = None
+        if raw_preview is not None:
+            if self.preview is None:
+                raise ValueError('preview is not supported here')
+            try:
+                preview = int(raw_preview)
+            except ValueError:
+                raise ValueError('preview must be an integer')
+            if preview < 1 or preview > PREVIEW_MAX_LENGTH:
+                raise ValueError(f'preview must be between 1 and {PREVIEW_MAX_LENGTH}')
+            if self.preview not in requested:
+                preview = None
+
+        # Ordre de la liste blanche : une seule requête par ensemble de champs
+        return Projection(self, [name for name in self.columns if name in requested], preview)
+
+
+class Projection:
+    """Colonnes d'une requête pour un ensemble de champs"""
+
+    def __init__(self, field_set, names, preview=None):
+        self.names = names
+        self.preview = preview
+        selected = []
+        for name in names:
+            expression = field_set.columns[name]
+            if preview is not None and name == field_set.preview:
+                expression = f'left({expression}, {{preview}})'
+            selected.append(f'{expression} AS {name}')
+        self._template = ', '.join(selected)
+        self.select = self.select_sql('%s')
+        self.params = (preview,) if preview is not None else ()
+        signature = ','.join(names) + ('|preview' if preview is not None else '')
+        # Empreinte courte : le nom de l'instruction préparée reste sous 63 caractères
+        self.key = hashlib.sha1(signature.encode()).hexdigest()[:10]
+
+    def select_sql(self, placeholder):
+        """Liste de colonnes avec ``placeholder`` pour la longueur d'aperçu (``$3`` pour asyncpg)"""
+        return self._template.format(preview=placeholder)
+
+    def define(self, name, from_sql):
+        """Requête nommée ``SELECT <colonnes> <from_sql>`` ; ses paramètres suivent ``self.params``"""
+        return queries.define(f'{name}.{self.key}', f'SELECT {self.select} {from_sql}')
+
+    def keyset_queries(self, name, from_sql, created_col='created_at', id_col='id'):
+        """Comme ``pagination.keyset_queries`` pour ces colonnes"""
+        return pagination.keyset_queries(f'{name}.{self.key}', f'SELECT {self.select} {from_sql}',
+                                         created_col, id_col)
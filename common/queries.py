@@ -0,0 +1,179 @@
+"""Requêtes nommées : instructions préparées côté serveur et instrumentation.
+
+Les requêtes fréquentes des services sont déclarées une fois, au niveau du
+module (``USER_BY_ID = queries.define('users.by_id', 'SELECT ... WHERE id = %s')``).
+À sa première exécution sur une connexion du pool, une requête y est
+préparée (``PREPARE``) ; les exécutions suivantes (``EXECUTE``) évitent à
+PostgreSQL de réanalyser et replanifier le même SQL.
+
+Chaque exécution alimente ``db_named_query_seconds`` et
+``db_named_query_rows`` (par nom de requête). Au-delà de ``DB_SLOW_QUERY_MS``,
+la requête est journalisée avec son plan ``EXPLAIN`` (au plus une fois par
+``DB_SLOW_QUERY_EXPLAIN_INTERVAL`` secondes et par requête).
+
+``DB_PREPARED_STATEMENTS=0`` exécute le SQL tel quel : nécessaire derrière
+un PgBouncer en mode transaction, qui ne garde pas les instructions
+préparées d'une connexion serveur à l'autre.
+
+Les curseurs serveur nommés (streaming) ne peuvent pas exécuter une
+instruction préparée : ces requêtes restent en SQL direct.
+"""
+import os
+import re
+import time
+import logging
+import threading
+
+from psycopg2 import errors
+
+from common import db, metrics
+
+logger = logging.getLogger(__name__)
+
+QUERY_CONFIG = {
+    'prepared': os.environ.get('DB_PREPARED_STATEMENTS', '1') != '0',
+    'slow_ms': float(os.environ.get('DB_SLOW_QUERY_MS', '200')),
+    'explain_interval': float(os.environ.get('DB_SLOW_QUERY_EXPLAIN_INTERVAL', '60')),
+}
+
+_PLACEHOLDER = re.compile(r'%%|%s')
+
+_registry = {}
+_last_explain = {}
+_explain_lock = threading.Lock()
+
+
+class Query:
+    """Requête SQL nommée (paramètres ``%s`` comme avec psycopg2)"""
+
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = sql
+        self.statement = 'q_' + re.sub(r'\W', '_', name)
+        count = [0]
+
+        def numbered(match):
+            if match.group() == '%%':
+                return '%'
+            count[0] += 1
+            return f'${count[0]}'
+
+        # Texte du PREPARE : paramètres $1, $2...
+        self.prepared_sql = _PLACEHOLDER.sub(numbered, sql)
+        self.params = count[0]
+        args = ', '.join(['%s'] * self.params)
+        self.execute_sql = f'EXECUTE {self.statement}({args})' if self.params else f'EXECUTE {self.statement}'
+
+    def __repr__(self):
+        return f'Query({self.name!r})'
+
+    # ---------- exécution ----------
+
+    def fetchone(self, cur, params=()):
+        return self._run(cur, params, 'one')
+
+    def fetchall(self, cur, params=()):
+        return self._run(cur, params, 'all')
+
+    def execute(self, cur, params=()):
+        """Exécute sans lire de résultat ; retourne le nombre de lignes touchées"""
+        return self._run(cur, params, None)
+
+    def _run(self, cur, params, fetch):
+        if len(params) != self.params:
+            raise ValueError(f'{self.name}: {self.params} parameters expected, got {len(params)}')
+        prepared = QUERY_CONFIG['prepared'] and self._prepare(cur)
+        start = time.perf_counter()
+        try:
+            if prepared:
+                db.execute_untimed(cur, self.execute_sql, params)
+            else:
+                db.execute_untimed(cur, self.sql, params)
+        except errors.InvalidSqlStatementName:
+            # Instruction disparue de la session (DISCARD ALL...) : préparée à nouveau au prochain appel
+            _prepared_on(cur.connection).discard(self.statement)
+            raise
+        if fetch == 'one':
+            result = cur.fetchone()
+            rows = 0 if result is None else 1
+        elif fetch == 'all':
+            result = cur.fetchall()
+            rows = len(result)
+        else:
+            result = rows = cur.rowcount
+        elapsed = time.perf_counter() - start
+
+        db.notify_query(self.sql, elapsed)
+        metrics.NAMED_QUERY_LATENCY.labels(metrics.service(), self.name).observe(elapsed)
+        metrics.NAMED_QUERY_ROWS.labels(metrics.service(), self.name).observe(rows)
+        if elapsed * 1000 >= QUERY_CONFIG['slow_ms']:
+            self._log_slow(cur, params, prepared, elapsed, rows)
+        return result
+
+    def _prepare(self, cur):
+        """Prépare la requête sur la connexion de ``cur`` si besoin ; False si impossible"""
+        prepared = _prepared_on(cur.connection)
+        if prepared is None:
+            return False
+        if self.statement not in prepared:
+            db.execute_untimed(cur, f'PREPARE {self.statement} AS {self.prepared_sql}')
+            prepared.add(self.statement)
+        return True
+
+    # ---------- requêtes lentes ----------
+
+    def _log_slow(self, cur, params, prepared, elapsed, rows):
+        now = time.monotonic()
+        with _explain_lock:
+            if now - _last_explain.get(self.name, float('-inf')) < QUERY_CONFIG['explain_interval']:
+                logger.warning("🐢 Requête lente %s: %.1f ms, %s lignes", self.name, elapsed * 1000, rows)
+                return
+            _last_explain[self.name] = now
+        plan = self._explain(cur.connection, params, prepared)
+        logger.warning("🐢 Requête lente %s: %.1f ms, %s lignes\n%s", self.name, elapsed * 1000, rows, plan)
+
+    def _explain(self, conn, params, prepared):
+        """Plan de la requête (sans l'exécuter), dans un savepoint pour ne pas gêner la transaction"""
+        sql = f'EXPLAIN {self.execute_sql if prepared else self.sql}'
+        cur = conn.cursor()
+        savepoint = not conn.autocommit
+        try:
+            if savepoint:
+                db.execute_untimed(cur, 'SAVEPOINT slow_query_explain')
+            try:
+                db.execute_untimed(cur, sql, params)
+                plan = '\n'.join(row[0] for row in cur.fetchall())
+            except Exception as e:
+                if savepoint:
+                    db.execute_untimed(cur, 'ROLLBACK TO SAVEPOINT slow_query_explain')
+                return f'(EXPLAIN impossible: {e})'
+            if savepoint:
+                db.execute_untimed(cur, 'RELEASE SAVEPOINT slow_query_explain')
+            return plan
+        finally:
+            cur.close()
+
+
+def _prepared_on(conn):
+    """Instructions déjà préparées sur ``conn`` (None si la connexion n'en garde pas la trace)"""
+    try:
+        return conn.prepared_statements
+    except AttributeError:
+        pass
+    try:
+        conn.prepared_statements = set()
+    except AttributeError:
+        # Connexion psycopg2 de base (hors pool) : pas d'attribut possible
+        return None
+    return conn.prepared_statements
+
+
+def define(name, sql):
+    """Déclare une requête nommée (un nom = un seul SQL)"""
+    query = _registry.get(name)
+    if query is not None:
+        if query.sql != sql:
+            raise ValueError(f'Query {name!r} already defined with a different SQL')
+        return query
+    query = _registry[name] = Query(name, sql)
+    return query
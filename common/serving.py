@@ -0,0 +1,84 @@
+"""Lancement des services en production avec gunicorn.
+
+``python users_service.py serve`` démarre plusieurs workers (processus
+préforkés), chacun avec un pool de threads, à la place du serveur de
+développement Flask. Les réglages viennent de l'environnement.
+
+L'application est importée une fois dans le master puis partagée par fork :
+rien ne doit donc ouvrir de connexion à l'import (le pool DB est créé à la
+première requête de chaque worker).
+"""
+import os
+import logging
+
+from gunicorn.app.base import BaseApplication
+
+from common import db, logs, metrics
+
+logger = logging.getLogger(__name__)
+
+SERVER_CONFIG = {
+    'workers': int(os.environ.get('WEB_WORKERS', '2')),
+    'threads': int(os.environ.get('WEB_THREADS', '8')),
+    'keepalive': int(os.environ.get('WEB_KEEPALIVE', '5')),
+    'backlog': int(os.environ.get('WEB_BACKLOG', '2048')),
+    'timeout': int(os.environ.get('WEB_TIMEOUT', '30')),
+    'graceful_timeout': int(os.environ.get('WEB_GRACEFUL_TIMEOUT', '20')),
+    'max_requests': int(os.environ.get('WEB_MAX_REQUESTS', '0')),
+    'max_requests_jitter': int(os.environ.get('WEB_MAX_REQUESTS_JITTER', '0')),
+}
+
+
+def _on_starting(server):
+    # Repart de compteurs vides : les fichiers d'un ancien master faussent les sommes
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory and os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith('.db'):
+                os.remove(os.path.join(directory, name))
+
+
+def _post_worker_init(worker):
+    # Pool ouvert avant la première requête : le premier /ready ne paie pas la connexion
+    db.get_pool()
+
+
+def _worker_exit(server, worker):
+    # Fermeture propre des connexions DB du worker (SIGTERM / recyclage)
+    db.close_pool()
+    # Journaux encore en file écrits avant la sortie
+    logs.flush()
+
+
+class _Application(BaseApplication):
+    def __init__(self, app, options):
+        self.application = app
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def serve(app, port):
+    """Sert ``app`` avec gunicorn (workers gthread) sur ``port``"""
+    options = dict(SERVER_CONFIG)
+    options.update({
+        'bind': f"0.0.0.0:{os.environ.get('PORT', port)}",
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'accesslog': None,
+        'on_starting': _on_starting,
+        'post_worker_init': _post_worker_init,
+        'worker_exit': _worker_exit,
+        'child_exit': metrics.child_exit,
+        # Fichiers temporaires des workers en mémoire (pas de disque lent sous Docker)
+        'worker_tmp_dir': '/dev/shm' if os.path.isdir('/dev/shm') else None,
+    })
+    logger.info("🚀 gunicorn: %s workers x %s threads sur %s",
+                options['workers'], options['threads'], options['bind'])
+    _Application(app, options).run()
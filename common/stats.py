@@ -0,0 +1,150 @@
+"""Statistiques lues sur les compteurs maintenus par triggers.
+
+Les totaux (utilisateurs, posts, utilisateurs ayant posté) et le nombre de
+posts par utilisateur sont tenus à jour par les triggers de
+``database/init.sql`` dans la transaction de chaque écriture : les routes
+``/stats`` ne parcourent plus les tables.
+
+Un recalcul complet (``reconcile_stats()``, ``reconcile()``) corrige une
+éventuelle dérive (import sans triggers, restauration partielle...) : il
+bloque les écritures le temps de parcourir les tables, il est lancé par
+``common/bulk.py`` ou à la main.
+
+Sur option (``STATS_RECONCILE_INTERVAL``), chaque worker lance un thread
+qui corrige périodiquement les totaux sans verrou de table
+(``repair_drift()``) ; un verrou consultatif PostgreSQL garantit qu'un seul
+processus, tous services et replicas confondus, le fait à la fois.
+"""
+import os
+import time
+import random
+import logging
+import threading
+
+from common import db, queries
+
+logger = logging.getLogger(__name__)
+
+# Secondes entre deux corrections périodiques (0 : désactivé)
+RECONCILE_INTERVAL = float(os.environ.get('STATS_RECONCILE_INTERVAL', '0'))
+
+# Clé du verrou consultatif partagée par les deux services
+RECONCILE_LOCK_KEY = 0x57A75
+
+
+READ_COUNTERS = queries.define('stats.counters', '''
+    SELECT name, COALESCE(SUM(value), 0)::BIGINT AS value
+    FROM stats_counters
+    WHERE name = ANY(%s)
+    GROUP BY name
+''')
+
+
+def read_counters(cur, *names):
+    """Valeurs des compteurs ``names`` (somme des shards), 0 si absents"""
+    values = {name: 0 for name in names}
+    for row in READ_COUNTERS.fetchall(cur, (list(names),)):
+        name, value = (row['name'], row['value']) if isinstance(row, dict) else row
+        values[name] = value
+    return values
+
+
+def reconcile():
+    """Recalcule les compteurs si aucun autre processus ne le fait ; retourne les corrections
+
+    Retourne None si le verrou est déjà pris ailleurs.
+    """
+    with db.get_pool().connection() as conn:
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT pg_try_advisory_xact_lock(%s)', (RECONCILE_LOCK_KEY,))
+            if not cur.fetchone()[0]:
+                conn.rollback()
+                return None
+            cur.execute('SELECT counter, stored, actual FROM reconcile_stats()')
+            drift = cur.fetchall()
+            conn.commit()
+            cur.close()
+        except Exception:
+            conn.rollback()
+            raise
+    for counter, stored, actual in drift:
+        logger.warning("⚠️ Compteur %s corrigé: %s -> %s", counter, stored, actual)
+    return drift
+
+
+def repair_drift():
+    """Corrige les totaux de ``stats_counters`` sans bloquer les écritures ; retourne les corrections
+
+    L'écart est mesuré dans un instantané (``stats_drift()``), puis ajouté
+    en delta : les écritures validées entre-temps sont conservées. Ne
+    touche pas à ``user_post_counts`` (recalcul complet seulement).
+    Retourne None si une autre correction est en cours.
+    """
+    with db.get_pool().connection() as conn:
+        cur = conn.cursor()
+        try:
+            # Verrou de session : il couvre la lecture et la correction (deux transactions)
+            cur.execute('SELECT pg_try_advisory_lock(%s)', (RECONCILE_LOCK_KEY,))
+            locked = cur.fetchone()[0]
+            conn.commit()
+            if not locked:
+                return None
+            try:
+                cur.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+                cur.execute('SELECT counter, stored, actual FROM stats_drift()')
+                drift = cur.fetchall()
+                conn.commit()
+                for counter, stored, actual in drift:
+                    cur.execute('SELECT bump_counter(%s, %s)', (counter, actual - stored))
+                conn.commit()
+            finally:
+                conn.rollback()
+                cur.execute('SELECT pg_advisory_unlock(%s)', (RECONCILE_LOCK_KEY,))
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+    for counter, stored, actual in drift:
+        logger.warning("⚠️ Compteur %s corrigé: %s -> %s", counter, stored, actual)
+    return drift
+
+
+# ==================== RECALCUL PÉRIODIQUE ====================
+
+_reconciler_pid = None
+_reconciler_lock = threading.Lock()
+
+
+def _reconcile_loop(interval):
+    while True:
+        # Décalage aléatoire : les workers ne se réveillent pas tous ensemble
+        time.sleep(interval * random.uniform(0.9, 1.1))
+        try:
+            repair_drift()
+        except Exception as e:
+            logger.error("❌ Recalcul des compteurs impossible: %s", e)
+
+
+def _ensure_reconciler():
+    global _reconciler_pid
+    pid = os.getpid()
+    if _reconciler_pid == pid:
+        return
+    with _reconciler_lock:
+        if _reconciler_pid != pid:
+            # Démarré à la première requête : un thread créé avant le fork de
+            # gunicorn n'existerait pas dans les workers
+            threading.Thread(
+                target=_reconcile_loop, args=(RECONCILE_INTERVAL,),
+                name='stats-reconciler', daemon=True,
+            ).start()
+            _reconciler_pid = pid
+
+
+def init_app(app):
+    """Lance la correction périodique des totaux dans chaque worker (si ``STATS_RECONCILE_INTERVAL`` > 0)"""
+    if RECONCILE_INTERVAL > 0:
+        app.before_request(_ensure_reconciler)
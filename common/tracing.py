@@ -0,0 +1,368 @@
+"""Traçage des requêtes : identifiant propagé et durée de chaque étape.
+
+Propagation : api-gateway pose ``X-Request-ID`` (``$request_id`` de nginx,
+32 caractères hexadécimaux) ; chaque service le reprend comme identifiant de
+trace (un en-tête W3C ``traceparent`` est prioritaire), le renvoie dans sa
+réponse et le transmet à ses appels sortants (``outgoing_headers()``) :
+posts-service et users-service partagent la même trace pour un même
+``POST /posts``.
+
+Spans d'une requête échantillonnée :
+
+- la requête entière (route, statut)
+- chaque emprunt de connexion au pool (``db.acquire``, attente comprise) et
+  chaque requête SQL (``db.query``), via les observateurs de ``common/db.py``
+- les blocs ``with tracing.span('nom')`` des services (vérification de
+  l'utilisateur, appel users-service, INSERT groupé, encodage JSON...)
+
+Échantillonnage à l'entrée : ``TRACE_SAMPLE_RATE`` des requêtes (0 à 1),
+sauf décision amont portée par ``traceparent`` (suivie telle quelle). Une
+requête non échantillonnée ne coûte que la lecture des en-têtes : ``span()``
+renvoie un bloc vide.
+
+Export au format Zipkin v2 (JSON), lu par Zipkin, Jaeger, Grafana Tempo et
+le collecteur OpenTelemetry : une trace par ligne dans ``TRACE_FILE``
+(``{pid}`` remplacé par le processus) et / ou par lots vers
+``TRACE_ENDPOINT`` (``http://zipkin:9411/api/v2/spans``). L'écriture se fait
+dans un thread du processus ; une trace qui ne trouve pas de place dans la
+file est abandonnée. Sans destination, rien n'est échantillonné.
+"""
+import os
+import time
+import queue
+import random
+import logging
+import threading
+import contextvars
+import urllib.request
+
+from common import db, jsonio, metrics
+
+logger = logging.getLogger(__name__)
+
+TRACING_CONFIG = {
+    'sample_rate': float(os.environ.get('TRACE_SAMPLE_RATE', '0')),
+    'file': os.environ.get('TRACE_FILE', ''),
+    'endpoint': os.environ.get('TRACE_ENDPOINT', ''),
+    'queue_size': int(os.environ.get('TRACE_QUEUE_SIZE', '1000')),
+    'batch_size': int(os.environ.get('TRACE_BATCH_SIZE', '100')),
+    'flush_interval': float(os.environ.get('TRACE_FLUSH_INTERVAL', '1')),
+    # Spans gardés par trace (une requête qui boucle sur des requêtes SQL)
+    'max_spans': int(os.environ.get('TRACE_MAX_SPANS', '500')),
+}
+
+EXPORT_ENABLED = bool(TRACING_CONFIG['file'] or TRACING_CONFIG['endpoint'])
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+TRACEPARENT_HEADER = 'traceparent'
+
+# Longueur maximale d'une requête SQL dans les tags
+STATEMENT_MAX_LENGTH = 300
+
+_current = contextvars.ContextVar('trace', default=None)
+
+
+def _new_id(length):
+    return f'{random.getrandbits(4 * length):0{length}x}'
+
+
+def _is_hex(value, length):
+    if len(value) != length:
+        return False
+    try:
+        int(value, 16)
+    except ValueError:
+        return False
+    return True
+
+
+class Trace:
+    """Trace d'une requête : identifiants, spans terminés et pile des spans ouverts"""
+
+    __slots__ = ('trace_id', 'request_id', 'remote_parent', 'sampled', 'service', 'spans', 'stack')
+
+    def __init__(self, trace_id, request_id, remote_parent, sampled, service):
+        self.trace_id = trace_id
+        self.request_id = request_id
+        self.remote_parent = remote_parent
+        self.sampled = sampled
+        self.service = service
+        self.spans = []
+        self.stack = []
+
+    def parent_id(self):
+        return self.stack[-1] if self.stack else self.remote_parent
+
+    def record(self, name, span_id, parent_id, start, duration, kind=None, tags=None):
+        """Ajoute un span terminé (``start`` en secondes epoch, ``duration`` en secondes)"""
+        if len(self.spans) >= TRACING_CONFIG['max_spans']:
+            return
+        span = {
+            'traceId': self.trace_id,
+            'id': span_id,
+            'name': name,
+            'timestamp': int(start * 1_000_000),
+            'duration': max(1, int(duration * 1_000_000)),
+            'localEndpoint': {'serviceName': self.service},
+        }
+        if parent_id:
+            span['parentId'] = parent_id
+        if kind:
+            span['kind'] = kind
+        if tags:
+            span['tags'] = {key: str(value) for key, value in tags.items()}
+        self.spans.append(span)
+
+
+class Span:
+    """Bloc chronométré (``with tracing.span(...) as span: span.tag(...)``)"""
+
+    __slots__ = ('trace', 'name', 'kind', 'tags', 'id', 'parent_id', 'start', '_perf')
+
+    def __init__(self, trace, name, kind=None, tags=None):
+        self.trace = trace
+        self.name = name
+        self.kind = kind
+        self.tags = tags or {}
+        self.id = _new_id(16)
+        self.parent_id = None
+
+    def tag(self, key, value):
+        self.tags[key] = value
+
+    def __enter__(self):
+        self.parent_id = self.trace.parent_id()
+        self.trace.stack.append(self.id)
+        self.start = time.time()
+        self._perf = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._perf
+        if exc is not None:
+            self.tags['error'] = type(exc).__name__
+        stack = self.trace.stack
+        if stack and stack[-1] == self.id:
+            stack.pop()
+        elif self.id in stack:
+            # Tâches asyncio concurrentes d'une même requête
+            stack.remove(self.id)
+        self.trace.record(self.name, self.id, self.parent_id, self.start, duration, self.kind, self.tags)
+        return False
+
+
+class _NoopSpan:
+    """Span d'une requête non échantillonnée"""
+
+    id = None
+
+    def tag(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name, kind=None, **tags):
+    """Chronomètre un bloc dans la trace courante (sans effet hors échantillon)"""
+    trace = _current.get()
+    if trace is None or not trace.sampled:
+        return _NOOP
+    return Span(trace, name, kind, tags)
+
+
+def current():
+    return _current.get()
+
+
+def request_id():
+    """Identifiant de la requête en cours (None hors requête)"""
+    trace = _current.get()
+    return trace.request_id if trace is not None else None
+
+
+def outgoing_headers():
+    """En-têtes à transmettre aux appels sortants (trace et identifiant de requête)"""
+    trace = _current.get()
+    if trace is None:
+        return {}
+    parent = trace.parent_id() or _new_id(16)
+    return {
+        REQUEST_ID_HEADER: trace.request_id,
+        TRACEPARENT_HEADER: f"00-{trace.trace_id}-{parent}-{'01' if trace.sampled else '00'}",
+    }
+
+
+# ==================== DÉBUT / FIN DE REQUÊTE ====================
+
+def begin(headers, name, service, tags=None):
+    """Ouvre la trace et le span racine d'une requête entrante ; retourne ``(jeton, span)``"""
+    trace_id = remote_parent = sampled = None
+    traceparent = headers.get(TRACEPARENT_HEADER)
+    if traceparent:
+        parts = traceparent.strip().split('-')
+        if len(parts) == 4 and _is_hex(parts[1], 32) and _is_hex(parts[2], 16) and _is_hex(parts[3], 2):
+            trace_id, remote_parent = parts[1], parts[2]
+            sampled = bool(int(parts[3], 16) & 1)
+    request_id = headers.get(REQUEST_ID_HEADER) or None
+    if request_id is not None:
+        request_id = request_id.strip()[:128]
+    if trace_id is None:
+        trace_id = request_id.lower() if request_id and _is_hex(request_id, 32) else _new_id(32)
+    if sampled is None:
+        sampled = random.random() < TRACING_CONFIG['sample_rate']
+    trace = Trace(trace_id, request_id or trace_id, remote_parent, sampled and EXPORT_ENABLED, service)
+    token = _current.set(trace)
+    root = Span(trace, name, 'SERVER', tags) if trace.sampled else _NOOP
+    root.__enter__()
+    return token, root
+
+
+def end(token, root, status=None):
+    """Ferme le span racine et exporte la trace si elle est échantillonnée"""
+    trace = _current.get()
+    try:
+        if trace is not None and trace.sampled:
+            if status is not None:
+                root.tag('http.status_code', status)
+                if status >= 500:
+                    root.tag('error', str(status))
+            root.__exit__(None, None, None)
+            _get_exporter().submit(trace.spans)
+    finally:
+        _current.reset(token)
+
+
+# ==================== OBSERVATEURS DB ====================
+
+def _observe_query(sql, seconds):
+    trace = _current.get()
+    if trace is None or not trace.sampled:
+        return
+    if isinstance(sql, bytes):
+        sql = sql[:STATEMENT_MAX_LENGTH].decode('utf-8', 'replace')
+    else:
+        sql = str(sql)[:STATEMENT_MAX_LENGTH]
+    trace.record('db.query', _new_id(16), trace.parent_id(), time.time() - seconds, seconds,
+                 'CLIENT', {'db.statement': ' '.join(sql.split())})
+
+
+def _observe_pool(event, pool, waited):
+    if event != 'checkout':
+        return
+    trace = _current.get()
+    if trace is None or not trace.sampled:
+        return
+    trace.record('db.acquire', _new_id(16), trace.parent_id(), time.time() - waited, waited,
+                 tags={'pool': pool.name})
+
+
+# ==================== EXPORT ====================
+
+class Exporter:
+    """File bornée de traces, écrites par un thread du processus"""
+
+    def __init__(self, file=None, endpoint=None, queue_size=1000, batch_size=100, flush_interval=1.0):
+        self.file = file.format(pid=os.getpid()) if file else None
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(queue_size)
+        threading.Thread(target=self._run, name='trace-export', daemon=True).start()
+
+    def submit(self, spans):
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            metrics.TRACES_DROPPED.labels(metrics.service()).inc()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.warning("⚠️ Export de %s traces impossible: %s", len(batch), e)
+
+    def _write(self, batch):
+        if self.file:
+            with open(self.file, 'ab') as f:
+                f.write(b''.join(jsonio.dumps_bytes(spans) + b'\n' for spans in batch))
+        if self.endpoint:
+            body = jsonio.dumps_bytes([span for spans in batch for span in spans])
+            request = urllib.request.Request(self.endpoint, data=body, method='POST',
+                                             headers={'Content-Type': 'application/json'})
+            with urllib.request.urlopen(request, timeout=5) as response:
+                response.read()
+
+
+_exporter = None
+_exporter_pid = None
+_exporter_lock = threading.Lock()
+
+
+def _get_exporter():
+    """Exportateur du processus courant (démarré après le fork de gunicorn)"""
+    global _exporter, _exporter_pid
+    pid = os.getpid()
+    if _exporter is not None and _exporter_pid == pid:
+        return _exporter
+    with _exporter_lock:
+        if _exporter is None or _exporter_pid != pid:
+            _exporter = Exporter(TRACING_CONFIG['file'], TRACING_CONFIG['endpoint'],
+                                 TRACING_CONFIG['queue_size'], TRACING_CONFIG['batch_size'],
+                                 TRACING_CONFIG['flush_interval'])
+            _exporter_pid = pid
+    return _exporter
+
+
+# ==================== FLASK ====================
+
+def _before_request():
+    from flask import g, request
+    rule = request.url_rule
+    name = f"{request.method} {rule.rule if rule is not None else 'unmatched'}"
+    g.trace_token, g.trace_root = begin(request.headers, name, metrics.service())
+
+
+def _after_request(response):
+    from flask import g
+    trace = _current.get()
+    if trace is not None:
+        response.headers[REQUEST_ID_HEADER] = trace.request_id
+        g.trace_status = response.status_code
+    return response
+
+
+def _teardown_request(exc=None):
+    from flask import g
+    token = g.pop('trace_token', None)
+    if token is not None:
+        end(token, g.pop('trace_root'), g.pop('trace_status', 500))
+
+
+def init_app(app):
+    """Trace chaque requête (après ``metrics.init_app`` : nom du service)"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    if EXPORT_ENABLED:
+        if _observe_query not in db.query_observers:
+            db.query_observers.append(_observe_query)
+        if _observe_pool not in db.pool_observers:
+            db.pool_observers.append(_observe_pool)
@@ -10,7 +10,8 @@ CREATE TABLE IF NOT EXISTS users (
 );
 
 CREATE INDEX idx_users_email ON users(email);
-CREATE INDEX idx_users_created ON users(created_at);
+-- (created_at, id) : ordre de la pagination par curseur
+CREATE INDEX idx_users_created ON users(created_at, id);
 
 -- Données de test users
 INSERT INTO users (name, email) VALUES
@@ -30,11 +31,23 @@ CREATE TABLE IF NOT EXISTS posts (
     content TEXT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Copie du nom / email de l'auteur (projection locale, voir AUTHORS) :
+    -- les lectures de posts ne joignent plus la table users
+    author_name VARCHAR(100),
+    author_email VARCHAR(100),
+    -- Recherche plein texte : titre (poids A) + contenu (poids B), recalculé
+    -- par PostgreSQL à chaque INSERT / UPDATE
+    search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('french', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('french', coalesce(content, '')), 'B')
+    ) STORED,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
-CREATE INDEX idx_posts_user_id ON posts(user_id);
-CREATE INDEX idx_posts_created ON posts(created_at);
+-- (user_id, created_at) : posts d'un utilisateur triés, dernier post d'un utilisateur
+CREATE INDEX idx_posts_user_id ON posts(user_id, created_at);
+CREATE INDEX idx_posts_created ON posts(created_at, id);
+CREATE INDEX idx_posts_search ON posts USING GIN (search_vector);
 
 -- Données de test posts
 INSERT INTO posts (user_id, title, content) VALUES
@@ -44,29 +57,292 @@ INSERT INTO posts (user_id, title, content) VALUES
     (3, 'Docker et containers', 'Docker simplifie le déploiement des applications.')
 ON CONFLICT DO NOTHING;
 
+-- ==========================================
+-- OUTBOX : FLUX DE CHANGEMENTS ENTRE SERVICES
+-- ==========================================
+-- users-service y écrit ses événements dans la transaction de chaque
+-- écriture (common/outbox.py) ; posts-service les consomme dans l'ordre
+-- (tx, id) et mémorise sa position dans outbox_offsets.
+CREATE TABLE IF NOT EXISTS outbox (
+    id BIGSERIAL PRIMARY KEY,
+    tx BIGINT NOT NULL DEFAULT txid_current(),
+    topic VARCHAR(50) NOT NULL,
+    key VARCHAR(100) NOT NULL,
+    payload JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_order ON outbox(tx, id);
+CREATE INDEX IF NOT EXISTS idx_outbox_created ON outbox(created_at);
+
+CREATE TABLE IF NOT EXISTS outbox_offsets (
+    consumer VARCHAR(100) PRIMARY KEY,
+    last_tx BIGINT NOT NULL,
+    last_id BIGINT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- ==========================================
+-- AUTHORS : PROJECTION DES USERS (posts-service)
+-- ==========================================
+-- Nom et email des auteurs tels que posts-service les connaît, mis à jour
+-- par le consommateur de l'outbox (topic 'users'). Un nouveau post y copie
+-- author_name / author_email.
+CREATE TABLE IF NOT EXISTS authors (
+    user_id INTEGER PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    email VARCHAR(100) NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Projection initiale des données de test
+INSERT INTO authors (user_id, name, email)
+SELECT id, name, email FROM users
+ON CONFLICT (user_id) DO NOTHING;
+
+UPDATE posts p
+SET author_name = a.name, author_email = a.email
+FROM authors a
+WHERE a.user_id = p.user_id AND p.author_name IS NULL;
+
+-- ==========================================
+-- COMPTEURS MAINTENUS PAR TRIGGERS
+-- ==========================================
+-- Les totaux ne sont jamais recalculés à la lecture : chaque INSERT / DELETE
+-- met à jour les compteurs dans la même transaction (triggers par
+-- instruction, un seul passage même pour un INSERT de 10M lignes).
+-- Un compteur est réparti sur plusieurs lignes (shards) pour que les
+-- écritures concurrentes ne se bloquent pas sur la même ligne ; la lecture
+-- fait la somme de ces quelques lignes.
+CREATE TABLE IF NOT EXISTS stats_counters (
+    name VARCHAR(50) NOT NULL,
+    shard SMALLINT NOT NULL,
+    value BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, shard)
+);
+
+-- Nombre de posts et date du dernier post de chaque utilisateur (ligne
+-- supprimée quand l'utilisateur n'a plus de post)
+CREATE TABLE IF NOT EXISTS user_post_counts (
+    user_id INTEGER PRIMARY KEY,
+    post_count BIGINT NOT NULL,
+    last_post_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_post_counts_count ON user_post_counts(post_count DESC, user_id);
+
+CREATE OR REPLACE FUNCTION bump_counter(p_name VARCHAR, p_delta BIGINT) RETURNS void AS $$
+BEGIN
+    IF p_delta <> 0 THEN
+        INSERT INTO stats_counters AS c (name, shard, value)
+        VALUES (p_name, pg_backend_pid() % 8, p_delta)
+        ON CONFLICT (name, shard) DO UPDATE SET value = c.value + EXCLUDED.value;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION read_counter(p_name VARCHAR) RETURNS BIGINT AS $$
+    SELECT COALESCE(SUM(value), 0)::BIGINT FROM stats_counters WHERE name = p_name;
+$$ LANGUAGE sql STABLE;
+
+-- Applique des variations de nombre de posts par utilisateur (triées par
+-- user_id : deux écritures concurrentes verrouillent les lignes dans le même ordre)
+CREATE OR REPLACE FUNCTION apply_post_counts(p_user_ids INTEGER[], p_deltas BIGINT[], p_last TIMESTAMP[])
+RETURNS void AS $$
+DECLARE
+    v_gained BIGINT;
+    v_lost BIGINT;
+BEGIN
+    WITH d AS (
+        SELECT * FROM unnest(p_user_ids, p_deltas, p_last) AS t(user_id, delta, last_at)
+        WHERE delta <> 0
+    ),
+    up AS (
+        INSERT INTO user_post_counts AS c (user_id, post_count, last_post_at)
+        SELECT user_id, delta, last_at FROM d
+        ON CONFLICT (user_id) DO UPDATE
+            SET post_count = c.post_count + EXCLUDED.post_count,
+                last_post_at = GREATEST(c.last_post_at, EXCLUDED.last_post_at)
+        RETURNING c.user_id, c.post_count
+    )
+    SELECT COUNT(*) FILTER (WHERE up.post_count > 0 AND up.post_count = d.delta),
+           COUNT(*) FILTER (WHERE up.post_count = 0)
+    INTO v_gained, v_lost
+    FROM up JOIN d USING (user_id);
+
+    DELETE FROM user_post_counts WHERE user_id = ANY(p_user_ids) AND post_count = 0;
+    PERFORM bump_counter('users_with_posts', v_gained - v_lost);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION posts_counters_trigger() RETURNS trigger AS $$
+DECLARE
+    v_ids INTEGER[];
+    v_deltas BIGINT[];
+    v_last TIMESTAMP[];
+    v_total BIGINT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(user_id ORDER BY user_id), array_agg(n ORDER BY user_id),
+               array_agg(last_at ORDER BY user_id), COALESCE(SUM(n), 0)
+        INTO v_ids, v_deltas, v_last, v_total
+        FROM (SELECT user_id, COUNT(*) AS n, MAX(created_at) AS last_at
+              FROM new_rows GROUP BY user_id) g;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(user_id ORDER BY user_id), array_agg(-n ORDER BY user_id),
+               array_agg(NULL::TIMESTAMP), -COALESCE(SUM(n), 0)
+        INTO v_ids, v_deltas, v_last, v_total
+        FROM (SELECT user_id, COUNT(*) AS n FROM old_rows GROUP BY user_id) g;
+    ELSE
+        -- UPDATE : seul un changement de user_id déplace des posts
+        SELECT array_agg(user_id ORDER BY user_id), array_agg(n ORDER BY user_id),
+               array_agg(last_at ORDER BY user_id), 0
+        INTO v_ids, v_deltas, v_last, v_total
+        FROM (SELECT user_id, SUM(delta)::BIGINT AS n, MAX(last_at) AS last_at FROM (
+                  SELECT nr.user_id, 1 AS delta, nr.created_at AS last_at
+                  FROM new_rows nr JOIN old_rows orow USING (id) WHERE nr.user_id <> orow.user_id
+                  UNION ALL
+                  SELECT orow.user_id, -1, NULL
+                  FROM new_rows nr JOIN old_rows orow USING (id) WHERE nr.user_id <> orow.user_id
+              ) moved GROUP BY user_id) g;
+    END IF;
+
+    IF v_ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+    PERFORM bump_counter('posts', v_total);
+    PERFORM apply_post_counts(v_ids, v_deltas, v_last);
+
+    IF TG_OP <> 'INSERT' THEN
+        -- Le dernier post d'un utilisateur a pu disparaître : relecture par l'index (user_id, created_at)
+        UPDATE user_post_counts c
+        SET last_post_at = (SELECT MAX(created_at) FROM posts p WHERE p.user_id = c.user_id)
+        WHERE c.user_id = ANY(v_ids);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION users_counters_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM bump_counter('users', (SELECT COUNT(*) FROM new_rows));
+    ELSE
+        PERFORM bump_counter('users', -(SELECT COUNT(*) FROM old_rows));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION counters_truncate_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'posts' THEN
+        DELETE FROM stats_counters WHERE name IN ('posts', 'users_with_posts');
+        DELETE FROM user_post_counts;
+    ELSE
+        DELETE FROM stats_counters WHERE name = 'users';
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS posts_counters_insert ON posts;
+DROP TRIGGER IF EXISTS posts_counters_delete ON posts;
+DROP TRIGGER IF EXISTS posts_counters_update ON posts;
+DROP TRIGGER IF EXISTS posts_counters_truncate ON posts;
+DROP TRIGGER IF EXISTS users_counters_insert ON users;
+DROP TRIGGER IF EXISTS users_counters_delete ON users;
+DROP TRIGGER IF EXISTS users_counters_truncate ON users;
+
+CREATE TRIGGER posts_counters_insert AFTER INSERT ON posts
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION posts_counters_trigger();
+CREATE TRIGGER posts_counters_delete AFTER DELETE ON posts
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION posts_counters_trigger();
+CREATE TRIGGER posts_counters_update AFTER UPDATE ON posts
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION posts_counters_trigger();
+CREATE TRIGGER posts_counters_truncate AFTER TRUNCATE ON posts
+    FOR EACH STATEMENT EXECUTE FUNCTION counters_truncate_trigger();
+CREATE TRIGGER users_counters_insert AFTER INSERT ON users
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION users_counters_trigger();
+CREATE TRIGGER users_counters_delete AFTER DELETE ON users
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION users_counters_trigger();
+CREATE TRIGGER users_counters_truncate AFTER TRUNCATE ON users
+    FOR EACH STATEMENT EXECUTE FUNCTION counters_truncate_trigger();
+
+-- Recalcul complet (dérive après un COPY sans triggers, une restauration...).
+-- Bloque les écritures le temps du recalcul ; retourne les compteurs corrigés.
+CREATE OR REPLACE FUNCTION reconcile_stats()
+RETURNS TABLE (counter VARCHAR, stored BIGINT, actual BIGINT) AS $$
+DECLARE
+    v_actual JSONB;
+BEGIN
+    LOCK TABLE users, posts IN SHARE MODE;
+
+    SELECT jsonb_build_object(
+        'users', (SELECT COUNT(*) FROM users),
+        'posts', (SELECT COUNT(*) FROM posts),
+        'users_with_posts', (SELECT COUNT(DISTINCT user_id) FROM posts)
+    ) INTO v_actual;
+
+    RETURN QUERY
+    SELECT a.key::VARCHAR, read_counter(a.key), a.value::BIGINT
+    FROM jsonb_each_text(v_actual) a
+    WHERE read_counter(a.key) <> a.value::BIGINT;
+
+    DELETE FROM stats_counters WHERE name IN (SELECT jsonb_object_keys(v_actual));
+    INSERT INTO stats_counters (name, shard, value)
+    SELECT a.key, 0, a.value::BIGINT FROM jsonb_each_text(v_actual) a;
+
+    DELETE FROM user_post_counts;
+    INSERT INTO user_post_counts (user_id, post_count, last_post_at)
+    SELECT user_id, COUNT(*), MAX(created_at) FROM posts GROUP BY user_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Écart des totaux, sans verrou ni écriture (recalcul périodique, common/stats.py).
+-- À lire dans une transaction REPEATABLE READ : tables et compteurs viennent
+-- du même instantané. La correction s'applique ensuite en delta (bump_counter),
+-- sans effacer les écritures validées entre-temps.
+CREATE OR REPLACE FUNCTION stats_drift()
+RETURNS TABLE (counter VARCHAR, stored BIGINT, actual BIGINT) AS $$
+    SELECT a.counter, read_counter(a.counter), a.actual
+    FROM (VALUES
+        ('users'::VARCHAR, (SELECT COUNT(*) FROM users)),
+        ('posts'::VARCHAR, (SELECT COUNT(*) FROM posts)),
+        ('users_with_posts'::VARCHAR, (SELECT COUNT(DISTINCT user_id) FROM posts))
+    ) AS a(counter, actual)
+    WHERE read_counter(a.counter) <> a.actual;
+$$ LANGUAGE sql STABLE;
+
+-- Compteurs des données de test insérées plus haut
+SELECT * FROM reconcile_stats();
+
 -- ==========================================
 -- VUES POUR STATISTIQUES
 -- ==========================================
+-- Vues lues en temps constant sur les compteurs (MAX / MIN par l'index created_at)
 CREATE OR REPLACE VIEW user_stats AS
 SELECT 
-    COUNT(*) as total_users,
-    MAX(created_at) as last_user_created,
-    MIN(created_at) as first_user_created
-FROM users;
+    read_counter('users') as total_users,
+    (SELECT MAX(created_at) FROM users) as last_user_created,
+    (SELECT MIN(created_at) FROM users) as first_user_created;
 
 CREATE OR REPLACE VIEW post_stats AS
 SELECT 
-    COUNT(*) as total_posts,
-    COUNT(DISTINCT user_id) as users_with_posts,
-    MAX(created_at) as last_post_created
-FROM posts;
+    read_counter('posts') as total_posts,
+    read_counter('users_with_posts') as users_with_posts,
+    (SELECT MAX(created_at) FROM posts) as last_post_created;
 
 CREATE OR REPLACE VIEW posts_per_user AS
 SELECT 
     u.id as user_id,
     u.name as user_name,
-    COUNT(p.id) as post_count
+    COALESCE(c.post_count, 0) as post_count
 FROM users u
-LEFT JOIN posts p ON u.id = p.user_id
-GROUP BY u.id, u.name
+LEFT JOIN user_post_counts c ON u.id = c.user_id
 ORDER BY post_count DESC;
@@ -0,0 +1,54 @@
+/*
+ * Sonde de santé native pour le HEALTHCHECK des images des services.
+ *
+ *     healthprobe <port> [chemin]     (défaut : /health)
+ *
+ * Envoie "GET <chemin>" à 127.0.0.1:<port> et sort avec 0 si le statut est
+ * 200, 1 sinon (ou au bout de 2 s). Ne dépend que de la libc : pas
+ * d'interpréteur Python lancé toutes les 30 s dans le conteneur.
+ */
+#include <arpa/inet.h>
+#include <netinet/in.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/socket.h>
+#include <unistd.h>
+
+int main(int argc, char **argv)
+{
+    if (argc < 2) {
+        fprintf(stderr, "usage: %s <port> [path]\n", argv[0]);
+        return 1;
+    }
+    const char *path = argc > 2 ? argv[2] : "/health";
+    alarm(2);
+
+    struct sockaddr_in addr;
+    memset(&addr, 0, sizeof(addr));
+    addr.sin_family = AF_INET;
+    addr.sin_port = htons((unsigned short) atoi(argv[1]));
+    addr.sin_addr.s_addr = htonl(INADDR_LOOPBACK);
+
+    int fd = socket(AF_INET, SOCK_STREAM, 0);
+    if (fd < 0 || connect(fd, (struct sockaddr *) &addr, sizeof(addr)) < 0)
+        return 1;
+
+    char request[512];
+    int length = snprintf(request, sizeof(request),
+                          "GET %s HTTP/1.0\r\nHost: localhost\r\nConnection: close\r\n\r\n", path);
+    if (length <= 0 || length >= (int) sizeof(request) || write(fd, request, length) != length)
+        return 1;
+
+    /* "HTTP/1.x 200" : les 12 premiers octets suffisent */
+    char status[13] = {0};
+    size_t received = 0;
+    while (received < 12) {
+        ssize_t n = read(fd, status + received, 12 - received);
+        if (n <= 0)
+            return 1;
+        received += (size_t) n;
+    }
+    close(fd);
+    return strncmp(status, "HTTP/1.", 7) == 0 && strncmp(status + 9, "200", 3) == 0 ? 0 : 1;
+}
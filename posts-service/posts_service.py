@@ -1,59 +1,286 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import errors
+from psycopg2.extras import execute_values
 import os
+import sys
 import logging
-import requests
+from concurrent.futures import TimeoutError as FutureTimeout
 from datetime import datetime
 
-logging.basicConfig(level=logging.INFO)
+from common import admission, compression, db, events, jsonio, metrics, outbox, pagination, profiling, projection, queries
+from common import stats as stats_counters
+from common import logs, tracing
+from common.batching import BatchQueueFull, WriteBatcher
+from common.cache import init_cache
+from common.db import DictRowCursor, get_db
+from users_client import UsersClient, UsersServiceUnavailable, USERS_CLIENT_CONFIG
+
+logs.configure('posts-service')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
 
-# Configuration
-DB_CONFIG = {
-    'host': os.environ.get('DB_HOST', 'postgres-service'),
-    'port': os.environ.get('DB_PORT', '5432'),
-    'database': os.environ.get('DB_NAME', 'microservices_db'),
-    'user': os.environ.get('DB_USER', 'appuser'),
-    'password': os.environ.get('DB_PASSWORD', 'password')
+# Pool de connexions DB (partagé avec users-service)
+db.init_app(app)
+
+# JSON rapide (orjson) et compression des réponses (brotli / gzip)
+jsonio.init_app(app)
+compression.init_app(app)
+
+# Métriques Prometheus (GET /metrics)
+metrics.init_app(app, 'posts-service')
+
+# Traçage (X-Request-ID / traceparent, spans Zipkin) et profilage à chaud (GET /debug/profile)
+tracing.init_app(app)
+profiling.init_app(app)
+
+# Journaux JSON échantillonnés par requête, écrits par un thread du processus
+logs.init_app(app)
+
+# Limitation de débit et délestage sous surcharge (429 / 503 + Retry-After)
+admission.init_app(app)
+
+# Recalcul périodique des compteurs de /stats
+stats_counters.init_app(app)
+
+# GET /posts/stats/users : taille par défaut / maximale du classement
+STATS_TOP_DEFAULT = int(os.environ.get('STATS_TOP_DEFAULT', '10'))
+STATS_TOP_MAX = int(os.environ.get('STATS_TOP_MAX', '1000'))
+
+# Cache des réponses GET, invalidé par les écritures (TTL par type de route)
+cache = init_cache('posts-service')
+CACHE_TTLS = {
+    'list': float(os.environ.get('CACHE_TTL_LIST', '5')),
+    'item': float(os.environ.get('CACHE_TTL_ITEM', '30')),
+    'stats': float(os.environ.get('CACHE_TTL_STATS', '10')),
+    'dashboard': float(os.environ.get('CACHE_TTL_DASHBOARD', '2')),
 }
 
 # URL du Users Service (COMMUNICATION INTER-MICROSERVICES)
 USERS_SERVICE_URL = os.environ.get('USERS_SERVICE_URL', 'http://users-service:5001')
 
-def get_db():
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        return conn
-    except Exception as e:
-        logger.error(f"DB Error: {e}")
-        return None
+# Client partagé : session keep-alive, cache TTL/LRU, coalescence, circuit breaker
+users_client = UsersClient(USERS_SERVICE_URL, **USERS_CLIENT_CONFIG)
 
 def verify_user_exists(user_id):
-    """Vérifie qu'un utilisateur existe via le Users Service"""
+    """Vérifie qu'un utilisateur existe via le Users Service (avec cache).
+
+    Lève UsersServiceUnavailable si le service ne répond pas et que le cache
+    ne contient rien d'utilisable pour cet utilisateur.
+    """
+    with tracing.span('users.verify', user_id=user_id):
+        exists, user = users_client.get_user(user_id)
+    if not exists:
+        logger.warning("⚠️ User %s n'existe pas", user_id)
+    return exists, user
+
+# Colonnes renvoyées par l'API (search_vector reste interne à PostgreSQL)
+POST_COLUMNS = 'id, user_id, title, content, created_at, updated_at'
+
+# Recherche plein texte : configuration de la colonne search_vector (init.sql)
+SEARCH_CONFIG = 'french'
+SEARCH_HEADLINE_OPTIONS = 'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=25, MinWords=8'
+
+# Requêtes nommées : préparées une fois par connexion du pool (common/queries.py)
+POSTS_SELECT = '''
+    SELECT p.id, p.user_id, p.title, p.content, p.created_at,
+           p.author_name as user_name, p.author_email as user_email
+    FROM posts p
+'''
+POSTS_PAGES = pagination.keyset_queries('posts.page', POSTS_SELECT, 'p.created_at', 'p.id')
+POST_BY_ID = queries.define('posts.by_id', '''
+    SELECT p.id, p.user_id, p.title, p.content, p.created_at, p.updated_at,
+           p.author_name as user_name, p.author_email as user_email
+    FROM posts p
+    WHERE p.id = %s
+''')
+DELETE_POST = queries.define('posts.delete', f'DELETE FROM posts WHERE id = %s RETURNING {POST_COLUMNS}')
+LAST_POST_CREATED = queries.define('posts.last_created', 'SELECT MAX(created_at) AS last_post_created FROM posts')
+# Une requête par combinaison de champs modifiés
+UPDATE_POST = {
+    fields: queries.define(
+        f"posts.update.{'_'.join(fields)}",
+        f"UPDATE posts SET {', '.join(f'{field} = %s' for field in fields)}, updated_at = CURRENT_TIMESTAMP "
+        f"WHERE id = %s RETURNING {POST_COLUMNS}"
+    )
+    for fields in (('title',), ('content',), ('title', 'content'))
+}
+POST_COUNTS_BY_IDS = queries.define('posts.counts_by_ids', '''
+    SELECT user_id, post_count, last_post_at
+    FROM user_post_counts
+    WHERE user_id = ANY(%s)
+''')
+POST_COUNTS_TOP = queries.define('posts.counts_top', '''
+    SELECT user_id, post_count, last_post_at
+    FROM user_post_counts
+    ORDER BY post_count DESC, user_id
+    LIMIT %s
+''')
+# Les correspondances viennent de l'index GIN ; ts_headline (coûteux) n'est
+# calculé que pour les lignes de la page
+SEARCH_SQL = '''
+    WITH c AS (SELECT %s::regconfig AS config),
+    q AS (SELECT c.config, websearch_to_tsquery(c.config, %s) AS query FROM c),
+    hits AS (
+        SELECT p.id, p.user_id, p.title, p.content, p.created_at,
+               p.author_name, p.author_email,
+               ts_rank_cd(p.search_vector, q.query) AS rank
+        FROM posts p, q
+        WHERE p.search_vector @@ q.query AND {where}
+        ORDER BY rank DESC, p.id DESC
+        LIMIT %s
+    )
+    SELECT h.id, h.user_id, h.title, h.created_at, h.rank,
+           ts_headline(q.config, h.title, q.query, 'HighlightAll=true, StartSel=<mark>, StopSel=</mark>') AS title_highlight,
+           ts_headline(q.config, h.content, q.query, %s) AS snippet,
+           h.author_name as user_name, h.author_email as user_email
+    FROM hits h
+    CROSS JOIN q
+    ORDER BY h.rank DESC, h.id DESC
+'''
+SEARCH_POSTS = (
+    queries.define('posts.search.first', SEARCH_SQL.format(where='TRUE')),
+    queries.define('posts.search.after', SEARCH_SQL.format(
+        where='(ts_rank_cd(p.search_vector, q.query), p.id) < (%s::real, %s)'
+    )),
+)
+# ?fields= / ?preview= des lectures : champs exposés et colonnes correspondantes
+POST_FIELDS = projection.FieldSet({
+    'id': 'p.id',
+    'user_id': 'p.user_id',
+    'title': 'p.title',
+    'content': 'p.content',
+    'created_at': 'p.created_at',
+    'updated_at': 'p.updated_at',
+    'user_name': 'p.author_name',
+    'user_email': 'p.author_email',
+}, preview='content')
+POST_LIST_FIELDS = ('id', 'user_id', 'title', 'content', 'created_at', 'user_name', 'user_email')
+POST_ITEM_FIELDS = POST_LIST_FIELDS + ('updated_at',)
+POSTS_BY_USER_FIELDS = ('id', 'user_id', 'title', 'content', 'created_at')
+# GET /posts/dashboard : première page des users et des posts (aperçu du contenu)
+DASHBOARD_LIMIT = int(os.environ.get('DASHBOARD_LIMIT', '100'))
+DASHBOARD_PREVIEW = int(os.environ.get('DASHBOARD_PREVIEW', '300'))
+DASHBOARD_LAST_CREATED = queries.define('dashboard.last_created', '''
+    SELECT (SELECT MAX(created_at) FROM users) AS last_user_created,
+           (SELECT MAX(created_at) FROM posts) AS last_post_created
+''')
+DASHBOARD_USERS = queries.define('dashboard.users', '''
+    SELECT id, name, email, created_at
+    FROM users
+    ORDER BY created_at DESC, id DESC
+    LIMIT %s
+''')
+DASHBOARD_POSTS = projection.Projection(
+    POST_FIELDS, ('id', 'user_id', 'title', 'content', 'created_at', 'user_name'), preview=DASHBOARD_PREVIEW
+).keyset_queries('dashboard.posts', 'FROM posts p', 'p.created_at', 'p.id')[0]
+LOCK_AUTHORS = queries.define(
+    'authors.lock', 'SELECT user_id FROM authors WHERE user_id = ANY(%s) ORDER BY user_id FOR SHARE'
+)
+
+# Écritures groupées (group commit) de POST /posts, désactivées par défaut
+WRITE_BATCH_CONFIG = {
+    'enabled': os.environ.get('POSTS_WRITE_BATCHING', '0') == '1',
+    'max_size': int(os.environ.get('WRITE_BATCH_MAX_SIZE', '64')),
+    'max_wait': float(os.environ.get('WRITE_BATCH_MAX_WAIT_MS', '2')) / 1000,
+    'max_queue': int(os.environ.get('WRITE_BATCH_MAX_QUEUE', '1024')),
+    'flushers': int(os.environ.get('WRITE_BATCH_FLUSHERS', '1')),
+    'timeout': float(os.environ.get('WRITE_BATCH_TIMEOUT', '10')),
+}
+
+def insert_posts(conn, rows):
+    """Insère des (user_id, title, content, nom, email) en une transaction ; retourne les posts dans le même ordre
+
+    Le nom / email de l'auteur viennent de la projection ``authors`` quand
+    elle le connaît (sinon de users-service, passés dans ``rows``). Les
+    lignes ``authors`` sont verrouillées jusqu'au COMMIT : un changement
+    d'utilisateur appliqué en même temps attend et met aussi à jour ces posts.
+    """
     try:
-        logger.info(f"🔗 Communication avec Users Service pour vérifier user {user_id}")
-        response = requests.get(f"{USERS_SERVICE_URL}/users/{user_id}", timeout=5)
-        
-        if response.status_code == 200:
-            logger.info(f"✅ User {user_id} existe")
-            return True, response.json().get('user')
-        elif response.status_code == 404:
-            logger.warning(f"⚠️ User {user_id} n'existe pas")
-            return False, None
-        else:
-            logger.error(f"❌ Erreur Users Service: {response.status_code}")
-            return False, None
-    except requests.Timeout:
-        logger.error("❌ Timeout vers Users Service")
-        return False, None
-    except Exception as e:
-        logger.error(f"❌ Erreur communication: {e}")
-        return False, None
+        cur = conn.cursor(cursor_factory=DictRowCursor)
+        LOCK_AUTHORS.execute(cur, (sorted({int(row[0]) for row in rows}),))
+        # Les ids sont attribués dans l'ordre de ORDER BY ord : trier par id
+        # redonne l'ordre des lignes envoyées
+        inserted = execute_values(
+            cur,
+            f'''INSERT INTO posts (user_id, title, content, author_name, author_email)
+                SELECT v.user_id, v.title, v.content, COALESCE(a.name, v.name), COALESCE(a.email, v.email)
+                FROM (VALUES %s) AS v(ord, user_id, title, content, name, email)
+                LEFT JOIN authors a ON a.user_id = v.user_id
+                ORDER BY v.ord
+                RETURNING {POST_COLUMNS}, author_name as user_name, author_email as user_email''',
+            [(i, *row) for i, row in enumerate(rows)],
+            template='(%s, %s::integer, %s, %s, %s, %s)',
+            page_size=len(rows),
+            fetch=True
+        )
+        events.publish(cur, 'posts', 'create', inserted)
+        conn.commit()
+        cur.close()
+    except Exception:
+        conn.rollback()
+        raise
+    return sorted(inserted, key=lambda post: post['id'])
+
+def _flush_posts(rows):
+    with db.get_pool().connection() as conn:
+        return insert_posts(conn, rows)
+
+post_writer = None
+if WRITE_BATCH_CONFIG['enabled']:
+    post_writer = WriteBatcher(
+        'posts', _flush_posts,
+        max_size=WRITE_BATCH_CONFIG['max_size'],
+        max_wait=WRITE_BATCH_CONFIG['max_wait'],
+        max_queue=WRITE_BATCH_CONFIG['max_queue'],
+        flushers=WRITE_BATCH_CONFIG['flushers'],
+    )
+
+# ==================== AUTEURS (projection de users) ====================
+# Nom / email de l'auteur copiés dans posts : les lectures se passent de la
+# jointure sur users. users-service publie ses changements dans l'outbox
+# (topic "users") ; ce consommateur met à jour authors puis les posts concernés.
+
+AUTHORS_SYNC_ENABLED = os.environ.get('AUTHORS_SYNC', '1') != '0'
+
+DELETE_AUTHOR = queries.define('authors.delete', 'DELETE FROM authors WHERE user_id = %s')
+UPSERT_AUTHOR = queries.define('authors.upsert', '''
+    INSERT INTO authors (user_id, name, email) VALUES (%s, %s, %s)
+    ON CONFLICT (user_id) DO UPDATE
+        SET name = EXCLUDED.name, email = EXCLUDED.email, updated_at = CURRENT_TIMESTAMP
+''')
+SYNC_AUTHOR_POSTS = queries.define('authors.sync_posts', '''
+    UPDATE posts SET author_name = %s, author_email = %s
+    WHERE user_id = %s AND (author_name, author_email) IS DISTINCT FROM (%s, %s)
+''')
+
+def apply_user_changes(cur, events):
+    """Applique un lot d'événements users (dernier état par utilisateur, ids triés)"""
+    latest = {}
+    for event in events:
+        latest[event['payload']['id']] = event['payload']
+    for user_id in sorted(latest):
+        change = latest[user_id]
+        if change['op'] == 'delete':
+            # Les posts sont supprimés par la cascade de users
+            DELETE_AUTHOR.execute(cur, (user_id,))
+            continue
+        UPSERT_AUTHOR.execute(cur, (user_id, change['name'], change['email']))
+        SYNC_AUTHOR_POSTS.execute(cur, (change['name'], change['email'], user_id, change['name'], change['email']))
+
+def invalidate_authors(events):
+    user_ids = {event['payload']['id'] for event in events}
+    cache.invalidate('posts:list', 'users:profiles', *(f'posts:user:{user_id}' for user_id in user_ids))
+    # Cache de users_client : un utilisateur supprimé ne passe plus verify_user_exists
+    for user_id in user_ids:
+        users_client.invalidate(user_id)
+
+author_sync = outbox.consumer('posts-authors', ['users'], apply_user_changes, after_commit=invalidate_authors)
+if AUTHORS_SYNC_ENABLED:
+    author_sync.init_app(app)
 
 # ==================== HEALTH ====================
 
@@ -66,32 +293,31 @@ def ready():
     # Vérifier DB
     conn = get_db()
     if not conn:
-        return jsonify({'status': 'not ready', 'database': 'disconnected'}), 503
+        return jsonify({'status': 'not ready', 'database': 'disconnected', 'pool': db.pool_stats()}), 503
     
     try:
         cur = conn.cursor()
         cur.execute('SELECT 1')
         cur.close()
-        conn.close()
         
         # Vérifier Users Service
-        try:
-            response = requests.get(f"{USERS_SERVICE_URL}/health", timeout=3)
-            users_service_ok = response.status_code == 200
-        except:
-            users_service_ok = False
+        users_service_ok = users_client.health(timeout=3)
         
         if users_service_ok:
             return jsonify({
                 'status': 'ready',
                 'database': 'connected',
-                'users_service': 'reachable'
+                'users_service': 'reachable',
+                'pool': db.pool_stats(),
+                'replicas': db.replica_stats()
             }), 200
         else:
             return jsonify({
                 'status': 'degraded',
                 'database': 'connected',
-                'users_service': 'unreachable'
+                'users_service': 'unreachable',
+                'pool': db.pool_stats(),
+                'replicas': db.replica_stats()
             }), 200
     except:
         return jsonify({'status': 'not ready'}), 503
@@ -99,67 +325,141 @@ def ready():
 # ==================== CRUD POSTS ====================
 
 @app.route('/posts', methods=['GET'])
+@cache.cached(CACHE_TTLS['list'], tags=lambda: ['posts:list', 'users:profiles'], bypass=pagination.wants_ndjson)
+@db.read_only
 def get_posts():
-    """GET tous les posts avec info utilisateur"""
+    """GET les posts avec info utilisateur, paginés par curseur (ou streamés en NDJSON)"""
     logger.info("📥 GET /posts")
+    try:
+        limit, after = pagination.parse_page_args(request.args)
+        # id et created_at portent le curseur : toujours renvoyés
+        fields = POST_FIELDS.parse(request.args, POST_LIST_FIELDS, required=('id', 'created_at'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    if pagination.wants_ndjson(request):
+        where, params = pagination.keyset_where(after, 'p.created_at', 'p.id')
+        select = POSTS_SELECT if fields is None else f'SELECT {fields.select} FROM posts p'
+        query = f"{select} WHERE {where} ORDER BY {pagination.keyset_order('p.created_at', 'p.id')}"
+        return pagination.ndjson_response(query, (*(fields.params if fields else ()), *params))
+    
     conn = get_db()
     if not conn:
         return jsonify({'success': False, 'error': 'DB connection failed'}), 500
     
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute('''
-            SELECT p.id, p.user_id, p.title, p.content, p.created_at,
-                   u.name as user_name, u.email as user_email
-            FROM posts p
-            JOIN users u ON p.user_id = u.id
-            ORDER BY p.created_at DESC
-        ''')
-        posts = cur.fetchall()
+        cur = conn.cursor(cursor_factory=DictRowCursor)
+        if fields is None:
+            posts, next_cursor = pagination.fetch_named_page(cur, POSTS_PAGES, after, limit)
+        else:
+            pages = fields.keyset_queries('posts.page', 'FROM posts p', 'p.created_at', 'p.id')
+            posts, next_cursor = pagination.fetch_named_page(cur, pages, after, limit, fields.params)
         cur.close()
-        conn.close()
         
-        logger.info(f"✅ Retourné {len(posts)} posts")
-        return jsonify({'success': True, 'count': len(posts), 'posts': posts}), 200
+        logger.info("✅ Retourné %s posts", len(posts))
+        return jsonify({
+            'success': True,
+            'count': len(posts),
+            'limit': limit,
+            'next_cursor': next_cursor,
+            'posts': posts
+        }), 200
     except Exception as e:
-        logger.error(f"❌ Error: {e}")
+        logger.error("❌ Error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/posts/search', methods=['GET'])
+@cache.cached(CACHE_TTLS['list'], tags=lambda: ['posts:list', 'users:profiles'])
+@db.read_only
+def search_posts():
+    """Recherche plein texte (titre + contenu), triée par pertinence, avec extraits surlignés"""
+    try:
+        q, limit, after = pagination.parse_search_args(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    logger.info("🔎 GET /posts/search q=%r", q)
+    
+    conn = get_db()
+    if not conn:
+        return jsonify({'success': False, 'error': 'DB connection failed'}), 500
+    
+    try:
+        cur = conn.cursor(cursor_factory=DictRowCursor)
+        if after is None:
+            posts = SEARCH_POSTS[0].fetchall(cur, (SEARCH_CONFIG, q, limit + 1, SEARCH_HEADLINE_OPTIONS))
+        else:
+            posts = SEARCH_POSTS[1].fetchall(cur, (SEARCH_CONFIG, q, *after, limit + 1, SEARCH_HEADLINE_OPTIONS))
+        cur.close()
+        
+        next_cursor = None
+        if len(posts) > limit:
+            posts = posts[:limit]
+            next_cursor = pagination.encode_rank_cursor(posts[-1]['rank'], posts[-1]['id'])
+        
+        logger.info("✅ Recherche: %s posts", len(posts))
+        return jsonify({
+            'success': True,
+            'query': q,
+            'count': len(posts),
+            'limit': limit,
+            'next_cursor': next_cursor,
+            'posts': posts
+        }), 200
+    except Exception as e:
+        logger.error("❌ Error: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/posts/<int:post_id>', methods=['GET'])
+@cache.cached(CACHE_TTLS['item'], tags=lambda post_id: [f'post:{post_id}', 'users:profiles'])
+@db.read_only
 def get_post(post_id):
     """GET un post par ID"""
-    logger.info(f"📥 GET /posts/{post_id}")
+    logger.info("📥 GET /posts/%s", post_id)
+    try:
+        fields = POST_FIELDS.parse(request.args, POST_ITEM_FIELDS)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
     conn = get_db()
     if not conn:
         return jsonify({'success': False, 'error': 'DB connection failed'}), 500
     
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute('''
-            SELECT p.*, u.name as user_name, u.email as user_email
-            FROM posts p
-            JOIN users u ON p.user_id = u.id
-            WHERE p.id = %s
-        ''', (post_id,))
-        post = cur.fetchone()
+        cur = conn.cursor(cursor_factory=DictRowCursor)
+        if fields is None:
+            post = POST_BY_ID.fetchone(cur, (post_id,))
+        else:
+            query = fields.define('posts.by_id', 'FROM posts p WHERE p.id = %s')
+            post = query.fetchone(cur, (*fields.params, post_id))
         cur.close()
-        conn.close()
         
         if post:
             return jsonify({'success': True, 'post': post}), 200
         else:
             return jsonify({'success': False, 'error': 'Post not found'}), 404
     except Exception as e:
-        logger.error(f"❌ Error: {e}")
+        logger.error("❌ Error: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/posts/user/<int:user_id>', methods=['GET'])
+@cache.cached(CACHE_TTLS['list'], tags=lambda user_id: [f'posts:user:{user_id}', f'user:{user_id}'])
+@db.read_only
 def get_posts_by_user(user_id):
     """GET tous les posts d'un utilisateur"""
-    logger.info(f"📥 GET /posts/user/{user_id}")
+    logger.info("📥 GET /posts/user/%s", user_id)
+    try:
+        fields = POST_FIELDS.parse(request.args, POSTS_BY_USER_FIELDS)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if fields is None:
+        fields = projection.Projection(POST_FIELDS, POSTS_BY_USER_FIELDS)
     
     # COMMUNICATION INTER-MICROSERVICES: Vérifier que l'user existe
-    user_exists, user_data = verify_user_exists(user_id)
+    try:
+        user_exists, user_data = verify_user_exists(user_id)
+    except UsersServiceUnavailable as e:
+        logger.error("❌ Users Service indisponible: %s", e)
+        return jsonify({'success': False, 'error': 'Users service unavailable'}), 503
     if not user_exists:
         return jsonify({'success': False, 'error': 'User not found'}), 404
     
@@ -167,27 +467,48 @@ def get_posts_by_user(user_id):
     if not conn:
         return jsonify({'success': False, 'error': 'DB connection failed'}), 500
     
+    chunk_size = pagination.STREAM_CHUNK_SIZE
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute('''
-            SELECT id, user_id, title, content, created_at
-            FROM posts
-            WHERE user_id = %s
-            ORDER BY created_at DESC
-        ''', (user_id,))
-        posts = cur.fetchall()
-        cur.close()
-        conn.close()
+        # Curseur serveur : au-delà d'un bloc, la réponse est streamée au lieu
+        # d'être construite entièrement en mémoire
+        cur = conn.cursor(name='posts_by_user', cursor_factory=DictRowCursor)
+        cur.itersize = chunk_size
+        cur.execute(f'''
+            SELECT {fields.select}
+            FROM posts p
+            WHERE p.user_id = %s
+            ORDER BY p.created_at DESC
+        ''', (*fields.params, user_id))
+        posts = cur.fetchmany(chunk_size + 1)
         
-        logger.info(f"✅ Retourné {len(posts)} posts pour user {user_id}")
-        return jsonify({
-            'success': True,
-            'count': len(posts),
-            'user': user_data,
-            'posts': posts
-        }), 200
+        if len(posts) <= chunk_size:
+            cur.close()
+            logger.info("✅ Retourné %s posts pour user %s", len(posts), user_id)
+            return jsonify({
+                'success': True,
+                'count': len(posts),
+                'user': user_data,
+                'posts': posts
+            }), 200
+        
+        count = [0]
+        
+        def chunks():
+            try:
+                rows = posts
+                while rows:
+                    count[0] += len(rows)
+                    yield rows
+                    rows = cur.fetchmany(chunk_size)
+            finally:
+                cur.close()
+            logger.info("✅ Streamé %s posts pour user %s", count[0], user_id)
+        
+        body = jsonio.stream_array({'success': True, 'user': user_data}, 'posts', chunks(),
+                                   tail=lambda: {'count': count[0]})
+        return Response(stream_with_context(body), mimetype='application/json')
     except Exception as e:
-        logger.error(f"❌ Error: {e}")
+        logger.error("❌ Error: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/posts', methods=['POST'])
@@ -199,44 +520,56 @@ def create_post():
     if not data or not data.get('user_id') or not data.get('title') or not data.get('content'):
         return jsonify({'success': False, 'error': 'user_id, title and content required'}), 400
     
-    user_id = data['user_id']
+    # Entier : même clé dans le cache de users_client que les événements users
+    try:
+        user_id = int(data['user_id'])
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'user_id must be an integer'}), 400
     title = data['title'].strip()
     content = data['content'].strip()
     
     # COMMUNICATION INTER-MICROSERVICES: Vérifier que l'user existe
-    user_exists, user_data = verify_user_exists(user_id)
+    try:
+        user_exists, user_data = verify_user_exists(user_id)
+    except UsersServiceUnavailable as e:
+        logger.error("❌ Users Service indisponible: %s", e)
+        return jsonify({'success': False, 'error': 'Users service unavailable'}), 503
     if not user_exists:
         return jsonify({'success': False, 'error': f'User {user_id} does not exist'}), 404
     
-    conn = get_db()
-    if not conn:
-        return jsonify({'success': False, 'error': 'DB connection failed'}), 500
-    
+    snapshot = (user_id, title, content, user_data['name'], user_data['email'])
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute(
-            'INSERT INTO posts (user_id, title, content) VALUES (%s, %s, %s) RETURNING *',
-            (user_id, title, content)
-        )
-        new_post = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
-        
-        # Enrichir avec les données user
-        new_post['user_name'] = user_data['name']
-        new_post['user_email'] = user_data['email']
+        if post_writer is not None:
+            # Écrit avec les créations simultanées : un INSERT et un COMMIT par lot
+            # (le lot s'exécute dans un thread d'écriture : span = attente + écriture)
+            with tracing.span('posts.insert', batched=True):
+                new_post = post_writer.submit(snapshot, timeout=WRITE_BATCH_CONFIG['timeout'])
+        else:
+            conn = get_db()
+            if not conn:
+                return jsonify({'success': False, 'error': 'DB connection failed'}), 500
+            with tracing.span('posts.insert', batched=False):
+                new_post = insert_posts(conn, [snapshot])[0]
+        cache.invalidate('posts:list', 'posts:stats', f'posts:user:{user_id}')
         
-        logger.info(f"✅ Post créé: {new_post['id']} par user {user_id}")
+        logger.info("✅ Post créé: %s par user %s", new_post['id'], user_id)
         return jsonify({'success': True, 'post': new_post}), 201
+    except errors.ForeignKeyViolation:
+        # Utilisateur supprimé depuis sa mise en cache (ligne seule ou réécriture
+        # une par une du lot) : l'entrée périmée est retirée
+        users_client.invalidate(user_id)
+        return jsonify({'success': False, 'error': f'User {user_id} does not exist'}), 404
+    except (BatchQueueFull, FutureTimeout) as e:
+        logger.error("❌ Écriture groupée impossible: %s", e)
+        return jsonify({'success': False, 'error': 'Write queue saturated, retry later'}), 503
     except Exception as e:
-        logger.error(f"❌ Error: {e}")
+        logger.error("❌ Error: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/posts/<int:post_id>', methods=['PUT'])
 def update_post(post_id):
     """PUT mettre à jour un post"""
-    logger.info(f"✏️ PUT /posts/{post_id}")
+    logger.info("✏️ PUT /posts/%s", post_id)
     data = request.get_json()
     
     if not data:
@@ -247,74 +580,70 @@ def update_post(post_id):
         return jsonify({'success': False, 'error': 'DB connection failed'}), 500
     
     try:
-        updates = []
-        values = []
-        
-        if data.get('title'):
-            updates.append('title = %s')
-            values.append(data['title'])
-        if data.get('content'):
-            updates.append('content = %s')
-            values.append(data['content'])
+        fields = tuple(field for field in ('title', 'content') if data.get(field))
         
-        if not updates:
+        if not fields:
             return jsonify({'success': False, 'error': 'No fields to update'}), 400
         
-        updates.append('updated_at = CURRENT_TIMESTAMP')
-        values.append(post_id)
-        
-        query = f"UPDATE posts SET {', '.join(updates)} WHERE id = %s RETURNING *"
-        
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute(query, values)
-        updated_post = cur.fetchone()
+        cur = conn.cursor(cursor_factory=DictRowCursor)
+        updated_post = UPDATE_POST[fields].fetchone(cur, (*(data[field] for field in fields), post_id))
         
         if not updated_post:
             cur.close()
-            conn.close()
             return jsonify({'success': False, 'error': 'Post not found'}), 404
         
+        events.publish(cur, 'posts', 'update', [updated_post])
         conn.commit()
         cur.close()
-        conn.close()
+        cache.invalidate(f'post:{post_id}', 'posts:list', f"posts:user:{updated_post['user_id']}")
         
-        logger.info(f"✅ Post {post_id} mis à jour")
+        logger.info("✅ Post %s mis à jour", post_id)
         return jsonify({'success': True, 'post': updated_post}), 200
     except Exception as e:
-        logger.error(f"❌ Error: {e}")
+        logger.error("❌ Error: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/posts/<int:post_id>', methods=['DELETE'])
 def delete_post(post_id):
     """DELETE supprimer un post"""
-    logger.info(f"🗑️ DELETE /posts/{post_id}")
+    logger.info("🗑️ DELETE /posts/%s", post_id)
     conn = get_db()
     if not conn:
         return jsonify({'success': False, 'error': 'DB connection failed'}), 500
     
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute('DELETE FROM posts WHERE id = %s RETURNING *', (post_id,))
-        deleted_post = cur.fetchone()
+        cur = conn.cursor(cursor_factory=DictRowCursor)
+        deleted_post = DELETE_POST.fetchone(cur, (post_id,))
         
         if not deleted_post:
             cur.close()
-            conn.close()
             return jsonify({'success': False, 'error': 'Post not found'}), 404
         
+        events.publish(cur, 'posts', 'delete', [deleted_post])
         conn.commit()
         cur.close()
-        conn.close()
+        cache.invalidate(f'post:{post_id}', 'posts:list', 'posts:stats', f"posts:user:{deleted_post['user_id']}")
         
-        logger.info(f"✅ Post {post_id} supprimé")
+        logger.info("✅ Post %s supprimé", post_id)
         return jsonify({'success': True, 'message': 'Post deleted', 'post': deleted_post}), 200
     except Exception as e:
-        logger.error(f"❌ Error: {e}")
+        logger.error("❌ Error: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# ==================== FLUX DE CHANGEMENTS ====================
+
+@app.route('/posts/events', methods=['GET'])
+@admission.streaming
+def post_events():
+    """Flux SSE des changements de posts, et d'utilisateurs (nom d'auteur, suppression en cascade)"""
+    logger.info("📡 GET /posts/events")
+    return events.stream(['posts', 'users'])
+
 # ==================== STATS ====================
 
 @app.route('/posts/stats', methods=['GET'])
+@cache.cached(CACHE_TTLS['stats'], tags=lambda: ['posts:stats'])
+@db.read_only
 def stats():
     """Statistiques des posts"""
     conn = get_db()
@@ -322,21 +651,108 @@ def stats():
         return jsonify({'success': False, 'error': 'DB connection failed'}), 500
     
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute('''
-            SELECT 
-                COUNT(*) as total_posts,
-                COUNT(DISTINCT user_id) as users_with_posts
-            FROM posts
-        ''')
-        result = cur.fetchone()
+        cur = conn.cursor(cursor_factory=DictRowCursor)
+        # Compteurs maintenus par trigger + MAX par l'index : pas de parcours de la table
+        counters = stats_counters.read_counters(cur, 'posts', 'users_with_posts')
+        result = {
+            'total_posts': counters['posts'],
+            'users_with_posts': counters['users_with_posts'],
+            **LAST_POST_CREATED.fetchone(cur)
+        }
         cur.close()
-        conn.close()
         
         return jsonify({'success': True, 'stats': result}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/posts/dashboard', methods=['GET'])
+@cache.cached(CACHE_TTLS['dashboard'], tags=lambda: ['posts:list', 'posts:stats', 'users:profiles'])
+@db.read_only
+def dashboard():
+    """Page d'accueil du frontend en une requête : stats des deux services, premières pages users et posts
+
+    Une seule connexion et quatre requêtes préparées au lieu de quatre appels
+    via la gateway. La réponse est partagée quelques secondes (les chargements
+    simultanés attendent le même calcul) ; un nouvel utilisateur sans post
+    apparaît au plus tard après ``CACHE_TTL_DASHBOARD``.
+    """
+    try:
+        limit = int(request.args.get('limit', DASHBOARD_LIMIT))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+    if not 1 <= limit <= pagination.MAX_LIMIT:
+        return jsonify({'success': False, 'error': f'limit must be between 1 and {pagination.MAX_LIMIT}'}), 400
+    
+    conn = get_db()
+    if not conn:
+        return jsonify({'success': False, 'error': 'DB connection failed'}), 500
+    
+    try:
+        cur = conn.cursor(cursor_factory=DictRowCursor)
+        counters = stats_counters.read_counters(cur, 'users', 'posts', 'users_with_posts')
+        last = DASHBOARD_LAST_CREATED.fetchone(cur)
+        users, users_cursor = pagination.split_page(DASHBOARD_USERS.fetchall(cur, (limit + 1,)), limit)
+        posts, posts_cursor = pagination.split_page(
+            DASHBOARD_POSTS.fetchall(cur, (DASHBOARD_PREVIEW, limit + 1)), limit
+        )
+        cur.close()
+        
+        return jsonify({
+            'success': True,
+            'stats': {
+                'users': {'total': counters['users'], 'last_user_created': last['last_user_created']},
+                'posts': {
+                    'total_posts': counters['posts'],
+                    'users_with_posts': counters['users_with_posts'],
+                    'last_post_created': last['last_post_created'],
+                },
+            },
+            # État du circuit vers users-service vu par ce pod (aucun appel supplémentaire)
+            'users_service': 'unreachable' if users_client.breaker.state == 'open' else 'reachable',
+            'users': users,
+            'users_next_cursor': users_cursor,
+            'posts': posts,
+            'posts_next_cursor': posts_cursor,
+            'preview': DASHBOARD_PREVIEW,
+        }), 200
+    except Exception as e:
+        logger.error("❌ Error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/posts/stats/users', methods=['GET'])
+@cache.cached(CACHE_TTLS['stats'], tags=lambda: ['posts:stats'])
+@db.read_only
+def stats_by_user():
+    """Nombre de posts par utilisateur : ?ids=1,2,3 ou les ?limit= plus actifs"""
+    raw_ids = request.args.get('ids')
+    try:
+        ids = [int(i) for i in raw_ids.split(',') if i.strip()] if raw_ids else None
+        limit = int(request.args.get('limit', STATS_TOP_DEFAULT))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'ids and limit must be integers'}), 400
+    if ids is not None and not 0 < len(ids) <= STATS_TOP_MAX:
+        return jsonify({'success': False, 'error': f'Between 1 and {STATS_TOP_MAX} ids per request'}), 400
+    if not 1 <= limit <= STATS_TOP_MAX:
+        return jsonify({'success': False, 'error': f'limit must be between 1 and {STATS_TOP_MAX}'}), 400
+    
+    conn = get_db()
+    if not conn:
+        return jsonify({'success': False, 'error': 'DB connection failed'}), 500
+    
+    try:
+        cur = conn.cursor(cursor_factory=DictRowCursor)
+        if ids is not None:
+            found = {row['user_id']: row for row in POST_COUNTS_BY_IDS.fetchall(cur, (ids,))}
+            # Utilisateur sans post : pas de ligne dans user_post_counts
+            counts = [found.get(i, {'user_id': i, 'post_count': 0, 'last_post_at': None}) for i in ids]
+        else:
+            counts = POST_COUNTS_TOP.fetchall(cur, (limit,))
+        cur.close()
+        
+        return jsonify({'success': True, 'count': len(counts), 'users': counts}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/info', methods=['GET'])
 def info():
     return jsonify({
@@ -348,16 +764,25 @@ def info():
         },
         'endpoints': [
             'GET /posts',
+            'GET /posts/search?q=<texte>',
             'GET /posts/<id>',
             'GET /posts/user/<user_id>',
             'POST /posts',
             'PUT /posts/<id>',
             'DELETE /posts/<id>',
-            'GET /posts/stats'
+            'GET /posts/events',
+            'GET /posts/stats',
+            'GET /posts/stats/users',
+            'GET /posts/dashboard'
         ]
     }), 200
 
 if __name__ == '__main__':
-    logger.info("🚀 Starting Posts Service on port 5002...")
-    logger.info(f"🔗 Users Service URL: {USERS_SERVICE_URL}")
-    app.run(host='0.0.0.0', port=5002, debug=False)
+    if sys.argv[1:] == ['serve']:
+        # Production : gunicorn multi-workers / multi-threads
+        from common.serving import serve
+        serve(app, 5002)
+    else:
+        logger.info("🚀 Starting Posts Service on port 5002...")
+        logger.info("🔗 Users Service URL: %s", USERS_SERVICE_URL)
+        app.run(host='0.0.0.0', port=5002, debug=False)
@@ -0,0 +1,811 @@
+"""Variante asyncio du Posts Service (aiohttp + asyncpg).
+
+Mêmes routes et même format JSON que posts_service.py. Un seul processus
+garde des milliers de requêtes en vol : l'attente de PostgreSQL et de
+users-service ne bloque plus de thread. Lancement :
+
+    python posts_service_async.py
+"""
+import os
+import time
+import asyncio
+import logging
+import itertools
+
+import asyncpg
+from aiohttp import web
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from common import compression, events, jsonio, logs, metrics, profiling, projection, tracing
+from common import db
+from common.db import DB_CONFIG, POOL_CONFIG, REPLICA_CONFIG
+from common.pagination import (
+    encode_cursor, encode_rank_cursor, parse_page_args, parse_search_args, NDJSON_MIMETYPE, STREAM_CHUNK_SIZE,
+)
+from users_client import AsyncUsersClient, UsersServiceUnavailable, USERS_CLIENT_CONFIG
+
+SERVICE = 'posts-service'
+logs.configure(SERVICE)
+logger = logging.getLogger(__name__)
+metrics.set_service(SERVICE)
+USERS_SERVICE_URL = os.environ.get('USERS_SERVICE_URL', 'http://users-service:5001')
+PORT = int(os.environ.get('PORT', '5002'))
+BACKLOG = int(os.environ.get('WEB_BACKLOG', '2048'))
+
+# Colonnes renvoyées par l'API (search_vector reste interne à PostgreSQL)
+POST_COLUMNS = 'id, user_id, title, content, created_at, updated_at'
+# Nom / email de l'auteur copiés depuis la projection authors (ligne verrouillée
+# jusqu'à la fin de l'INSERT), sinon depuis users-service ($4, $5)
+INSERT_POST = f'''
+    WITH a AS (SELECT name, email FROM authors WHERE user_id = $1 FOR SHARE)
+    INSERT INTO posts (user_id, title, content, author_name, author_email)
+    SELECT $1, $2, $3, COALESCE((SELECT name FROM a), $4), COALESCE((SELECT email FROM a), $5)
+    RETURNING {POST_COLUMNS}, author_name as user_name, author_email as user_email
+'''
+
+# Recherche plein texte : configuration de la colonne search_vector (init.sql)
+SEARCH_CONFIG = 'french'
+SEARCH_HEADLINE_OPTIONS = 'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=25, MinWords=8'
+
+
+# ==================== JSON ====================
+
+# Même encodeur que la version Flask (orjson, format de date JSON_DATETIME_FORMAT)
+dumps = jsonio.dumps
+
+
+def json_response(data, status=200):
+    with tracing.span('json.encode'):
+        body = jsonio.dumps_bytes(data)
+    return web.Response(body=body, status=status, content_type='application/json')
+
+
+def row(record):
+    return dict(record) if record is not None else None
+
+
+# ==================== RÉPLICAS EN LECTURE ====================
+
+class ReplicaRouter:
+    """Pools asyncpg des réplicas (DB_REPLICAS), vérifiés en tâche de fond
+
+    Les lectures vont aux réplicas sains à tour de rôle. Un client marqué
+    après une écriture (cookie db_rw / en-tête X-DB-LSN, posés comme dans la
+    version Flask) lit sur le primaire jusqu'à expiration du marqueur.
+    """
+
+    def __init__(self, primary):
+        self.primary = primary
+        self.replicas = []
+        self._rotation = itertools.count()
+        self._monitor = None
+
+    async def start(self):
+        for name, params in db.replica_targets():
+            if 'dsn' not in params:
+                params = {**params, 'port': int(params['port'])}
+            pool = await asyncpg.create_pool(
+                **params,
+                min_size=0,
+                max_size=POOL_CONFIG['maxconn'],
+                max_inactive_connection_lifetime=POOL_CONFIG['max_idle'],
+            )
+            self.replicas.append({'name': name, 'pool': pool, 'lag': None, 'ejected_until': 0.0})
+        if self.replicas:
+            self._monitor = asyncio.create_task(self._check_forever())
+
+    async def close(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+        for replica in self.replicas:
+            await replica['pool'].close()
+
+    def _eject(self, replica, reason):
+        replica['ejected_until'] = time.monotonic() + REPLICA_CONFIG['eject_seconds']
+        logger.warning("⚠️ Réplica %s écarté pour %ss: %s",
+                       replica['name'], REPLICA_CONFIG['eject_seconds'], reason)
+
+    async def _check_forever(self):
+        while True:
+            for replica in self.replicas:
+                try:
+                    replica['lag'] = float(await replica['pool'].fetchval(db.REPLICA_LAG_SQL, timeout=5))
+                    if replica['lag'] > REPLICA_CONFIG['max_lag']:
+                        self._eject(replica, f"retard de {replica['lag']:.1f}s")
+                except Exception as e:
+                    self._eject(replica, e)
+            await asyncio.sleep(REPLICA_CONFIG['check_interval'])
+
+    def pick(self, request):
+        """Pool pour une lecture : réplica sain suivant, sinon primaire"""
+        if not self.replicas or db.parse_read_your_writes(
+                request.headers.get(db.READ_YOUR_WRITES_HEADER)
+                or request.cookies.get(db.READ_YOUR_WRITES_COOKIE)) is not None:
+            return self.primary
+        now = time.monotonic()
+        start = next(self._rotation)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            if now >= replica['ejected_until']:
+                return replica['pool']
+        return self.primary
+
+    def stats(self):
+        now = time.monotonic()
+        return [{'name': r['name'], 'available': now >= r['ejected_until'], 'lag_seconds': r['lag']}
+                for r in self.replicas]
+
+
+def read_db(request):
+    return request.app['replicas'].pick(request)
+
+
+# ==================== CYCLE DE VIE ====================
+
+async def lifecycle(app):
+    app['db'] = await asyncpg.create_pool(
+        host=DB_CONFIG['host'],
+        port=int(DB_CONFIG['port']),
+        database=DB_CONFIG['database'],
+        user=DB_CONFIG['user'],
+        password=DB_CONFIG['password'],
+        min_size=POOL_CONFIG['minconn'],
+        max_size=POOL_CONFIG['maxconn'],
+        max_inactive_connection_lifetime=POOL_CONFIG['max_idle'],
+    )
+    app['replicas'] = ReplicaRouter(app['db'])
+    await app['replicas'].start()
+    app['users'] = AsyncUsersClient(USERS_SERVICE_URL, **USERS_CLIENT_CONFIG)
+    await app['users'].start()
+    app['events'] = ChangeFeed()
+    if events.EVENTS_CONFIG['enabled']:
+        await app['events'].start()
+    yield
+    await app['events'].close()
+    await app['users'].close()
+    await app['replicas'].close()
+    await app['db'].close()
+
+
+@web.middleware
+async def cors(request, handler):
+    if request.method == 'OPTIONS':
+        response = web.Response()
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
+        response.headers['Access-Control-Allow-Headers'] = request.headers.get('Access-Control-Request-Headers', '*')
+    else:
+        response = await handler(request)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+
+@web.middleware
+async def instrument(request, handler):
+    # Mêmes métriques HTTP que la version Flask
+    resource = request.match_info.route.resource
+    route = resource.canonical if resource is not None else 'unmatched'
+    start = time.perf_counter()
+    status = 500
+    metrics.HTTP_IN_FLIGHT.labels(SERVICE).inc()
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        metrics.HTTP_IN_FLIGHT.labels(SERVICE).dec()
+        metrics.HTTP_LATENCY.labels(SERVICE, request.method, route).observe(time.perf_counter() - start)
+        metrics.HTTP_REQUESTS.labels(SERVICE, request.method, route, str(status)).inc()
+
+
+@web.middleware
+async def trace(request, handler):
+    # Comme common/tracing.py : X-Request-ID / traceparent repris et propagés à users-service
+    resource = request.match_info.route.resource
+    route = resource.canonical if resource is not None else 'unmatched'
+    token, root = tracing.begin(request.headers, f'{request.method} {route}', SERVICE)
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        if not response.prepared:
+            response.headers[tracing.REQUEST_ID_HEADER] = tracing.request_id()
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        tracing.end(token, root, status)
+
+
+@web.middleware
+async def access_log(request, handler):
+    # Comme common/logs.py : contexte de journalisation et ligne d'accès (après trace)
+    resource = request.match_info.route.resource
+    token = logs.begin(request.method, resource.canonical if resource is not None else 'unmatched')
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        logs.end(token, status)
+
+
+@web.middleware
+async def compress(request, handler):
+    # Mêmes règles que common/compression.py : corps JSON complets uniquement
+    response = await handler(request)
+    if not isinstance(response, web.Response) or response.body is None:
+        return response
+    response.headers.add('Vary', 'Accept-Encoding')
+    body = response.body
+    if (response.status in (204, 304) or 'Content-Encoding' in response.headers
+            or response.content_type not in compression.COMPRESSIBLE_MIMETYPES
+            or not isinstance(body, bytes) or len(body) < compression.COMPRESSION_CONFIG['min_size']):
+        return response
+    encoding = compression.negotiate(request.headers.get('Accept-Encoding'))
+    if encoding is not None:
+        response.body = compression.compress(body, encoding)
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+@web.middleware
+async def mark_writes(request, handler):
+    # Comme common/db.py : après une écriture réussie, les lectures du client
+    # évitent les réplicas en retard
+    response = await handler(request)
+    if request.method in ('GET', 'HEAD', 'OPTIONS') or response.status >= 400:
+        return response
+    if REPLICA_CONFIG['read_your_writes'] == 'sticky':
+        marker = db.PRIMARY_MARKER
+    else:
+        try:
+            marker = await request.app['db'].fetchval('SELECT pg_current_wal_lsn()::text')
+        except Exception as e:
+            logger.warning("⚠️ Position du WAL indisponible: %s", e)
+            return response
+        response.headers[db.READ_YOUR_WRITES_HEADER] = marker
+    response.set_cookie(db.READ_YOUR_WRITES_COOKIE, marker, httponly=True, samesite='Lax',
+                        max_age=REPLICA_CONFIG['read_your_writes_seconds'])
+    return response
+
+
+@web.middleware
+async def errors(request, handler):
+    try:
+        return await handler(request)
+    except web.HTTPException:
+        raise
+    except Exception as e:
+        logger.error("❌ Error: %s", e)
+        return json_response({'success': False, 'error': str(e)}, 500)
+
+
+async def verify_user_exists(request, user_id):
+    exists, user = await request.app['users'].get_user(user_id)
+    if not exists:
+        logger.warning("⚠️ User %s n'existe pas", user_id)
+    return exists, user
+
+
+# ==================== HEALTH ====================
+
+async def debug_profile(request):
+    """Profil du processus (common/profiling.py), échantillonné hors de la boucle asyncio"""
+    if not profiling.enabled():
+        return json_response({'success': False, 'error': 'Not found'}, 404)
+    if not profiling.authorized(request.headers.get('Authorization')):
+        return json_response({'success': False, 'error': 'Unauthorized'}, 401)
+    try:
+        seconds, interval, idle = profiling.parse_args(request.query)
+    except ValueError as e:
+        return json_response({'success': False, 'error': str(e)}, 400)
+    result = await asyncio.get_running_loop().run_in_executor(None, profiling.run, seconds, interval, idle)
+    if result is None:
+        return json_response({'success': False, 'error': 'A profile is already running in this worker'}, 409)
+    body, ticks = result
+    return web.Response(text=body, content_type=profiling.FOLDED_MIMETYPE, headers={
+        'X-Profile-Pid': str(os.getpid()),
+        'X-Profile-Samples': str(ticks),
+    })
+
+
+async def health(request):
+    return json_response({'status': 'healthy', 'service': 'posts-service'})
+
+
+async def metrics_view(request):
+    return web.Response(body=generate_latest(), headers={'Content-Type': CONTENT_TYPE_LATEST})
+
+
+async def ready(request):
+    try:
+        async with request.app['db'].acquire() as conn:
+            await conn.fetchval('SELECT 1')
+    except Exception:
+        return json_response({'status': 'not ready', 'database': 'disconnected'}, 503)
+
+    if await request.app['users'].health(timeout=3):
+        return json_response({'status': 'ready', 'database': 'connected', 'users_service': 'reachable',
+                              'replicas': request.app['replicas'].stats()})
+    return json_response({'status': 'degraded', 'database': 'connected', 'users_service': 'unreachable'})
+
+
+# ==================== CRUD POSTS ====================
+
+POSTS_QUERY = '''
+    SELECT p.id, p.user_id, p.title, p.content, p.created_at,
+           p.author_name as user_name, p.author_email as user_email
+    FROM posts p
+'''
+
+
+# ?fields= / ?preview= : mêmes champs que posts_service.py
+POST_FIELDS = projection.FieldSet({
+    'id': 'p.id',
+    'user_id': 'p.user_id',
+    'title': 'p.title',
+    'content': 'p.content',
+    'created_at': 'p.created_at',
+    'updated_at': 'p.updated_at',
+    'user_name': 'p.author_name',
+    'user_email': 'p.author_email',
+}, preview='content')
+POST_LIST_FIELDS = ('id', 'user_id', 'title', 'content', 'created_at', 'user_name', 'user_email')
+POST_ITEM_FIELDS = POST_LIST_FIELDS + ('updated_at',)
+
+
+def select_posts(fields, default, first_param):
+    """(SELECT ... FROM posts p, paramètres) ; la longueur d'aperçu est le paramètre ``first_param``"""
+    if fields is None:
+        return default, []
+    return f'SELECT {fields.select_sql(f"${first_param}")} FROM posts p', list(fields.params)
+
+
+async def get_posts(request):
+    """GET les posts avec info utilisateur, paginés par curseur (ou streamés en NDJSON)"""
+    try:
+        limit, after = parse_page_args(request.query)
+        fields = POST_FIELDS.parse(request.query, POST_LIST_FIELDS, required=('id', 'created_at'))
+    except ValueError as e:
+        return json_response({'success': False, 'error': str(e)}, 400)
+
+    where, params = 'TRUE', []
+    if after is not None:
+        where, params = '(p.created_at, p.id) < ($1, $2)', list(after)
+    select, select_params = select_posts(fields, POSTS_QUERY, len(params) + 1)
+    params += select_params
+    query = f'{select} WHERE {where} ORDER BY p.created_at DESC, p.id DESC'
+
+    if request.query.get('format') == 'ndjson' or request.headers.get('Accept') == NDJSON_MIMETYPE:
+        return await stream_ndjson(request, query, params)
+
+    records = await read_db(request).fetch(f'{query} LIMIT ${len(params) + 1}', *params, limit + 1)
+    posts = [row(r) for r in records[:limit]]
+    next_cursor = None
+    if len(records) > limit:
+        next_cursor = encode_cursor(posts[-1]['created_at'], posts[-1]['id'])
+
+    return json_response({
+        'success': True,
+        'count': len(posts),
+        'limit': limit,
+        'next_cursor': next_cursor,
+        'posts': posts
+    })
+
+
+async def stream_ndjson(request, query, params):
+    response = web.StreamResponse(headers={'Content-Type': NDJSON_MIMETYPE})
+    await response.prepare(request)
+    async with read_db(request).acquire() as conn:
+        async with conn.transaction():
+            chunk = []
+            async for record in conn.cursor(query, *params, prefetch=STREAM_CHUNK_SIZE):
+                chunk.append(dumps(dict(record)))
+                if len(chunk) >= STREAM_CHUNK_SIZE:
+                    await response.write(('\n'.join(chunk) + '\n').encode())
+                    chunk.clear()
+            if chunk:
+                await response.write(('\n'.join(chunk) + '\n').encode())
+    await response.write_eof()
+    return response
+
+
+async def search_posts(request):
+    """Recherche plein texte (titre + contenu), triée par pertinence, avec extraits surlignés"""
+    try:
+        q, limit, after = parse_search_args(request.query)
+    except ValueError as e:
+        return json_response({'success': False, 'error': str(e)}, 400)
+
+    where, params = 'TRUE', []
+    if after is not None:
+        where, params = '(ts_rank_cd(p.search_vector, q.query), p.id) < ($5::real, $6)', list(after)
+
+    records = await read_db(request).fetch(f'''
+        WITH q AS (SELECT websearch_to_tsquery($1::regconfig, $2) AS query),
+        hits AS (
+            SELECT p.id, p.user_id, p.title, p.content, p.created_at,
+                   p.author_name, p.author_email,
+                   ts_rank_cd(p.search_vector, q.query) AS rank
+            FROM posts p, q
+            WHERE p.search_vector @@ q.query AND {where}
+            ORDER BY rank DESC, p.id DESC
+            LIMIT $3
+        )
+        SELECT h.id, h.user_id, h.title, h.created_at, h.rank,
+               ts_headline($1::regconfig, h.title, q.query, 'HighlightAll=true, StartSel=<mark>, StopSel=</mark>') AS title_highlight,
+               ts_headline($1::regconfig, h.content, q.query, $4) AS snippet,
+               h.author_name as user_name, h.author_email as user_email
+        FROM hits h
+        CROSS JOIN q
+        ORDER BY h.rank DESC, h.id DESC
+    ''', SEARCH_CONFIG, q, limit + 1, SEARCH_HEADLINE_OPTIONS, *params)
+    posts = [row(r) for r in records[:limit]]
+    next_cursor = None
+    if len(records) > limit:
+        next_cursor = encode_rank_cursor(posts[-1]['rank'], posts[-1]['id'])
+
+    return json_response({
+        'success': True,
+        'query': q,
+        'count': len(posts),
+        'limit': limit,
+        'next_cursor': next_cursor,
+        'posts': posts
+    })
+
+
+async def get_post(request):
+    """GET un post par ID"""
+    post_id = int(request.match_info['post_id'])
+    try:
+        fields = POST_FIELDS.parse(request.query, POST_ITEM_FIELDS)
+    except ValueError as e:
+        return json_response({'success': False, 'error': str(e)}, 400)
+    select, params = select_posts(fields, '''
+        SELECT p.id, p.user_id, p.title, p.content, p.created_at, p.updated_at,
+               p.author_name as user_name, p.author_email as user_email
+        FROM posts p
+    ''', 2)
+    post = await read_db(request).fetchrow(f'{select} WHERE p.id = $1', post_id, *params)
+
+    if post:
+        return json_response({'success': True, 'post': row(post)})
+    return json_response({'success': False, 'error': 'Post not found'}, 404)
+
+
+async def get_posts_by_user(request):
+    """GET tous les posts d'un utilisateur (vérification user et requête en parallèle)"""
+    user_id = int(request.match_info['user_id'])
+    lookup = verify_user_exists(request, user_id)
+    query = read_db(request).fetch('''
+        SELECT id, user_id, title, content, created_at
+        FROM posts
+        WHERE user_id = $1
+        ORDER BY created_at DESC
+    ''', user_id)
+    lookup_result, records = await asyncio.gather(lookup, query, return_exceptions=True)
+
+    if isinstance(lookup_result, UsersServiceUnavailable):
+        logger.error("❌ Users Service indisponible: %s", lookup_result)
+        return json_response({'success': False, 'error': 'Users service unavailable'}, 503)
+    if isinstance(lookup_result, BaseException):
+        raise lookup_result
+    if isinstance(records, BaseException):
+        raise records
+
+    user_exists, user_data = lookup_result
+    if not user_exists:
+        return json_response({'success': False, 'error': 'User not found'}, 404)
+
+    posts = [row(r) for r in records]
+    return json_response({'success': True, 'count': len(posts), 'user': user_data, 'posts': posts})
+
+
+async def create_post(request):
+    """POST créer un post (vérification user et préparation de l'INSERT en parallèle)"""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+
+    if not data or not data.get('user_id') or not data.get('title') or not data.get('content'):
+        return json_response({'success': False, 'error': 'user_id, title and content required'}, 400)
+
+    # Comme ``%s::integer`` côté Flask : "3" est accepté, asyncpg exige un int
+    try:
+        user_id = int(data['user_id'])
+    except (TypeError, ValueError):
+        return json_response({'success': False, 'error': 'user_id must be an integer'}, 400)
+    title = data['title'].strip()
+    content = data['content'].strip()
+    pool = request.app['db']
+
+    async def prepare_insert():
+        conn = await pool.acquire()
+        try:
+            return conn, await conn.prepare(INSERT_POST)
+        except BaseException:
+            await pool.release(conn)
+            raise
+
+    lookup_result, prepared = await asyncio.gather(
+        verify_user_exists(request, user_id), prepare_insert(), return_exceptions=True
+    )
+    conn = None if isinstance(prepared, BaseException) else prepared[0]
+    try:
+        if isinstance(lookup_result, UsersServiceUnavailable):
+            logger.error("❌ Users Service indisponible: %s", lookup_result)
+            return json_response({'success': False, 'error': 'Users service unavailable'}, 503)
+        if isinstance(lookup_result, BaseException):
+            raise lookup_result
+        user_exists, user_data = lookup_result
+        if not user_exists:
+            return json_response({'success': False, 'error': f'User {user_id} does not exist'}, 404)
+        if conn is None:
+            raise prepared
+
+        try:
+            async with conn.transaction():
+                new_post = row(await prepared[1].fetchrow(user_id, title, content, user_data['name'], user_data['email']))
+                await publish(conn, 'posts', 'create', [new_post])
+        except asyncpg.ForeignKeyViolationError:
+            # Comme la version Flask : utilisateur supprimé depuis sa mise en cache
+            request.app['users'].invalidate(user_id)
+            return json_response({'success': False, 'error': f'User {user_id} does not exist'}, 404)
+    finally:
+        if conn is not None:
+            await pool.release(conn)
+
+    logger.info("✅ Post créé: %s par user %s", new_post['id'], user_id)
+    return json_response({'success': True, 'post': new_post}, 201)
+
+
+async def update_post(request):
+    """PUT mettre à jour un post"""
+    post_id = int(request.match_info['post_id'])
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+
+    if not data:
+        return json_response({'success': False, 'error': 'No data provided'}, 400)
+
+    updates = []
+    values = []
+    for field in ('title', 'content'):
+        if data.get(field):
+            values.append(data[field])
+            updates.append(f'{field} = ${len(values)}')
+
+    if not updates:
+        return json_response({'success': False, 'error': 'No fields to update'}, 400)
+
+    updates.append('updated_at = CURRENT_TIMESTAMP')
+    values.append(post_id)
+    query = f"UPDATE posts SET {', '.join(updates)} WHERE id = ${len(values)} RETURNING {POST_COLUMNS}"
+
+    async with request.app['db'].acquire() as conn, conn.transaction():
+        updated_post = await conn.fetchrow(query, *values)
+        if updated_post:
+            await publish(conn, 'posts', 'update', [row(updated_post)])
+    if not updated_post:
+        return json_response({'success': False, 'error': 'Post not found'}, 404)
+
+    logger.info("✅ Post %s mis à jour", post_id)
+    return json_response({'success': True, 'post': row(updated_post)})
+
+
+async def delete_post(request):
+    """DELETE supprimer un post"""
+    post_id = int(request.match_info['post_id'])
+    async with request.app['db'].acquire() as conn, conn.transaction():
+        deleted_post = await conn.fetchrow(f'DELETE FROM posts WHERE id = $1 RETURNING {POST_COLUMNS}', post_id)
+        if deleted_post:
+            await publish(conn, 'posts', 'delete', [row(deleted_post)])
+    if not deleted_post:
+        return json_response({'success': False, 'error': 'Post not found'}, 404)
+
+    logger.info("✅ Post %s supprimé", post_id)
+    return json_response({'success': True, 'message': 'Post deleted', 'post': row(deleted_post)})
+
+
+# ==================== FLUX DE CHANGEMENTS ====================
+# Même flux que common/events.py (notifications, ids, reprise, reset) ; un
+# flux n'occupe pas de thread, d'où une limite d'abonnés bien plus haute.
+
+EVENTS_MAX_SUBSCRIBERS = int(os.environ.get('EVENTS_MAX_SUBSCRIBERS', '10000'))
+
+
+async def publish(conn, topic, op, rows):
+    """Comme ``events.publish`` : délivré au COMMIT de la transaction de ``conn``"""
+    if events.EVENTS_CONFIG['enabled']:
+        await conn.execute('SELECT pg_notify($1, payload) FROM unnest($2::text[]) AS payload',
+                           events.CHANNEL, events.payloads(topic, op, rows))
+
+
+class AsyncSubscription(events.Subscription):
+    """File d'un abonné, attendue dans la boucle asyncio"""
+
+    def __init__(self, topics, size):
+        super().__init__(topics, size)
+        self._ready = asyncio.Event()
+
+    def push(self, event):
+        self._put(event)
+        self._ready.set()
+
+    async def next(self, timeout):
+        if not self._reset and not self._events:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._take()
+
+
+class ChangeFeed:
+    """Connexion ``LISTEN`` dédiée du processus, rétablie en tâche de fond"""
+
+    def __init__(self):
+        self.hub = events.Hub(EVENTS_MAX_SUBSCRIBERS, events.EVENTS_CONFIG['queue_size'],
+                              events.EVENTS_CONFIG['buffer_size'], subscription_class=AsyncSubscription)
+        self._task = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.hub.dispatch(payload)
+
+    async def _run(self):
+        backoff = 1.0
+        connected_once = False
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(
+                    host=DB_CONFIG['host'], port=int(DB_CONFIG['port']), database=DB_CONFIG['database'],
+                    user=DB_CONFIG['user'], password=DB_CONFIG['password'],
+                )
+                await conn.add_listener(events.CHANNEL, self._on_notify)
+                if connected_once:
+                    self.hub.reset()
+                connected_once = True
+                backoff = 1.0
+                logger.info("📡 Flux de changements: écoute de %s", events.CHANNEL)
+                while True:
+                    await asyncio.sleep(events.LISTEN_POLL)
+                    # Connexion perdue : détectée par une requête
+                    await conn.fetchval('SELECT 1')
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("❌ Flux de changements: %s", e)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if conn is not None:
+                    conn.terminate()
+            await asyncio.sleep(backoff)
+
+
+async def post_events(request):
+    """Flux SSE des changements de posts et d'utilisateurs"""
+    if not events.EVENTS_CONFIG['enabled']:
+        return json_response({'success': False, 'error': 'Change feed disabled'}, 404)
+    hub = request.app['events'].hub
+    last_event_id = request.headers.get('Last-Event-ID') or request.query.get('last_event_id')
+    subscription = hub.subscribe(['posts', 'users'], last_event_id)
+    if subscription is None:
+        response = json_response({'success': False, 'error': 'Too many event subscribers, retry later'}, 503)
+        response.headers['Retry-After'] = str(max(1, events.EVENTS_CONFIG['retry_ms'] // 1000))
+        return response
+
+    response = web.StreamResponse(headers={'Content-Type': events.MIMETYPE, **events.STREAM_HEADERS})
+    try:
+        await response.prepare(request)
+        await response.write(f"retry: {events.EVENTS_CONFIG['retry_ms']}\n\n".encode())
+        deadline = time.monotonic() + events.EVENTS_CONFIG['max_stream']
+        while time.monotonic() < deadline:
+            event = await subscription.next(events.EVENTS_CONFIG['heartbeat'])
+            frame = ': keepalive\n\n' if event is None else events.format_event(event)
+            await response.write(frame.encode())
+    except ConnectionResetError:
+        pass
+    finally:
+        hub.unsubscribe(subscription)
+    return response
+
+
+# ==================== STATS ====================
+
+async def stats(request):
+    """Statistiques des posts"""
+    # Compteurs maintenus par trigger (voir common/stats.py)
+    result = await read_db(request).fetchrow('''
+        SELECT
+            COALESCE(SUM(value) FILTER (WHERE name = 'posts'), 0)::BIGINT as total_posts,
+            COALESCE(SUM(value) FILTER (WHERE name = 'users_with_posts'), 0)::BIGINT as users_with_posts,
+            (SELECT MAX(created_at) FROM posts) as last_post_created
+        FROM stats_counters
+        WHERE name IN ('posts', 'users_with_posts')
+    ''')
+    return json_response({'success': True, 'stats': row(result)})
+
+
+async def info(request):
+    return json_response({
+        'service': 'posts-service',
+        'version': '1.0.0',
+        'runtime': 'asyncio',
+        'description': 'Microservice pour la gestion des posts',
+        'dependencies': {
+            'users-service': USERS_SERVICE_URL
+        },
+        'endpoints': [
+            'GET /posts',
+            'GET /posts/search?q=<texte>',
+            'GET /posts/<id>',
+            'GET /posts/user/<user_id>',
+            'POST /posts',
+            'PUT /posts/<id>',
+            'DELETE /posts/<id>',
+            'GET /posts/events',
+            'GET /posts/stats'
+        ]
+    })
+
+
+def create_app():
+    middlewares = [instrument, trace, access_log, cors, errors]
+    if REPLICA_CONFIG['replicas'] and REPLICA_CONFIG['read_your_writes'] != 'off':
+        middlewares.insert(4, mark_writes)
+    if compression.COMPRESSION_CONFIG['enabled']:
+        middlewares.insert(4, compress)
+    app = web.Application(middlewares=middlewares)
+    app.cleanup_ctx.append(lifecycle)
+    app.router.add_get('/health', health)
+    app.router.add_get('/ready', ready)
+    app.router.add_get('/metrics', metrics_view)
+    app.router.add_get('/debug/profile', debug_profile)
+    app.router.add_get('/posts', get_posts)
+    app.router.add_post('/posts', create_post)
+    app.router.add_get('/posts/stats', stats)
+    app.router.add_get('/posts/events', post_events)
+    app.router.add_get('/posts/search', search_posts)
+    app.router.add_get(r'/posts/{post_id:\d+}', get_post)
+    app.router.add_put(r'/posts/{post_id:\d+}', update_post)
+    app.router.add_delete(r'/posts/{post_id:\d+}', delete_post)
+    app.router.add_get(r'/posts/user/{user_id:\d+}', get_posts_by_user)
+    app.router.add_get('/info', info)
+    return app
+
+
+if __name__ == '__main__':
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    logger.info("🚀 Starting Posts Service (asyncio) on port %s...", PORT)
+    logger.info("🔗 Users Service URL: %s", USERS_SERVICE_URL)
+    web.run_app(create_app(), host='0.0.0.0', port=PORT, backlog=BACKLOG, access_log=None)
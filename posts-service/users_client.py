@@ -0,0 +1,366 @@
+"""Client Users Service utilisé par posts-service.
+
+- Session HTTP keep-alive partagée (pas de nouvelle connexion TCP par appel)
+- Cache TTL + LRU en mémoire, y compris des 404 (cache négatif)
+- Coalescence : des recherches simultanées du même id partagent un seul appel
+- Circuit breaker : si users-service échoue ou est lent, on arrête de
+  l'appeler pendant un moment et on sert le cache, même expiré
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from common import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+USERS_CLIENT_CONFIG = {
+    'timeout': float(os.environ.get('USERS_CLIENT_TIMEOUT', '2')),
+    'pool_size': int(os.environ.get('USERS_CLIENT_POOL_SIZE', '16')),
+    'cache_size': int(os.environ.get('USERS_CACHE_SIZE', '10000')),
+    'cache_ttl': float(os.environ.get('USERS_CACHE_TTL', '60')),
+    'negative_ttl': float(os.environ.get('USERS_CACHE_NEGATIVE_TTL', '5')),
+    'stale_ttl': float(os.environ.get('USERS_CACHE_STALE_TTL', '600')),
+    'breaker_failures': int(os.environ.get('USERS_BREAKER_FAILURES', '5')),
+    'breaker_reset': float(os.environ.get('USERS_BREAKER_RESET', '30')),
+}
+
+
+class UsersServiceUnavailable(Exception):
+    """users-service injoignable (erreur, timeout ou circuit ouvert) et pas de cache"""
+
+
+class CircuitBreaker:
+    """Circuit breaker classique fermé / ouvert / semi-ouvert"""
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failures=5, reset=30.0):
+        self.max_failures = failures
+        self.reset = reset
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._state = self.CLOSED
+        self._probe_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def allow(self):
+        """True si un appel peut partir (un seul appel d'essai en semi-ouvert)"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_running:
+                self._probe_running = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._state = self.CLOSED
+            self._probe_running = False
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_running = False
+            if self._state == self.HALF_OPEN or self._failures >= self.max_failures:
+                if self._state != self.OPEN:
+                    logger.warning("⚠️ Circuit Users Service ouvert (%s échecs)", self._failures)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class _Entry:
+    __slots__ = ('exists', 'user', 'expires', 'stale_until')
+
+    def __init__(self, exists, user, expires, stale_until):
+        self.exists = exists
+        self.user = user
+        self.expires = expires
+        self.stale_until = stale_until
+
+
+class UserCache:
+    """Cache TTL + LRU des recherches d'utilisateurs (thread-safe)"""
+
+    def __init__(self, size=10000, ttl=60.0, negative_ttl=5.0, stale_ttl=600.0):
+        self.size = size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.stale_hits = 0
+
+    def get(self, user_id, allow_stale=False):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if now < entry.expires:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry
+            if allow_stale and now < entry.stale_until:
+                self.stale_hits += 1
+                return entry
+            return None
+
+    def put(self, user_id, exists, user):
+        now = time.monotonic()
+        ttl = self.ttl if exists else self.negative_ttl
+        entry = _Entry(exists, user, now + ttl, now + max(ttl, self.stale_ttl))
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _Call:
+    """Appel en cours, partagé par les threads qui cherchent le même id"""
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class UsersClient:
+    def __init__(self, base_url, timeout=2.0, pool_size=16, cache_size=10000,
+                 cache_ttl=60.0, negative_ttl=5.0, stale_ttl=600.0,
+                 breaker_failures=5, breaker_reset=30.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cache = UserCache(cache_size, cache_ttl, negative_ttl, stale_ttl)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.misses = 0
+
+    def invalidate(self, user_id=None):
+        self.cache.invalidate(user_id)
+
+    # ---------- appels HTTP ----------
+
+    def _fetch(self, user_id):
+        if not self.breaker.allow():
+            metrics.observe_users_service('circuit_open', 0.0)
+            raise UsersServiceUnavailable('circuit open')
+        start = time.perf_counter()
+        try:
+            logger.info("🔗 Communication avec Users Service pour vérifier user %s", user_id)
+            with tracing.span('GET /users/<id>', 'CLIENT', peer_service='users-service', user_id=user_id) as span:
+                response = self.session.get(f"{self.base_url}/users/{user_id}", timeout=self.timeout,
+                                            headers=tracing.outgoing_headers())
+                span.tag('http.status_code', response.status_code)
+        except requests.RequestException as e:
+            metrics.observe_users_service(_outcome(e), time.perf_counter() - start)
+            self.breaker.failure()
+            raise UsersServiceUnavailable(str(e))
+        metrics.observe_users_service(_outcome(response.status_code), time.perf_counter() - start)
+
+        if response.status_code == 200:
+            try:
+                user = response.json().get('user')
+            except ValueError as e:
+                self.breaker.failure()
+                raise UsersServiceUnavailable(f'invalid response: {e}')
+            self.breaker.success()
+            return True, user
+        if response.status_code == 404:
+            self.breaker.success()
+            return False, None
+        self.breaker.failure()
+        raise UsersServiceUnavailable(f'status {response.status_code}')
+
+    def get_user(self, user_id):
+        """Retourne (existe, user) ; lève UsersServiceUnavailable sans cache utilisable"""
+        entry = self.cache.get(user_id)
+        if entry is not None:
+            return entry.exists, entry.user
+
+        with self._lock:
+            call = self._inflight.get(user_id)
+            leader = call is None
+            if leader:
+                call = self._inflight[user_id] = _Call()
+                self.misses += 1
+
+        if not leader:
+            call.event.wait(self.timeout + 1)
+            if call.error is not None or call.result is None:
+                return _stale_or_raise(self.cache, user_id, call.error)
+            return call.result
+
+        try:
+            call.result = self._fetch(user_id)
+            self.cache.put(user_id, *call.result)
+            return call.result
+        except UsersServiceUnavailable as e:
+            call.error = e
+            return _stale_or_raise(self.cache, user_id, e)
+        finally:
+            with self._lock:
+                self._inflight.pop(user_id, None)
+            call.event.set()
+
+    def health(self, timeout=3):
+        try:
+            return self.session.get(f"{self.base_url}/health", timeout=timeout).status_code == 200
+        except requests.RequestException:
+            return False
+
+    def stats(self):
+        return _client_stats(self)
+
+
+class AsyncUsersClient:
+    """Équivalent asyncio de UsersClient (aiohttp), pour posts_service_async"""
+
+    def __init__(self, base_url, timeout=2.0, pool_size=16, cache_size=10000,
+                 cache_ttl=60.0, negative_ttl=5.0, stale_ttl=600.0,
+                 breaker_failures=5, breaker_reset=30.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.cache = UserCache(cache_size, cache_ttl, negative_ttl, stale_ttl)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset)
+        self.session = None
+        self._inflight = {}
+        self.misses = 0
+
+    async def start(self):
+        import aiohttp
+        self._aiohttp = aiohttp
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    def invalidate(self, user_id=None):
+        self.cache.invalidate(user_id)
+
+    async def _fetch(self, user_id):
+        if not self.breaker.allow():
+            metrics.observe_users_service('circuit_open', 0.0)
+            raise UsersServiceUnavailable('circuit open')
+        start = time.perf_counter()
+        try:
+            with tracing.span('GET /users/<id>', 'CLIENT', peer_service='users-service', user_id=user_id) as span:
+                async with self.session.get(f"{self.base_url}/users/{user_id}",
+                                            headers=tracing.outgoing_headers()) as response:
+                    span.tag('http.status_code', response.status)
+                    metrics.observe_users_service(_outcome(response.status), time.perf_counter() - start)
+                    if response.status == 200:
+                        user = (await response.json()).get('user')
+                        self.breaker.success()
+                        return True, user
+                    if response.status == 404:
+                        self.breaker.success()
+                        return False, None
+                    self.breaker.failure()
+                    raise UsersServiceUnavailable(f'status {response.status}')
+        except (self._aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            if not isinstance(e, ValueError):
+                metrics.observe_users_service(_outcome(e), time.perf_counter() - start)
+            self.breaker.failure()
+            raise UsersServiceUnavailable(str(e) or type(e).__name__)
+
+    async def get_user(self, user_id):
+        """Retourne (existe, user) ; lève UsersServiceUnavailable sans cache utilisable"""
+        entry = self.cache.get(user_id)
+        if entry is not None:
+            return entry.exists, entry.user
+
+        future = self._inflight.get(user_id)
+        if future is None:
+            self.misses += 1
+            future = self._inflight[user_id] = asyncio.ensure_future(self._fetch(user_id))
+            future.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+        try:
+            result = await asyncio.shield(future)
+        except UsersServiceUnavailable as e:
+            return _stale_or_raise(self.cache, user_id, e)
+        self.cache.put(user_id, *result)
+        return result
+
+    async def health(self, timeout=3):
+        try:
+            async with self.session.get(f"{self.base_url}/health",
+                                        timeout=self._aiohttp.ClientTimeout(total=timeout)) as response:
+                return response.status == 200
+        except (self._aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+
+    def stats(self):
+        return _client_stats(self)
+
+
+def _outcome(result):
+    """Libellé de métrique d'un appel : statut HTTP ou type d'erreur"""
+    if isinstance(result, int):
+        return {200: 'ok', 404: 'not_found'}.get(result, f'http_{result}')
+    if isinstance(result, (requests.Timeout, asyncio.TimeoutError)):
+        return 'timeout'
+    return 'error'
+
+
+def _stale_or_raise(cache, user_id, error):
+    entry = cache.get(user_id, allow_stale=True)
+    if entry is not None:
+        logger.warning("⚠️ Users Service indisponible, cache périmé utilisé pour user %s", user_id)
+        return entry.exists, entry.user
+    raise UsersServiceUnavailable(str(error) if error else 'timeout')
+
+
+def _client_stats(client):
+    return {
+        'cache_size': len(client.cache),
+        'hits': client.cache.hits,
+        'misses': client.misses,
+        'stale_hits': client.cache.stale_hits,
+        'inflight': len(client._inflight),
+        'breaker': client.breaker.state,
+    }
@@ -5,6 +5,9 @@ echo "===================================="
 
 cd ~/three-tier-microservices
 
+# BuildKit : Dockerfiles multi-étapes avec RUN --mount
+export DOCKER_BUILDKIT=1
+
 # Configurer Docker pour registre insecure
 echo ""
 echo "🐳 Configuration Docker..."
@@ -29,8 +32,8 @@ echo "✅ Registre actif"
 # Build Users Service
 echo ""
 echo "🔨 [1/4] Build Users Service..."
-cd users-service
-docker build -t 192.168.56.10:5000/users-service:latest . 
+# Contexte = racine du dépôt (le service embarque common/)
+docker build -f users-service/Dockerfile -t 192.168.56.10:5000/users-service:latest .
 if [ $? -eq 0 ]; then
     docker push 192.168.56.10:5000/users-service:latest
     echo "✅ Users Service construit et poussé"
@@ -38,13 +41,12 @@ else
     echo "❌ Erreur build Users Service"
     exit 1
 fi
-cd ..
 
 # Build Posts Service
 echo ""
 echo "🔨 [2/4] Build Posts Service..."
-cd posts-service
-docker build -t 192.168.56.10:5000/posts-service:latest .
+# Contexte = racine du dépôt (le service embarque common/)
+docker build -f posts-service/Dockerfile -t 192.168.56.10:5000/posts-service:latest .
 if [ $? -eq 0 ]; then
     docker push 192.168.56.10:5000/posts-service:latest
     echo "✅ Posts Service construit et poussé"
@@ -52,7 +54,6 @@ else
     echo "❌ Erreur build Posts Service"
     exit 1
 fi
-cd ..
 
 # Build API Gateway
 echo ""
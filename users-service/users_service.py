@@ -1,33 +1,97 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import execute_values
 import os
+import sys
 import logging
 from datetime import datetime
 
-logging.basicConfig(level=logging.INFO)
+from common import admission, compression, db, events, jsonio, metrics, outbox, pagination, profiling, projection, queries
+from common import stats as stats_counters
+from common import logs, tracing
+from common.cache import init_cache
+from common.db import DictRowCursor, get_db
+
+logs.configure('users-service')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
 
-# Configuration DB
-DB_CONFIG = {
-    'host': os.environ.get('DB_HOST', 'postgres-service'),
-    'port': os.environ.get('DB_PORT', '5432'),
-    'database': os.environ.get('DB_NAME', 'microservices_db'),
-    'user': os.environ.get('DB_USER', 'appuser'),
-    'password': os.environ.get('DB_PASSWORD', 'password')
+# Pool de connexions DB (partagé avec posts-service)
+db.init_app(app)
+
+# JSON rapide (orjson) et compression des réponses (brotli / gzip)
+jsonio.init_app(app)
+compression.init_app(app)
+
+# Métriques Prometheus (GET /metrics)
+metrics.init_app(app, 'users-service')
+
+# Traçage (X-Request-ID / traceparent, spans Zipkin) et profilage à chaud (GET /debug/profile)
+tracing.init_app(app)
+profiling.init_app(app)
+
+# Journaux JSON échantillonnés par requête, écrits par un thread du processus
+logs.init_app(app)
+
+# Limitation de débit et délestage sous surcharge (429 / 503 + Retry-After)
+admission.init_app(app)
+
+# Recalcul périodique des compteurs de /stats
+stats_counters.init_app(app)
+
+# Cache des réponses GET, invalidé par les écritures (TTL par type de route)
+cache = init_cache('users-service')
+CACHE_TTLS = {
+    'list': float(os.environ.get('CACHE_TTL_LIST', '5')),
+    'item': float(os.environ.get('CACHE_TTL_ITEM', '30')),
+    'stats': float(os.environ.get('CACHE_TTL_STATS', '10')),
 }
 
-def get_db():
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        return conn
-    except Exception as e:
-        logger.error(f"DB Error: {e}")
-        return None
+# Limites des opérations en masse
+BATCH_MAX_IDS = int(os.environ.get('BATCH_MAX_IDS', '1000'))
+BULK_MAX_USERS = int(os.environ.get('BULK_MAX_USERS', '100000'))
+BULK_PAGE_SIZE = int(os.environ.get('BULK_PAGE_SIZE', '1000'))
+
+# Requêtes nommées : préparées une fois par connexion du pool (common/queries.py)
+USER_COLUMNS = 'id, name, email, created_at'
+USERS_PAGES = pagination.keyset_queries('users.page', f'SELECT {USER_COLUMNS} FROM users')
+USER_BY_ID = queries.define('users.by_id', f'SELECT {USER_COLUMNS} FROM users WHERE id = %s')
+USERS_BY_IDS = queries.define('users.by_ids', f'SELECT {USER_COLUMNS} FROM users WHERE id = ANY(%s)')
+INSERT_USER = queries.define('users.insert', f'INSERT INTO users (name, email) VALUES (%s, %s) RETURNING {USER_COLUMNS}')
+DELETE_USER = queries.define('users.delete', 'DELETE FROM users WHERE id = %s RETURNING id, name, email')
+LAST_USER_CREATED = queries.define('users.last_created', 'SELECT MAX(created_at) AS last_user_created FROM users')
+# ?fields= des lectures : champs exposés et colonnes correspondantes
+USER_FIELDS = projection.FieldSet({
+    'id': 'id',
+    'name': 'name',
+    'email': 'email',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+})
+USER_DEFAULT_FIELDS = ('id', 'name', 'email', 'created_at')
+# Une requête par combinaison de champs modifiés
+UPDATE_USER = {
+    fields: queries.define(
+        f"users.update.{'_'.join(fields)}",
+        f"UPDATE users SET {', '.join(f'{field} = %s' for field in fields)}, updated_at = CURRENT_TIMESTAMP "
+        f"WHERE id = %s RETURNING id, name, email, updated_at"
+    )
+    for fields in (('name',), ('email',), ('name', 'email'))
+}
+
+def publish_user_changes(cur, users, op='upsert'):
+    """Événements 'users' de l'outbox, validés avec la transaction de ``cur``
+
+    posts-service les consomme pour tenir à jour le nom / email des auteurs
+    copiés dans ses posts.
+    """
+    outbox.publish(cur, 'users', [
+        (user['id'], {'op': op, 'id': user['id'], 'name': user['name'], 'email': user['email']})
+        for user in users
+    ])
 
 # ==================== HEALTH ====================
 
@@ -43,57 +107,191 @@ def ready():
             cur = conn.cursor()
             cur.execute('SELECT 1')
             cur.close()
-            conn.close()
-            return jsonify({'status': 'ready', 'database': 'connected'}), 200
+            return jsonify({'status': 'ready', 'database': 'connected', 'pool': db.pool_stats(),
+                            'replicas': db.replica_stats()}), 200
         except:
-            return jsonify({'status': 'not ready'}), 503
-    return jsonify({'status': 'not ready'}), 503
+            return jsonify({'status': 'not ready', 'pool': db.pool_stats()}), 503
+    return jsonify({'status': 'not ready', 'pool': db.pool_stats()}), 503
 
 # ==================== CRUD USERS ====================
 
 @app.route('/users', methods=['GET'])
+@cache.cached(CACHE_TTLS['list'], tags=lambda: ['users:list'], bypass=pagination.wants_ndjson)
+@db.read_only
 def get_users():
-    """GET tous les utilisateurs"""
+    """GET les utilisateurs, paginés par curseur (ou streamés en NDJSON)"""
     logger.info("📥 GET /users")
+    if 'ids' in request.args:
+        return batch_get_users(request.args['ids'].split(','))
+    
+    try:
+        limit, after = pagination.parse_page_args(request.args)
+        # id et created_at portent le curseur : toujours renvoyés
+        fields = USER_FIELDS.parse(request.args, USER_DEFAULT_FIELDS, required=('id', 'created_at'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    if pagination.wants_ndjson(request):
+        where, params = pagination.keyset_where(after)
+        columns = USER_COLUMNS if fields is None else fields.select
+        query = f'SELECT {columns} FROM users WHERE {where} ORDER BY {pagination.keyset_order()}'
+        return pagination.ndjson_response(query, params)
+    
     conn = get_db()
     if not conn:
         return jsonify({'success': False, 'error': 'DB connection failed'}), 500
     
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute('SELECT id, name, email, created_at FROM users ORDER BY created_at DESC')
-        users = cur.fetchall()
+        cur = conn.cursor(cursor_factory=DictRowCursor)
+        pages = USERS_PAGES if fields is None else fields.keyset_queries('users.page', 'FROM users')
+        users, next_cursor = pagination.fetch_named_page(cur, pages, after, limit)
         cur.close()
-        conn.close()
         
-        logger.info(f"✅ Retourné {len(users)} utilisateurs")
-        return jsonify({'success': True, 'count': len(users), 'users': users}), 200
+        logger.info("✅ Retourné %s utilisateurs", len(users))
+        return jsonify({
+            'success': True,
+            'count': len(users),
+            'limit': limit,
+            'next_cursor': next_cursor,
+            'users': users
+        }), 200
     except Exception as e:
-        logger.error(f"❌ Error: {e}")
+        logger.error("❌ Error: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/users/<int:user_id>', methods=['GET'])
+@cache.cached(CACHE_TTLS['item'], tags=lambda user_id: [f'user:{user_id}'])
+@db.read_only
 def get_user(user_id):
     """GET un utilisateur par ID"""
-    logger.info(f"📥 GET /users/{user_id}")
+    logger.info("📥 GET /users/%s", user_id)
+    try:
+        fields = USER_FIELDS.parse(request.args, USER_DEFAULT_FIELDS)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
     conn = get_db()
     if not conn:
         return jsonify({'success': False, 'error': 'DB connection failed'}), 500
     
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute('SELECT id, name, email, created_at FROM users WHERE id = %s', (user_id,))
-        user = cur.fetchone()
+        cur = conn.cursor(cursor_factory=DictRowCursor)
+        query = USER_BY_ID if fields is None else fields.define('users.by_id', 'FROM users WHERE id = %s')
+        user = query.fetchone(cur, (user_id,))
         cur.close()
-        conn.close()
         
         if user:
-            logger.info(f"✅ User {user_id} trouvé")
+            logger.info("✅ User %s trouvé", user_id)
             return jsonify({'success': True, 'user': user}), 200
         else:
             return jsonify({'success': False, 'error': 'User not found'}), 404
     except Exception as e:
-        logger.error(f"❌ Error: {e}")
+        logger.error("❌ Error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ==================== BULK USERS ====================
+
+def batch_get_users(raw_ids):
+    """Résout plusieurs ids en une seule requête ; retourne les users par id et les absents"""
+    try:
+        ids = list(dict.fromkeys(int(i) for i in raw_ids if str(i).strip()))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'ids must be integers'}), 400
+    
+    if not ids:
+        return jsonify({'success': False, 'error': 'ids required'}), 400
+    if len(ids) > BATCH_MAX_IDS:
+        return jsonify({'success': False, 'error': f'At most {BATCH_MAX_IDS} ids per request'}), 400
+    
+    conn = get_db()
+    if not conn:
+        return jsonify({'success': False, 'error': 'DB connection failed'}), 500
+    
+    try:
+        cur = conn.cursor(cursor_factory=DictRowCursor)
+        found = {row['id']: row for row in USERS_BY_IDS.fetchall(cur, (ids,))}
+        cur.close()
+        
+        missing = [i for i in ids if i not in found]
+        logger.info("✅ Batch: %s trouvés, %s absents", len(found), len(missing))
+        return jsonify({
+            'success': True,
+            'count': len(found),
+            'users': {str(i): found[i] for i in ids if i in found},
+            'missing': missing
+        }), 200
+    except Exception as e:
+        logger.error("❌ Error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/users/batch-get', methods=['POST'])
+@db.read_only
+def batch_get():
+    """POST récupérer plusieurs utilisateurs par id ({"ids": [...]})"""
+    logger.info("📥 POST /users/batch-get")
+    data = request.get_json(silent=True)
+    
+    if not data or not isinstance(data.get('ids'), list):
+        return jsonify({'success': False, 'error': 'ids list required'}), 400
+    
+    return batch_get_users(data['ids'])
+
+@app.route('/users/bulk', methods=['POST'])
+def bulk_create_users():
+    """POST créer des utilisateurs en masse ({"users": [{"name", "email"}, ...]})
+
+    Insertion multi-lignes par pages de BULK_PAGE_SIZE dans une seule
+    transaction. Les emails déjà existants sont ignorés et listés dans la réponse.
+    """
+    logger.info("📝 POST /users/bulk")
+    data = request.get_json(silent=True)
+    
+    if not data or not isinstance(data.get('users'), list) or not data['users']:
+        return jsonify({'success': False, 'error': 'users list required'}), 400
+    if len(data['users']) > BULK_MAX_USERS:
+        return jsonify({'success': False, 'error': f'At most {BULK_MAX_USERS} users per request'}), 400
+    
+    rows = []
+    for index, user in enumerate(data['users']):
+        if not isinstance(user, dict) or not user.get('name') or not user.get('email'):
+            return jsonify({'success': False, 'error': f'Name and email required (index {index})'}), 400
+        if not isinstance(user['name'], str) or not isinstance(user['email'], str):
+            return jsonify({'success': False, 'error': f'Name and email must be strings (index {index})'}), 400
+        email = user['email'].strip()
+        if '@' not in email:
+            return jsonify({'success': False, 'error': f'Invalid email (index {index})'}), 400
+        rows.append((user['name'].strip(), email))
+    
+    conn = get_db()
+    if not conn:
+        return jsonify({'success': False, 'error': 'DB connection failed'}), 500
+    
+    try:
+        cur = conn.cursor()
+        inserted = execute_values(
+            cur,
+            'INSERT INTO users (name, email) VALUES %s ON CONFLICT (email) DO NOTHING RETURNING id, name, email, created_at',
+            rows,
+            page_size=BULK_PAGE_SIZE,
+            fetch=True
+        )
+        created = [{'id': i, 'name': n, 'email': e, 'created_at': c} for i, n, e, c in inserted]
+        publish_user_changes(cur, created)
+        events.publish(cur, 'users', 'create', created)
+        conn.commit()
+        cur.close()
+        cache.invalidate('users:list', 'users:stats')
+        
+        inserted_emails = {row[2] for row in inserted}
+        skipped = [email for _, email in rows if email not in inserted_emails]
+        logger.info("✅ Bulk: %s users créés, %s ignorés", len(inserted_emails), len(skipped))
+        return jsonify({
+            'success': True,
+            'inserted': len(inserted_emails),
+            'skipped': skipped
+        }), 201
+    except Exception as e:
+        logger.error("❌ Error: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/users', methods=['POST'])
@@ -116,28 +314,26 @@ def create_user():
         return jsonify({'success': False, 'error': 'DB connection failed'}), 500
     
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute(
-            'INSERT INTO users (name, email) VALUES (%s, %s) RETURNING id, name, email, created_at',
-            (name, email)
-        )
-        new_user = cur.fetchone()
+        cur = conn.cursor(cursor_factory=DictRowCursor)
+        new_user = INSERT_USER.fetchone(cur, (name, email))
+        publish_user_changes(cur, [new_user])
+        events.publish(cur, 'users', 'create', [new_user])
         conn.commit()
         cur.close()
-        conn.close()
+        cache.invalidate('users:list', 'users:stats', f"user:{new_user['id']}")
         
-        logger.info(f"✅ User créé: {new_user['id']}")
+        logger.info("✅ User créé: %s", new_user['id'])
         return jsonify({'success': True, 'user': new_user}), 201
     except psycopg2.IntegrityError:
         return jsonify({'success': False, 'error': 'Email already exists'}), 409
     except Exception as e:
-        logger.error(f"❌ Error: {e}")
+        logger.error("❌ Error: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/users/<int:user_id>', methods=['PUT'])
 def update_user(user_id):
     """PUT mettre à jour un utilisateur"""
-    logger.info(f"✏️ PUT /users/{user_id}")
+    logger.info("✏️ PUT /users/%s", user_id)
     data = request.get_json()
     
     if not data:
@@ -148,76 +344,77 @@ def update_user(user_id):
         return jsonify({'success': False, 'error': 'DB connection failed'}), 500
     
     try:
-        updates = []
-        values = []
+        fields = tuple(field for field in ('name', 'email') if data.get(field))
         
-        if data.get('name'):
-            updates.append('name = %s')
-            values.append(data['name'])
-        if data.get('email'):
-            updates.append('email = %s')
-            values.append(data['email'])
-        
-        if not updates:
+        if not fields:
             return jsonify({'success': False, 'error': 'No fields to update'}), 400
         
-        updates.append('updated_at = CURRENT_TIMESTAMP')
-        values.append(user_id)
-        
-        query = f"UPDATE users SET {', '.join(updates)} WHERE id = %s RETURNING id, name, email, updated_at"
-        
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute(query, values)
-        updated_user = cur.fetchone()
+        cur = conn.cursor(cursor_factory=DictRowCursor)
+        updated_user = UPDATE_USER[fields].fetchone(cur, (*(data[field] for field in fields), user_id))
         
         if not updated_user:
             cur.close()
-            conn.close()
             return jsonify({'success': False, 'error': 'User not found'}), 404
         
+        publish_user_changes(cur, [updated_user])
+        events.publish(cur, 'users', 'update', [updated_user])
         conn.commit()
         cur.close()
-        conn.close()
+        # users:profiles : les réponses de posts-service qui embarquent nom/email
+        cache.invalidate(f'user:{user_id}', 'users:list', 'users:profiles')
         
-        logger.info(f"✅ User {user_id} mis à jour")
+        logger.info("✅ User %s mis à jour", user_id)
         return jsonify({'success': True, 'user': updated_user}), 200
     except psycopg2.IntegrityError:
         return jsonify({'success': False, 'error': 'Email already exists'}), 409
     except Exception as e:
-        logger.error(f"❌ Error: {e}")
+        logger.error("❌ Error: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
     """DELETE supprimer un utilisateur"""
-    logger.info(f"🗑️ DELETE /users/{user_id}")
+    logger.info("🗑️ DELETE /users/%s", user_id)
     conn = get_db()
     if not conn:
         return jsonify({'success': False, 'error': 'DB connection failed'}), 500
     
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute('DELETE FROM users WHERE id = %s RETURNING id, name, email', (user_id,))
-        deleted_user = cur.fetchone()
+        cur = conn.cursor(cursor_factory=DictRowCursor)
+        deleted_user = DELETE_USER.fetchone(cur, (user_id,))
         
         if not deleted_user:
             cur.close()
-            conn.close()
             return jsonify({'success': False, 'error': 'User not found'}), 404
         
+        publish_user_changes(cur, [deleted_user], op='delete')
+        events.publish(cur, 'users', 'delete', [deleted_user])
         conn.commit()
         cur.close()
-        conn.close()
+        # ON DELETE CASCADE : les posts de l'utilisateur disparaissent aussi
+        cache.invalidate(f'user:{user_id}', 'users:list', 'users:stats', 'users:profiles',
+                         'posts:list', 'posts:stats', f'posts:user:{user_id}')
         
-        logger.info(f"✅ User {user_id} supprimé")
+        logger.info("✅ User %s supprimé", user_id)
         return jsonify({'success': True, 'message': 'User deleted', 'user': deleted_user}), 200
     except Exception as e:
-        logger.error(f"❌ Error: {e}")
+        logger.error("❌ Error: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# ==================== FLUX DE CHANGEMENTS ====================
+
+@app.route('/users/events', methods=['GET'])
+@admission.streaming
+def user_events():
+    """Flux SSE des créations / modifications / suppressions d'utilisateurs"""
+    logger.info("📡 GET /users/events")
+    return events.stream(['users'])
+
 # ==================== STATS ====================
 
 @app.route('/users/stats', methods=['GET'])
+@cache.cached(CACHE_TTLS['stats'], tags=lambda: ['users:stats'])
+@db.read_only
 def stats():
     """Statistiques des utilisateurs"""
     conn = get_db()
@@ -225,11 +422,11 @@ def stats():
         return jsonify({'success': False, 'error': 'DB connection failed'}), 500
     
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute('SELECT COUNT(*) as total FROM users')
-        result = cur.fetchone()
+        cur = conn.cursor(cursor_factory=DictRowCursor)
+        # Compteur maintenu par trigger + MAX par l'index : pas de parcours de la table
+        counters = stats_counters.read_counters(cur, 'users')
+        result = {'total': counters['users'], **LAST_USER_CREATED.fetchone(cur)}
         cur.close()
-        conn.close()
         
         return jsonify({'success': True, 'stats': result}), 200
     except Exception as e:
@@ -243,14 +440,23 @@ def info():
         'description': 'Microservice pour la gestion des utilisateurs',
         'endpoints': [
             'GET /users',
+            'GET /users?ids=<id>,<id>',
             'GET /users/<id>',
             'POST /users',
+            'POST /users/batch-get',
+            'POST /users/bulk',
             'PUT /users/<id>',
             'DELETE /users/<id>',
+            'GET /users/events',
             'GET /users/stats'
         ]
     }), 200
 
 if __name__ == '__main__':
-    logger.info("🚀 Starting Users Service on port 5001...")
-    app.run(host='0.0.0.0', port=5001, debug=False)
+    if sys.argv[1:] == ['serve']:
+        # Production : gunicorn multi-workers / multi-threads
+        from common.serving import serve
+        serve(app, 5001)
+    else:
+        logger.info("🚀 Starting Users Service on port 5001...")
+        app.run(host='0.0.0.0', port=5001, debug=False)